@@ -0,0 +1,280 @@
+"""
+Asset cache for embedded files (backgrounds, logos, fonts)
+Keeps ready-to-embed base64 data URIs in memory (LRU bounded by bytes,
+keyed by content hash) and publishes assets to a hashed directory for
+referenced (non-inline) SVGs
+"""
+
+import os
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asset_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+MAX_DIGESTS = 4096  # (path, size, mtime) -> sha256 entries remembered
+STREAM_CHUNK = 3 * 64 * 1024  # Multiple of 3: base64 of each chunk concatenates cleanly
+
+MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".svg": "image/svg+xml",
+    ".woff2": "font/woff2",
+    ".woff": "font/woff",
+    ".ttf": "font/truetype",
+}
+
+
+def guess_mime(path: str) -> str:
+    """Guess data URI mime type from file extension (defaults to image/png)"""
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "image/png")
+
+
+# Leading base64 characters of image file signatures
+BASE64_SIGNATURES = {
+    "/9j/": "image/jpeg",
+    "iVBORw0KGgo": "image/png",
+    "UklGR": "image/webp",
+    "R0lGOD": "image/gif",
+}
+
+
+def base64_mime(data: str) -> str:
+    """Mime type of base64-encoded image data from its signature (defaults to image/png)"""
+    for prefix, mime in BASE64_SIGNATURES.items():
+        if data.startswith(prefix):
+            return mime
+    return "image/png"
+
+
+class AssetCache:
+    """Content-addressed cache of base64 data URIs
+
+    Data URIs are keyed by (sha256 of the content, mime), so copies of the
+    same file under different paths share one entry. A small index maps
+    (real path, size, mtime) to the sha256, so a modified file is re-read
+    and re-encoded automatically and an unchanged one is not hashed again.
+    Nothing is written to disk: reading and encoding a file is cheaper than
+    storing a larger base64 copy of it.
+
+    Args:
+        max_bytes: Memory budget for cached data URIs (least recently used are evicted)
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._digests = OrderedDict()  # (real path, size, mtime) -> sha256
+        self._entries = OrderedDict()  # (sha256, mime) -> data URI
+
+    def data_uri(self, path: str, mime: Optional[str] = None) -> str:
+        """Return the file as a data URI (raises FileNotFoundError if missing)"""
+        return self._get(path, mime or guess_mime(path))[1]
+
+    def iter_data_uri(self, path: str, mime: Optional[str] = None, chunk_size: int = STREAM_CHUNK) -> Iterator[str]:
+        """Yield the file as a data URI in pieces, never holding it whole
+
+        An entry already in memory is yielded as is; otherwise the file is
+        base64-encoded chunk by chunk straight from disk (and not cached).
+        Raises FileNotFoundError if missing.
+        """
+        mime = mime or guess_mime(path)
+        digest = self._digests.get(self._file_key(path))
+        uri = self._entries.get((digest, mime)) if digest else None
+        if uri is not None:
+            self._entries.move_to_end((digest, mime))
+            yield uri
+            return
+
+        yield f"data:{mime};base64,"
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk).decode("ascii")
+
+    def base64(self, path: str) -> str:
+        """Return the file content as raw base64"""
+        uri = self.data_uri(path)
+        return uri[uri.index(",") + 1:]
+
+    def digest(self, path: str) -> str:
+        """Return the sha256 hex digest of the file content"""
+        key = self._file_key(path)
+        digest = self._digests.get(key)
+        if digest is None:
+            with open(path, "rb") as f:
+                digest = self._remember(key, hashlib.sha256(f.read()).hexdigest())
+        return digest
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        self._digests.clear()
+        self._entries.clear()
+        self.total_bytes = 0
+
+    @staticmethod
+    def _file_key(path: str) -> tuple:
+        st = os.stat(path)
+        return (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+    def _remember(self, key, digest: str) -> str:
+        self._digests[key] = digest
+        self._digests.move_to_end(key)
+        if len(self._digests) > MAX_DIGESTS:
+            self._digests.popitem(last=False)
+        return digest
+
+    def _get(self, path: str, mime: str) -> Tuple[str, str]:
+        key = self._file_key(path)
+        digest = self._digests.get(key)
+        uri = self._entries.get((digest, mime)) if digest else None
+        if uri is not None:
+            self._entries.move_to_end((digest, mime))
+            return digest, uri
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = self._remember(key, hashlib.sha256(raw).hexdigest())
+        uri = self._entries.get((digest, mime))  # Same content under another path
+        if uri is None:
+            uri = f"data:{mime};base64,{base64.b64encode(raw).decode('utf-8')}"
+            self._store((digest, mime), uri)
+        return digest, uri
+
+    def _store(self, key, uri: str):
+        size = len(uri)
+        if size > self.max_bytes:
+            return  # Too large to keep, serve it uncached
+
+        self._entries[key] = uri
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+
+def mark_used(path: str):
+    """Refresh the mtime of a disk cache file on a hit, so prune_cache_dir keeps it"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune_cache_dir(directory: str, max_bytes: int, keep: Optional[str] = None):
+    """Delete the least recently used files of a disk cache directory beyond max_bytes
+
+    Files are ordered by mtime (written or mark_used()); keep (the file
+    just written) and other processes' temporary files are never deleted. Errors are ignored: the disk caches
+    under .asset_cache are an optimisation only.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+
+    files = []
+    total = 0
+    for name in names:
+        if ".tmp" in name:
+            continue  # Being written by another process
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append((st.st_mtime_ns, st.st_size, path))
+        total += st.st_size
+
+    files.sort()
+    for _, size, path in files:
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.realpath(path) == os.path.realpath(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+_default_cache = None
+
+
+def get_asset_cache() -> AssetCache:
+    """Return the process-wide shared AssetCache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = AssetCache()
+    return _default_cache
+
+
+class AssetPublisher:
+    """Writes shared assets once into a content-hashed directory
+
+    Used by TemplateEngine's "reference" asset mode: instead of inlining a
+    data URI, each asset is stored as {sha256[:16]}{ext} in asset_dir and
+    referenced as {url_prefix}{filename}, so many SVGs share one copy.
+
+    Args:
+        asset_dir: Directory where assets are written
+        url_prefix: Prefix for emitted hrefs, relative to the SVG (e.g. "assets/")
+    """
+
+    def __init__(self, asset_dir: str, url_prefix: str = "assets/"):
+        self.asset_dir = asset_dir
+        self.url_prefix = url_prefix
+        self._published = {}
+
+    def publish_file(self, path: str) -> str:
+        """Publish a file from disk, return its href"""
+        st = os.stat(path)
+        key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+        href = self._published.get(key)
+        if href is None:
+            with open(path, "rb") as f:
+                raw = f.read()
+            href = self._publish(raw, os.path.splitext(path)[1].lower())
+            self._published[key] = href
+        return href
+
+    def publish_bytes(self, raw: bytes, ext: str) -> str:
+        """Publish in-memory content (e.g. a font subset), return its href"""
+        return self._publish(raw, ext)
+
+    def publish_data_uri(self, uri: str) -> str:
+        """Publish the payload of a base64 data URI, return its href
+
+        Anything that is not a base64 data URI (already a URL) is returned unchanged.
+        """
+        if not uri.startswith("data:") or ";base64," not in uri:
+            return uri
+
+        # Keyed by a digest: the URI itself (often megabytes) would stay in memory for good
+        key = hashlib.sha1(uri.encode("ascii", "replace")).hexdigest()
+        href = self._published.get(key)
+        if href is None:
+            header, payload = uri.split(",", 1)
+            mime = header[len("data:"):].split(";", 1)[0]
+            ext = next((e for e, m in MIME_TYPES.items() if m == mime), ".bin")
+            href = self._publish(base64.b64decode(payload), ext)
+            self._published[key] = href
+        return href
+
+    def _publish(self, raw: bytes, ext: str) -> str:
+        filename = f"{hashlib.sha256(raw).hexdigest()[:16]}{ext}"
+        path = os.path.join(self.asset_dir, filename)
+        if not os.path.exists(path):
+            os.makedirs(self.asset_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, path)
+        return f"{self.url_prefix}{filename}"
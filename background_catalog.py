@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Background catalog index
+Single source of background metadata for the CLI generators, the web
+wizard batch script and the campaign runner. background_index.json maps
+each background id (file stem, e.g. "bg15") to hand-edited tags (name,
+sports, competitions, preferred color) and to data measured by the scanner
+(paths, pixel size, content hash, color palette with dominant, dark and
+suggested colors, pre-resized variants), so a render looks backgrounds up
+in a dict instead of probing files.
+
+Usage:
+    python3 background_catalog.py scan      # (re)build background_index.json
+    python3 background_catalog.py list [Sport]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join(BASE_DIR, "background_index.json")
+
+CLI_BACKGROUNDS_DIR = "background"
+WEB_BACKGROUNDS_DIR = "web/frontend/backgrounds"
+BACKGROUND_DIRS = (CLI_BACKGROUNDS_DIR, WEB_BACKGROUNDS_DIR)
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+DEFAULT_SPORT = "Generico"
+TAG_FIELDS = ("name", "sports", "competitions", "color")
+MEASURED_COLOR_FIELDS = ("width", "height", "palette", "main_color", "dark_color", "suggested_color", "color_analysis")
+INDEX_VERSION = 1
+
+
+class BackgroundCatalog:
+    """In-memory view of background_index.json
+
+    Entries are dicts with "id" plus the index fields (name, sports,
+    competitions, color, paths, width, height, bytes, sha256, palette,
+    main_color, dark_color, suggested_color, variants). Paths are relative
+    to the project root. The measured fields describe the first path;
+    copies with different content have their own under "files" (path ->
+    fields), returned by get() when asked for that path.
+    """
+
+    def __init__(self, entries: Dict[str, dict]):
+        self.entries = {bg_id: {"id": bg_id, **entry} for bg_id, entry in entries.items()}
+        self._by_sport = {}
+        for entry in sorted(self.entries.values(), key=lambda e: e["id"]):
+            for sport in entry.get("sports") or [DEFAULT_SPORT]:
+                self._by_sport.setdefault(sport, []).append(entry)
+
+    @classmethod
+    def load(cls, index_path: str = DEFAULT_INDEX_PATH) -> "BackgroundCatalog":
+        """Load an index file (empty catalog if it does not exist yet)"""
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                return cls(json.load(f).get("backgrounds", {}))
+        except FileNotFoundError:
+            return cls({})
+
+    def __bool__(self) -> bool:
+        return bool(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, bg_id: str) -> Optional[dict]:
+        """Entry for an id, file name or path ("bg15", "bg15.png", "background/bg15.png"), None if unknown"""
+        entry = self.entries.get(os.path.splitext(os.path.basename(bg_id))[0])
+        if entry is not None and bg_id in entry.get("files", ()):
+            return {**entry, **entry["files"][bg_id]}
+        return entry
+
+    def path(self, bg_id: str, directory: Optional[str] = None) -> Optional[str]:
+        """Path of a background, in directory if given, None if not available there"""
+        entry = self.get(bg_id)
+        if entry is None:
+            return None
+        for path in entry["paths"]:
+            if directory is None or os.path.dirname(path) == directory:
+                return path
+        return None
+
+    def color(self, bg_id: str) -> Optional[str]:
+        """Fill color to pair with a background (curated color, else its dominant color)"""
+        entry = self.get(bg_id)
+        return entry and (entry.get("color") or entry.get("main_color"))
+
+    def sports(self) -> List[str]:
+        return list(self._by_sport)
+
+    def for_sport(self, sport: str, directory: Optional[str] = None) -> List[dict]:
+        """Backgrounds tagged with a sport (Generico if none), optionally only those in directory"""
+        entries = self._by_sport.get(sport) or self._by_sport.get(DEFAULT_SPORT, [])
+        if directory is not None:
+            entries = [entry for entry in entries if self.path(entry["id"], directory)]
+        return entries
+
+    def match(self, text: str, directory: Optional[str] = None) -> List[dict]:
+        """Backgrounds for a free-text event: competition tags first, then sport names, then Generico"""
+        text = text.lower()
+        entries = [entry for entry in self.entries.values()
+                   if directory is None or self.path(entry["id"], directory)]
+        entries.sort(key=lambda e: e["id"])
+
+        candidates = [entry for entry in entries
+                      if any(competition.lower() in text for competition in entry.get("competitions", ()))]
+        if not candidates:
+            candidates = [entry for entry in entries
+                          if any(keyword in text for sport in entry.get("sports", ()) if sport != DEFAULT_SPORT
+                                 for keyword in sport.lower().split("/"))]
+        return candidates or self.for_sport(DEFAULT_SPORT, directory)
+
+
+_default_catalog = None
+
+
+def get_background_catalog() -> BackgroundCatalog:
+    """Return the process-wide catalog, loaded once from background_index.json"""
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = BackgroundCatalog.load()
+    return _default_catalog
+
+
+def scan_backgrounds(directories=BACKGROUND_DIRS, index_path: str = DEFAULT_INDEX_PATH,
+                     workers: Optional[int] = None) -> Dict[str, dict]:
+    """Rebuild the index from the image files in directories and write it
+
+    Tags already in the index are kept (new files get sport Generico);
+    colors are recomputed, across worker processes, only for files whose
+    content hash or the color analysis version changed. Files with the
+    same stem in several directories share one entry; every copy is
+    hashed, and one whose content differs from the first gets its own
+    measurements under "files". Region statistics tables (region_stats)
+    are built for files that don't have them yet.
+
+    Returns:
+        The new id -> entry mapping
+    """
+    from color_analyzer import COLOR_ANALYSIS_VERSION, analyze_files
+    from background_variants import list_variants
+    from region_stats import precompute as precompute_region_stats
+    try:
+        from PIL import Image
+    except ImportError:  # Sizes and colors need Pillow; hashes and paths do not
+        Image = None
+
+    previous = BackgroundCatalog.load(index_path).entries
+
+    paths_by_id = {}
+    for directory in directories:
+        if not os.path.isdir(os.path.join(BASE_DIR, directory)):
+            continue
+        for name in sorted(os.listdir(os.path.join(BASE_DIR, directory))):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths_by_id.setdefault(os.path.splitext(name)[0], []).append(f"{directory}/{name}")
+
+    entries, to_analyse = {}, {}
+    for bg_id, paths in sorted(paths_by_id.items()):
+        old = previous.get(bg_id, {})
+        entry = {field: old[field] for field in TAG_FIELDS if field in old}
+        entry.setdefault("name", bg_id)
+        entry.setdefault("sports", [DEFAULT_SPORT])
+
+        entry["paths"] = paths
+        files = {}
+        for path in paths:
+            # Measured fields of the first copy go in the entry, those of differing copies in "files"
+            measured = entry if path == paths[0] else {}
+            previous_fields = old if path == paths[0] else old.get("files", {}).get(path, {})
+            source = os.path.join(BASE_DIR, path)
+            with open(source, "rb") as f:
+                raw = f.read()
+            measured.update(bytes=len(raw), sha256=hashlib.sha256(raw).hexdigest())
+            if path != paths[0] and measured["sha256"] == entry["sha256"]:
+                continue
+
+            if (previous_fields.get("sha256") == measured["sha256"]
+                    and previous_fields.get("color_analysis") == COLOR_ANALYSIS_VERSION):
+                measured.update({field: previous_fields[field] for field in MEASURED_COLOR_FIELDS
+                                 if field in previous_fields})
+            elif Image is not None:
+                with Image.open(source) as img:
+                    measured["width"], measured["height"] = img.size
+                to_analyse[source] = measured
+
+            measured["variants"] = list_variants(source)
+            if path != paths[0]:
+                files[path] = measured
+
+        if files:
+            entry["files"] = files
+        entries[bg_id] = entry
+
+    for source, summary in analyze_files(to_analyse, workers).items():
+        to_analyse[source].update(summary, color_analysis=COLOR_ANALYSIS_VERSION)
+    precompute_region_stats((os.path.join(BASE_DIR, path) for entry in entries.values() for path in entry["paths"]),
+                            workers)
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "backgrounds": entries}, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp_path, index_path)
+
+    global _default_catalog
+    _default_catalog = None
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indice degli sfondi (background_index.json)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    scan_parser = commands.add_parser("scan", help="Scansiona le cartelle degli sfondi e aggiorna l'indice")
+    scan_parser.add_argument("--workers", type=int, default=None,
+                             help="Processi per l'analisi colori (default: uno per core)")
+    list_parser = commands.add_parser("list", help="Elenca gli sfondi (di uno sport)")
+    list_parser.add_argument("sport", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        entries = scan_backgrounds(workers=args.workers)
+        untagged = [bg_id for bg_id, entry in entries.items() if entry["name"] == bg_id]
+        print(f"✅ {len(entries)} sfondi indicizzati in {os.path.relpath(DEFAULT_INDEX_PATH)}")
+        if untagged:
+            print(f"⚠️  Sfondi senza tag (nome/sport da completare): {', '.join(untagged)}")
+        return 0
+
+    catalog = get_background_catalog()
+    if not catalog:
+        print("❌ Indice mancante: esegui 'python3 background_catalog.py scan'", file=sys.stderr)
+        return 1
+    for sport in [args.sport] if args.sport else catalog.sports():
+        print(f"\n{sport}:")
+        for entry in catalog.for_sport(sport):
+            print(f"  {entry['id']:6} {entry['name']:22} {entry.get('width')}x{entry.get('height')}  "
+                  f"{catalog.color(entry['id'])}  {', '.join(entry['paths'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
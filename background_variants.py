@@ -0,0 +1,130 @@
+"""
+Pre-resized background variants
+Crops and resamples a background to the exact pixel size of the area it
+fills, reproducing preserveAspectRatio="xMidYMid slice", so banners embed
+a few KB instead of the full-resolution PNG
+"""
+
+import os
+import math
+import hashlib
+from typing import List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional: without it the original image is embedded
+    Image = None
+
+from asset_cache import mark_used, prune_cache_dir
+
+DEFAULT_VARIANTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asset_cache", "backgrounds")
+MAX_VARIANTS_BYTES = 128 * 1024 * 1024  # Variants kept in DEFAULT_VARIANTS_DIR
+
+
+def slice_crop_box(src_width: int, src_height: int, dst_width: float, dst_height: float) -> Tuple[float, float, float, float]:
+    """Source region shown by xMidYMid slice when filling dst_width x dst_height
+
+    The image is scaled to cover the area and centered, so the visible part
+    of the source is the largest centered box with the target aspect ratio.
+
+    Returns:
+        (left, top, right, bottom) in source pixels
+    """
+    scale = max(dst_width / src_width, dst_height / src_height)
+    visible_w = dst_width / scale
+    visible_h = dst_height / scale
+    # Clamp rounding noise so the box never leaves the source
+    left = max(0.0, (src_width - visible_w) / 2)
+    top = max(0.0, (src_height - visible_h) / 2)
+    return (left, top, min(float(src_width), left + visible_w), min(float(src_height), top + visible_h))
+
+
+def variant_pixel_size(width: float, height: float, scale: int = 1) -> Tuple[int, int]:
+    """Pixel size of the variant for an area of width x height at the given density"""
+    return (max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale)))
+
+
+def get_background_variant(path: str, width: float, height: float, scale: int = 1,
+                           variants_dir: str = DEFAULT_VARIANTS_DIR) -> Optional[str]:
+    """Return the path of a background cropped and resized for an area
+
+    Variants are cached on disk, keyed by source path, size, mtime and
+    target pixel size, so each one is computed only once (least recently
+    used are deleted beyond MAX_VARIANTS_BYTES).
+
+    Args:
+        path: Source background image
+        width, height: Area size in SVG user units (the template geometry)
+        scale: Pixel density (1 = exact size, 2 = retina)
+
+    Returns:
+        Path to the PNG variant, or None if Pillow is missing or the source can't be read
+    """
+    if Image is None:
+        return None
+
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    pixel_w, pixel_h = variant_pixel_size(width, height, scale)
+    variant_path = os.path.join(variants_dir, f"{_variant_prefix(path, st)}{pixel_w}x{pixel_h}.png")
+
+    if os.path.exists(variant_path):
+        mark_used(variant_path)
+    elif _write_variant(path, variant_path, pixel_w, pixel_h):
+        prune_cache_dir(variants_dir, MAX_VARIANTS_BYTES, keep=variant_path)
+    else:
+        return None
+
+    # A crop of a busy photo can still be heavier than the original file
+    if os.path.getsize(variant_path) >= st.st_size:
+        return None
+
+    return variant_path
+
+
+def list_variants(path: str, variants_dir: str = DEFAULT_VARIANTS_DIR) -> List[str]:
+    """Pixel sizes ("WxH") of the variants already on disk for the current version of path"""
+    try:
+        prefix = _variant_prefix(path, os.stat(path))
+        names = os.listdir(variants_dir)
+    except OSError:
+        return []
+    sizes = [name[len(prefix):-len(".png")] for name in names if name.startswith(prefix) and name.endswith(".png")]
+    return sorted(sizes, key=lambda size: tuple(int(n) for n in size.split("x")))
+
+
+def _variant_prefix(path: str, st: os.stat_result) -> str:
+    # Variant names carry a digest of the source path, size and mtime: an edited file gets new variants
+    source_key = f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    digest = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}_{digest}_"
+
+
+def _write_variant(path: str, variant_path: str, pixel_w: int, pixel_h: int) -> bool:
+    """Crop/resample path into variant_path, False if the source can't be processed"""
+    try:
+        with Image.open(path) as img:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+            box = slice_crop_box(img.width, img.height, pixel_w, pixel_h)
+
+            # Never upscale: if the area is larger than the visible source
+            # region, only crop and let the renderer scale it
+            crop_w, crop_h = box[2] - box[0], box[3] - box[1]
+            if pixel_w > crop_w:
+                pixel_w, pixel_h = max(1, round(crop_w)), max(1, round(crop_h))
+
+            variant = img.resize((pixel_w, pixel_h), Image.LANCZOS, box=box)
+
+        os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+        tmp_path = f"{variant_path}.{os.getpid()}.tmp"
+        variant.save(tmp_path, format="PNG", optimize=True)
+        os.replace(tmp_path, variant_path)
+    except OSError:
+        return False
+
+    return True
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Render benchmark
+Times every stage of a banner render (load_fonts, load_template, layout
+per component type, SVG serialisation plain and compact, file write, PNG
+rasterisation) for each template and for short, long and extreme text
+fixtures, records the output sizes, writes the results as JSON and
+compares them with a stored baseline (bench_baseline.json) so slowdowns
+and size growth are caught.
+
+Timings are medians of --repeat runs after one warm-up run, in the same
+process (asset, variant and font caches warm); load_fonts and
+load_template are measured cold (in-memory caches cleared each run).
+
+Usage:
+    python3 benchmark.py                          # tutto, confronto con la baseline
+    python3 benchmark.py --templates 728x90 --fixtures long --repeat 10
+    python3 benchmark.py --json risultati.json    # risultati macchina ('-' = stdout)
+    python3 benchmark.py --save-baseline          # aggiorna bench_baseline.json
+    python3 benchmark.py --no-png --repeat 1 --trace trace.json   # profilo per componente
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import tempfile
+from typing import Callable, Dict, List, Optional
+
+import template_plan
+from asset_cache import get_asset_cache
+from raster_renderer import Image, RasterRenderer
+from render_profiler import RenderProfiler
+from svg_serializer import SvgSerializer
+from template_engine import TemplateEngine, load_template
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE_PATH = os.path.join(BASE_DIR, "bench_baseline.json")
+TEMPLATES_DIR = "templates"
+BENCHMARK_VERSION = 1
+
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25      # Slowdown (fraction of the baseline) reported as a regression
+DEFAULT_MIN_DELTA_MS = 1.0    # ...only when also slower by at least this much (timer noise)
+DEFAULT_BYTES_TOLERANCE = 0.01
+
+BACKGROUND = {"path": "background/bg15.png", "color": "#8B0000"}
+IMAGES = {
+    "user_image": "images/calcio.jpg",
+    "logo_small_dark": "images/G_bianco.png",
+    "logo_large_dark": "images/logo_gazzetta_bianco.png",
+}
+
+FIXTURES = {
+    "short": {
+        "header_text": "PROMO",
+        "main_title": "BOLOGNA",
+        "header_title_combined": "PROMO: BOLOGNA",
+        "description_text": "FORZA BOLOGNA",
+        "cta_text": "VAI",
+        "price": "0,99€",
+        "price_period": "/MESE",
+    },
+    "long": {
+        "header_text": "PROMO FLASH SUPER ESCLUSIVA",
+        "main_title": "IMPRESA STRAORDINARIA BOLOGNA CHAMPIONS",
+        "header_title_combined": "PROMO FLASH SUPER ESCLUSIVA: IMPRESA STRAORDINARIA BOLOGNA CHAMPIONS",
+        "description_text": "FESTEGGIA LA\nVITTORIA DEL\nBOLOGNA IN\nCOPPA ITALIA",
+        "cta_text": "ABBONATI SUBITO ORA",
+        "price": "14,99€",
+        "price_period": "/ANNO",
+    },
+    "extreme": {
+        "header_text": "PRECIPITEVOLISSIMEVOLMENTE " * 4,
+        "main_title": " ".join(["IMPRESA STRAORDINARIA DEL BOLOGNA ALL'ULTIMO RESPIRO"] * 6),
+        "header_title_combined": "ESCLUSIVA ASSOLUTA: " + " ".join(["CITTÀ, PERCHÉ, PIÙ, COSÌ"] * 8),
+        "description_text": "\n".join(["FESTEGGIA LA VITTORIA DEL BOLOGNA IN COPPA ITALIA"] * 10),
+        "cta_text": "ABBONATI SUBITO ORA A SOLI 14,99€ ALL'ANNO",
+        "price": "1499,99€",
+        "price_period": "/ANNO SOLARE",
+    },
+}
+
+
+def template_names() -> List[str]:
+    return sorted((os.path.splitext(name)[0] for name in os.listdir(os.path.join(BASE_DIR, TEMPLATES_DIR))
+                   if name.endswith(".json")), key=lambda name: [int(n) for n in name.split("x")])
+
+
+def measure(func: Callable, repeat: int, warmup: int = 1) -> Dict[str, float]:
+    """Median and minimum wall time of func() in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median": round(statistics.median(samples), 3), "min": round(min(samples), 3)}
+
+
+def environment() -> Dict[str, str]:
+    """Machine and library versions the timings depend on"""
+    def version(module):
+        try:
+            return __import__(module).__version__
+        except (ImportError, AttributeError):
+            return None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pillow": version("PIL"),
+        "numpy": version("numpy"),
+        "fonttools": version("fontTools"),
+    }
+
+
+def content_data(fixture: str) -> Dict[str, str]:
+    cache = get_asset_cache()
+    data = dict(FIXTURES[fixture])
+    for key, path in IMAGES.items():
+        data[key] = cache.data_uri(path)
+    return data
+
+
+def run_benchmark(templates: Optional[List[str]] = None, fixtures: Optional[List[str]] = None,
+                  repeat: int = DEFAULT_REPEAT, png: bool = True, progress=None) -> dict:
+    """Benchmark the given templates x fixtures (default: all)
+
+    Returns:
+        {"version", "environment", "repeat", "timings_ms": {metric: {"median", "min"}},
+         "bytes": {metric: size}} with metrics named "<template>/<fixture>/<stage>"
+    """
+    templates = templates or template_names()
+    fixtures = fixtures or list(FIXTURES)
+    png = png and Image is not None
+    timings, sizes = {}, {}
+
+    def load_fonts_cold():
+        get_asset_cache().clear()
+        TemplateEngine().load_fonts()
+
+    timings["load_fonts"] = measure(load_fonts_cold, repeat)
+
+    engine = TemplateEngine(fragment_cache=False)  # Every run lays out and serialises from scratch
+    engine.load_fonts()
+    engine.set_background(dict(BACKGROUND))
+    rasterizer = RasterRenderer(engine) if png else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in templates:
+            path = os.path.join(TEMPLATES_DIR, f"{name}.json")
+
+            def load_template_cold():
+                template_plan._plan_cache.clear()
+                return load_template(path)
+
+            timings[f"{name}/load_template"] = measure(load_template_cold, repeat)
+            plan = load_template(path)
+
+            for fixture in fixtures:
+                prefix = f"{name}/{fixture}"
+                if progress:
+                    progress(prefix)
+                engine.set_content_data(content_data(fixture))
+
+                timings[f"{prefix}/render_template"] = measure(lambda: engine.render_template(plan), repeat)
+                timings[f"{prefix}/layout"] = measure(lambda: engine.layout(plan), repeat)
+                for component_type, timing in measure_components(engine, plan, repeat).items():
+                    timings[f"{prefix}/component/{component_type}"] = timing
+
+                tree = engine.layout(plan)
+                timings[f"{prefix}/serialize"] = measure(lambda: SvgSerializer(engine).serialize(tree), repeat)
+                svg = SvgSerializer(engine).serialize(tree)
+                sizes[f"{prefix}/svg"] = len(svg.encode("utf-8"))
+
+                engine.compact_svg = True  # Same engine: no fragment cache to keep apart
+                timings[f"{prefix}/serialize_compact"] = measure(lambda: SvgSerializer(engine).serialize(tree), repeat)
+                sizes[f"{prefix}/svg_compact"] = len(SvgSerializer(engine).serialize(tree).encode("utf-8"))
+                engine.compact_svg = False
+
+                svg_path = os.path.join(tmp_dir, f"{name}_{fixture}.svg")
+
+                def write_svg():
+                    with open(svg_path, "w", encoding="utf-8") as f:
+                        f.write(svg)
+
+                timings[f"{prefix}/write"] = measure(write_svg, repeat)
+
+                if rasterizer:
+                    def rasterize():
+                        buffer = io.BytesIO()
+                        rasterizer.render(tree).save(buffer, format="PNG", optimize=True)
+                        return buffer
+
+                    timings[f"{prefix}/rasterize"] = measure(rasterize, repeat)
+                    sizes[f"{prefix}/png"] = len(rasterize().getvalue())
+
+    return {"version": BENCHMARK_VERSION, "environment": environment(), "repeat": repeat,
+            "timings_ms": timings, "bytes": sizes}
+
+
+def measure_components(engine: TemplateEngine, plan, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Layout time of the components of plan, summed per component type"""
+    by_type = {}
+    for component in plan.components:
+        by_type.setdefault(component.type, []).append(component)
+
+    def lay_out(components):
+        return lambda: [engine._component_layout(component, plan.width, plan.height) for component in components]
+
+    return {component_type: measure(lay_out(components), repeat) for component_type, components in by_type.items()}
+
+
+def profile_renders(templates: Optional[List[str]] = None, fixtures: Optional[List[str]] = None) -> RenderProfiler:
+    """One profiled render per template x fixture, each in its own trace section"""
+    engine = TemplateEngine(fragment_cache=False)
+    engine.load_fonts()
+    engine.set_background(dict(BACKGROUND))
+    with engine.profile() as profiler:
+        for name in templates or template_names():
+            plan = load_template(os.path.join(TEMPLATES_DIR, f"{name}.json"))
+            for fixture in fixtures or list(FIXTURES):
+                engine.set_content_data(content_data(fixture))
+                with profiler.section(f"{name}/{fixture}"):
+                    engine.render_template(plan)
+    return profiler
+
+
+def compare(results: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS, bytes_tolerance: float = DEFAULT_BYTES_TOLERANCE) -> dict:
+    """Differences from a baseline
+
+    A timing regresses when its median is slower by more than tolerance
+    (fraction) and min_delta_ms; a size when it grows by more than
+    bytes_tolerance. Metrics missing on either side are listed apart.
+
+    Returns:
+        {"regressions": [...], "improvements": [...], "size_changes": [...],
+         "missing": [...], "new": [...], "same_environment": bool}
+        with entries (metric, baseline, current)
+    """
+    report = {"regressions": [], "improvements": [], "size_changes": [], "missing": [], "new": [],
+              "same_environment": results.get("environment") == baseline.get("environment")}
+
+    current, previous = results["timings_ms"], baseline.get("timings_ms", {})
+    for metric in sorted(current.keys() | previous.keys()):
+        if metric not in previous:
+            report["new"].append(metric)
+        elif metric not in current:
+            report["missing"].append(metric)
+        else:
+            before, after = previous[metric]["median"], current[metric]["median"]
+            if after - before > max(min_delta_ms, before * tolerance):
+                report["regressions"].append((metric, before, after))
+            elif before - after > max(min_delta_ms, before * tolerance):
+                report["improvements"].append((metric, before, after))
+
+    current, previous = results["bytes"], baseline.get("bytes", {})
+    for metric in sorted(current.keys() & previous.keys()):
+        before, after = previous[metric], current[metric]
+        if before != after:
+            report["size_changes"].append((metric, before, after))
+            if after > before * (1 + bytes_tolerance):
+                report["regressions"].append((f"{metric} (bytes)", before, after))
+    return report
+
+
+def print_results(results: dict, out):
+    timings, sizes = results["timings_ms"], results["bytes"]
+    print(f"\n⏱️  load_fonts: {timings['load_fonts']['median']:.1f} ms", file=out)
+    rows = list(dict.fromkeys(metric.rsplit("/", 1)[0] for metric in timings if metric.count("/") == 2))
+    stages = ("render_template", "layout", "serialize", "serialize_compact", "write", "rasterize")
+    print(f"\n{'template/fixture':26}" + "".join(f"{stage:>18}" for stage in stages)
+          + f"{'SVG':>12}{'compact':>12}{'PNG':>12}", file=out)
+    for row in rows:
+        cells = "".join(f"{timings[f'{row}/{stage}']['median']:15.1f} ms" if f"{row}/{stage}" in timings
+                        else f"{'-':>18}" for stage in stages)
+        svg, compact, png = sizes.get(f"{row}/svg"), sizes.get(f"{row}/svg_compact"), sizes.get(f"{row}/png")
+        print(f"{row:26}{cells}{_kb(svg):>12}{_kb(compact):>12}{_kb(png):>12}", file=out)
+
+    components = [metric for metric in timings if "/component/" in metric]
+    if components:
+        print("\nLayout per tipo di componente (ms):", file=out)
+        for metric in components:
+            print(f"  {metric:50} {timings[metric]['median']:8.2f}", file=out)
+
+
+def print_comparison(report: dict, out):
+    if not report["same_environment"]:
+        print("\n⚠️  Baseline registrata su un'altra macchina/versione: tempi poco confrontabili", file=out)
+    for title, key in (("❌ Regressioni", "regressions"), ("✅ Miglioramenti", "improvements"),
+                       ("📦 Dimensioni cambiate", "size_changes")):
+        if report[key]:
+            print(f"\n{title}:", file=out)
+            for metric, before, after in report[key]:
+                change = (after - before) / before * 100 if before else 0
+                print(f"  {metric:50} {before:>10} → {after:<10} ({change:+.0f}%)", file=out)
+    if report["missing"] or report["new"]:
+        print(f"\nℹ️  Metriche non presenti nella baseline: {len(report['new'])}, "
+              f"assenti in questa esecuzione: {len(report['missing'])}", file=out)
+    if not report["regressions"]:
+        print("\n✅ Nessuna regressione rispetto alla baseline", file=out)
+
+
+def _kb(size):
+    return f"{size / 1024:.1f} KB" if size is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del rendering dei banner")
+    parser.add_argument("--templates", nargs="+", choices=template_names(), help="Template (default: tutti)")
+    parser.add_argument("--fixtures", nargs="+", choices=list(FIXTURES), help="Testi di prova (default: tutti)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Ripetizioni per misura (default: %(default)s)")
+    parser.add_argument("--no-png", action="store_true", help="Salta la rasterizzazione PNG")
+    parser.add_argument("--json", metavar="PATH", help="Scrivi i risultati in JSON ('-' per stdout)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="File baseline (default: bench_baseline.json)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="Profila un render per template/testo e salva una trace Chrome (chrome://tracing, Perfetto)")
+    parser.add_argument("--save-baseline", action="store_true", help="Salva questi risultati come baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Rallentamento tollerato, frazione della baseline (default: %(default)s)")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="Rallentamento minimo in ms per segnalare una regressione (default: %(default)s)")
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    out = sys.stderr if args.json == "-" else sys.stdout
+
+    results = run_benchmark(args.templates, args.fixtures, max(1, args.repeat), not args.no_png,
+                            progress=lambda prefix: print(f"⏳ {prefix}", file=sys.stderr, flush=True))
+    print_results(results, out)
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"\n💾 Baseline salvata in {os.path.relpath(args.baseline)}", file=out)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            report = compare(results, json.load(f), args.tolerance, args.min_delta)
+        print_comparison(report, out)
+        results["comparison"] = report
+        status = 1 if report["regressions"] else 0
+    else:
+        print(f"\nℹ️  Nessuna baseline ({os.path.relpath(args.baseline)}): usa --save-baseline", file=out)
+
+    if args.trace:
+        profiler = profile_renders(args.templates, args.fixtures)
+        profiler.write_chrome_trace(args.trace)
+        print(f"\n🔎 Componenti più pesanti (trace in {args.trace}):", file=out)
+        for row in profiler.summary()[:10]:
+            print(f"  {row['section']:20} {row['id']:22} {row['type']:18} {_kb(row['bytes']):>12} "
+                  f"{row['layout_ms'] + row['serialize_ms']:8.2f} ms", file=out)
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    elif args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+Output weight budgets
+Templates may declare "max_bytes" (and optionally "image_formats"): when
+the SVG of a banner would be heavier, its embedded raster images
+(backgrounds and user images) are re-encoded as JPEG/WebP, at the highest
+quality that fits their share of the budget and downscaled if even the
+lowest quality is too heavy; logos are left untouched. Each chosen
+encoding is cached on disk, keyed by asset hash, target pixel size and
+byte budget, so a campaign pays for the quality search once per image
+and size.
+"""
+
+import io
+import os
+import math
+import base64
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is optional: without it budgets are not enforced
+    Image = None
+
+from asset_cache import mark_used, prune_cache_dir
+from layout_tree import ByteBudget, ImageNode, LayoutTree
+
+DEFAULT_ENCODED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asset_cache", "encoded")
+MAX_ENCODED_BYTES = 64 * 1024 * 1024  # Encodings kept in DEFAULT_ENCODED_DIR
+DEFAULT_IMAGE_FORMATS = ByteBudget.formats
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+MIN_QUALITY = 30
+MAX_QUALITY = 90
+DOWNSCALE_STEP = 0.8      # Each downscale keeps 80% of the width and height
+MIN_SCALE = 0.3           # ...down to 30% of the displayed size at most
+MIN_IMAGE_SHARE = 2048    # Bytes of data URI granted to each image even when text alone is over budget
+BUDGET_PASSES = 4         # Serialisations spent tightening the shares of a document still over budget
+ENCODING_VERSION = 1      # Bump when the search changes: cached encodings are recomputed
+
+
+def fit_budget(serializer, tree: LayoutTree) -> Dict[str, str]:
+    """Replacement files for the images of tree that bring its SVG under tree.budget
+
+    The images' share of the budget (what remains after the rest of the
+    document) is split in proportion to the area each source covers, then
+    divided by the times that source is embedded (the background is drawn
+    both as tree background and by background_layer components). While the
+    re-encoded document is still too heavy the shares are tightened by the
+    excess, for up to BUDGET_PASSES serialisations. Logos (logo_* content
+    and LOGO_VARIANTS files) keep their original encoding.
+
+    Returns:
+        Dict image source (file path or data URI) -> re-encoded file; empty
+        when already under budget, with no budget, without Pillow or in
+        referenced-asset mode (images are not part of the SVG there)
+    """
+    budget = tree.budget
+    _use_replacements(serializer, {})
+    if budget is None or Image is None or serializer.engine.asset_publisher is not None:
+        return {}
+
+    total = serializer._size(tree)
+    logos = _logo_sources(serializer.engine)
+    groups = {}  # Embedded source -> [nodes]
+    for node in tree.nodes():
+        if isinstance(node, ImageNode) and node.source not in logos:
+            groups.setdefault(serializer._image_source(node), []).append(node)
+    if total <= budget.max_bytes or not groups:
+        return {}
+
+    embeds = sum(len(nodes) for nodes in groups.values())
+    href_bytes = sum(len(serializer._href(source)) * len(nodes) for source, nodes in groups.items())
+    areas = {source: sum(max(1.0, node.box.width * node.box.height) for node in nodes)
+             for source, nodes in groups.items()}
+    total_area = sum(areas.values())
+    available = budget.max_bytes - (total - href_bytes)
+
+    scale = serializer.engine.background_scale
+    replacements = {}
+    for _ in range(BUDGET_PASSES):
+        available = max(available, MIN_IMAGE_SHARE * embeds)
+        replacements = {}
+        for source, nodes in groups.items():
+            share = int(available * areas[source] / total_area / len(nodes))
+            pixel_size = (math.ceil(max(node.box.width for node in nodes) * scale),
+                          math.ceil(max(node.box.height for node in nodes) * scale))
+            encoded = encode_within(source, pixel_size, nodes[0].fit, share, budget.formats)
+            if encoded and _data_uri_length(os.path.getsize(encoded), encoded) < len(serializer._href(source)):
+                replacements[source] = encoded
+
+        _use_replacements(serializer, replacements)
+        size = serializer._size(tree)
+        if size <= budget.max_bytes or available <= MIN_IMAGE_SHARE * embeds:
+            break
+        available -= size - budget.max_bytes
+    return replacements
+
+
+def _use_replacements(serializer, replacements: Dict[str, str]):
+    serializer.replacements = replacements
+    serializer._replacements_key = tuple(sorted(replacements.items()))
+
+
+def _logo_sources(engine) -> set:
+    """Logo images of the engine (uploaded logo_* content and the G/Gazzetta files), never re-encoded"""
+    sources = {value for key, value in engine.content_data.items() if key.startswith("logo_") and value}
+    sources.update(path for files in engine.LOGO_VARIANTS.values() for path in files)
+    return sources
+
+
+def encode_within(source: str, pixel_size: Tuple[int, int], fit: str, max_uri_bytes: int,
+                  formats: Sequence[str] = DEFAULT_IMAGE_FORMATS,
+                  encoded_dir: str = DEFAULT_ENCODED_DIR) -> Optional[str]:
+    """File of source re-encoded so its data URI takes at most max_uri_bytes
+
+    The image is first reduced to the pixels it is displayed at (covering
+    pixel_size for fit "slice", inside it for "meet", never upscaled).
+    The best of formats is the one reaching the highest quality; if none
+    fits even at MIN_QUALITY the image is downscaled step by step, and
+    the smallest attempt is kept when MIN_SCALE is not enough either.
+    Images with transparency only use formats that keep it (WebP).
+
+    Encodings are cached in encoded_dir (least recently used are deleted
+    beyond MAX_ENCODED_BYTES).
+
+    Returns:
+        Path of the cached encoding, None if source can't be decoded
+    """
+    raw = _source_bytes(source)
+    if raw is None:
+        return None
+
+    key = f"{hashlib.sha256(raw).hexdigest()}:{pixel_size}:{fit}:{max_uri_bytes}:{tuple(formats)}:{ENCODING_VERSION}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+    for ext in set(EXTENSIONS.values()):
+        cached = os.path.join(encoded_dir, f"{digest}{ext}")
+        if os.path.exists(cached):
+            mark_used(cached)
+            return cached
+
+    try:
+        with Image.open(io.BytesIO(raw)) as img:
+            img.load()
+            image = _displayed(img, pixel_size, fit)
+    except OSError:
+        return None
+
+    formats = _usable_formats(image, formats)
+    if not formats:
+        return None
+    best = _search(image, formats, max_uri_bytes)
+
+    fmt, data = best
+    path = os.path.join(encoded_dir, f"{digest}{EXTENSIONS[fmt]}")
+    os.makedirs(encoded_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    prune_cache_dir(encoded_dir, MAX_ENCODED_BYTES, keep=path)
+    return path
+
+
+def _search(image, formats: List[str], max_uri_bytes: int) -> Tuple[str, bytes]:
+    """(format, bytes) of the best encoding under max_uri_bytes, else the smallest tried"""
+    smallest = None
+    scale = 1.0
+    while True:
+        scaled = image if scale == 1.0 else image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+        candidates = []
+        for fmt in formats:
+            limit = _raw_limit(max_uri_bytes, fmt)
+            low, high, found = MIN_QUALITY, MAX_QUALITY, None
+            while low <= high:  # Highest quality whose encoding fits
+                quality = (low + high) // 2
+                data = _encode(scaled, fmt, quality)
+                if smallest is None or len(data) < len(smallest[1]):
+                    smallest = (fmt, data)
+                if len(data) <= limit:
+                    found = (quality, fmt, data)
+                    low = quality + 1
+                else:
+                    high = quality - 1
+            if found:
+                candidates.append(found)
+        if candidates:
+            quality, fmt, data = max(candidates, key=lambda c: (c[0], -len(c[2])))
+            return fmt, data
+        scale *= DOWNSCALE_STEP
+        if scale < MIN_SCALE:
+            return smallest
+
+
+def _displayed(img, pixel_size: Tuple[int, int], fit: str):
+    """img reduced to the pixels it covers on the banner (no upscaling), in RGB or RGBA"""
+    has_alpha = img.mode in ("RGBA", "LA", "PA") or "transparency" in img.info
+    img = img.convert("RGBA" if has_alpha else "RGB")
+    target_w, target_h = pixel_size
+    ratio = (max if fit == "slice" else min)(target_w / img.width, target_h / img.height)
+    if ratio < 1:
+        img = img.resize((max(1, round(img.width * ratio)), max(1, round(img.height * ratio))), Image.LANCZOS)
+    return img
+
+
+def _usable_formats(image, formats: Sequence[str]) -> List[str]:
+    usable = [fmt for fmt in formats if fmt in EXTENSIONS and (fmt != "webp" or features.check("webp"))]
+    if image.mode == "RGBA":
+        if image.getextrema()[3][0] == 255:
+            return usable  # Alpha channel present but fully opaque
+        usable = [fmt for fmt in usable if fmt == "webp"]
+    return usable
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        image.convert("RGB").save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def _raw_limit(max_uri_bytes: int, fmt: str) -> int:
+    """Largest encoded size whose data URI fits max_uri_bytes"""
+    header = len(f"data:image/{fmt};base64,")
+    return max(0, (max_uri_bytes - header) // 4 * 3)
+
+
+def _data_uri_length(size: int, path: str) -> int:
+    return len(f"data:image/{os.path.splitext(path)[1][1:]};base64,") + 4 * math.ceil(size / 3)
+
+
+def _source_bytes(source: str) -> Optional[bytes]:
+    if source.startswith("data:"):
+        try:
+            return base64.b64decode(source.split(",", 1)[1])
+        except (IndexError, ValueError):
+            return None
+    try:
+        with open(source, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
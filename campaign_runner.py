@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+Campaign runner - non-interactive batch generation
+Renders every banner of a campaign manifest (JSON or CSV list of events
+with price, sport, texts, background and templates) without prompts.
+Events are rendered by a bounded process pool with one warm engine per
+worker; a journal in the output directory records each finished banner,
+so re-running the same command after a failure or an interruption only
+renders what is missing.
+
+Usage:
+    python3 campaign_runner.py campagna.json [--output output/campagna] [--workers 4] [--force]
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import itertools
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from template_engine import TemplateEngine, load_template
+from asset_cache import get_asset_cache
+from background_catalog import CLI_BACKGROUNDS_DIR, get_background_catalog
+from gazzetta_multi_generator import build_content_data
+
+TEMPLATES_DIR = "templates"
+JOURNAL_NAME = "campaign_state.jsonl"
+
+# Texts every event must provide (same keys as the AI variants of step 2)
+TEXT_FIELDS = ("header", "main_title", "subtitle", "cta")
+
+# Jobs queued per worker beyond the running one (keeps the pool bounded on long manifests)
+QUEUE_PER_WORKER = 2
+
+
+class ManifestError(ValueError):
+    """Invalid campaign manifest"""
+
+
+def load_manifest(path):
+    """Load and validate a campaign manifest
+
+    JSON: a list of events, or {"defaults": {...}, "events": [...]} where
+    defaults fill the fields an event leaves out. Texts go in a "texts"
+    object or as top-level header/main_title/subtitle/cta fields.
+    CSV: one event per row with the same field names as columns;
+    templates separated by ";".
+
+    Returns:
+        List of normalised event dicts (id, event_type, price, sport, texts,
+        background, color, templates, user_image)
+
+    Raises:
+        ManifestError: Unreadable manifest or invalid events (all errors listed)
+    """
+    try:
+        if path.lower().endswith(".csv"):
+            with open(path, newline="", encoding="utf-8-sig") as f:
+                raw_events, defaults = list(csv.DictReader(f)), {}
+        else:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                raw_events, defaults = data.get("events", []), data.get("defaults", {})
+            else:
+                raw_events, defaults = data, {}
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"{path}: {e}") from None
+
+    if not isinstance(raw_events, list) or not raw_events:
+        raise ManifestError(f"{path}: nessun evento nel manifest")
+
+    events, errors, seen = [], [], set()
+    for index, raw in enumerate(raw_events, 1):
+        try:
+            event = normalize_event({**defaults, **_drop_empty(raw)}, index)
+            if event["id"] in seen:
+                raise ManifestError(f"id duplicato '{event['id']}'")
+            seen.add(event["id"])
+            events.append(event)
+        except ManifestError as e:
+            errors.append(f"evento {index}: {e}")
+
+    if errors:
+        raise ManifestError("\n".join(errors))
+    return events
+
+
+def normalize_event(raw, index):
+    """Validate one manifest entry and fill its defaults"""
+    if not isinstance(raw, dict):
+        raise ManifestError("atteso un oggetto")
+
+    texts = dict(raw.get("texts") or {})
+    for field in TEXT_FIELDS:
+        if raw.get(field):
+            texts[field] = raw[field]
+    missing = [field for field in TEXT_FIELDS if not texts.get(field)]
+    if missing:
+        raise ManifestError(f"testi mancanti: {', '.join(missing)}")
+
+    if not raw.get("price"):
+        raise ManifestError("prezzo mancante")
+
+    event_type = raw.get("event_type", "")
+    event_id = _slug(raw.get("id") or event_type) or f"evento-{index}"
+
+    templates = raw.get("templates") or sorted(os.listdir(TEMPLATES_DIR))
+    if isinstance(templates, str):
+        templates = [name for name in re.split(r"[;,|]", templates) if name.strip()]
+    templates = [_template_file(name) for name in templates]
+    unknown = [name for name in templates if not os.path.exists(os.path.join(TEMPLATES_DIR, name))]
+    if unknown:
+        raise ManifestError(f"template inesistenti: {', '.join(unknown)}")
+
+    user_image = raw.get("user_image") or None
+    if user_image and not os.path.exists(user_image):
+        raise ManifestError(f"immagine non trovata: {user_image}")
+
+    return {
+        "id": event_id,
+        "event_type": event_type,
+        "price": str(raw["price"]),
+        "sport": raw.get("sport") or "Generico",
+        "texts": {field: texts[field] for field in TEXT_FIELDS},
+        "background": raw.get("background") or None,
+        "color": raw.get("color") or None,
+        "templates": list(dict.fromkeys(templates)),
+        "user_image": user_image,
+    }
+
+
+def background_path(event):
+    """Background file of an event (file from the manifest or first of its sport)
+
+    Ids and file names are looked up in background_index.json; a path
+    with a directory is used as is.
+    """
+    catalog = get_background_catalog()
+    name = event["background"]
+    if name is None:
+        sport_backgrounds = catalog.for_sport(event["sport"], CLI_BACKGROUNDS_DIR)
+        if not sport_backgrounds:
+            raise FileNotFoundError(f"Nessuno sfondo per {event['sport']} nell'indice")
+        name = sport_backgrounds[0]["id"]
+
+    path = name if os.path.dirname(name) else catalog.path(name, CLI_BACKGROUNDS_DIR)
+    if not path:
+        raise FileNotFoundError(f"Background non trovato nell'indice: {name}")
+    return path
+
+
+def resolve_background(event):
+    """Engine background dict for an event (background_path); the fallback
+    color comes from the manifest or the catalog"""
+    path = background_path(event)
+    color = event["color"] or get_background_catalog().color(path) or "#223047"
+    return {
+        "path": path,
+        "image": get_asset_cache().data_uri(path),
+        "main_color": color,
+        "dark_color": color,
+    }
+
+
+def job_digest(event, template_file):
+    """Fingerprint of what a banner depends on: event fields, and size and mtime
+    of the template, user image and background files (replacing one re-renders)"""
+    try:
+        background = background_path(event)
+    except FileNotFoundError:
+        background = None  # The render fails and is retried on the next run
+    files = [_file_stamp(path) for path in (os.path.join(TEMPLATES_DIR, template_file), event["user_image"], background)]
+    payload = json.dumps([event, template_file, files], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _file_stamp(path):
+    """[path, size, mtime] of a file, None if there is none"""
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+class CampaignJournal:
+    """Append-only JSONL record of rendered banners, used to resume a campaign
+
+    Each line is a result dict (event, template, digest, ok, output,
+    seconds[, error]); the last line for an (event, template) pair wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[(entry["event"], entry["template"])] = entry
+                    except (ValueError, KeyError):
+                        continue  # Line cut by an interrupted run
+        self._file = None
+
+    def is_done(self, event, template_file, digest):
+        entry = self.entries.get((event, template_file))
+        return bool(entry and entry["ok"] and entry.get("digest") == digest
+                    and entry.get("output") and os.path.exists(entry["output"]))
+
+    def record(self, result):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.entries[(result["event"], result["template"])] = result
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Pool worker state: one warm engine per process (set by _init_campaign_worker)
+_worker_engine = None
+
+
+def _init_campaign_worker():
+    """Load fonts once per worker process"""
+    global _worker_engine
+    engine = TemplateEngine()
+    engine.load_fonts()
+    _worker_engine = engine
+
+
+def _render_event_job(event, jobs, output_dir):
+    """Render the pending templates of one event with the worker engine, never raising
+
+    Args:
+        jobs: (template_file, digest) pairs to render
+
+    Returns:
+        List of result dicts (event, template, digest, ok, output, seconds[, error])
+    """
+    event_dir = os.path.join(output_dir, event["id"])
+    results = []
+
+    try:
+        user_image = get_asset_cache().data_uri(event["user_image"]) if event["user_image"] else None
+        _worker_engine.set_content_data(build_content_data(event["texts"], user_image, event["price"]))
+        _worker_engine.set_background(resolve_background(event))
+        os.makedirs(event_dir, exist_ok=True)
+    except Exception as e:
+        return [{"event": event["id"], "template": template_file, "digest": digest, "ok": False,
+                 "output": None, "error": str(e), "seconds": 0.0} for template_file, digest in jobs]
+
+    for template_file, digest in jobs:
+        start = time.perf_counter()
+        output_file = os.path.join(event_dir, template_file.replace(".json", ".svg"))
+        result = {"event": event["id"], "template": template_file, "digest": digest}
+        try:
+            template = load_template(os.path.join(TEMPLATES_DIR, template_file))
+            _worker_engine.export(template, {"svg": output_file})
+            result.update(ok=True, output=output_file)
+        except Exception as e:
+            result.update(ok=False, output=None, error=str(e))
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        results.append(result)
+
+    return results
+
+
+def plan_jobs(events, journal, force=False):
+    """Pending (event, [(template_file, digest), ...]) pairs and the number of banners skipped"""
+    pending, skipped = [], 0
+    for event in events:
+        jobs = []
+        for template_file in event["templates"]:
+            digest = job_digest(event, template_file)
+            if not force and journal.is_done(event["id"], template_file, digest):
+                skipped += 1
+            else:
+                jobs.append((template_file, digest))
+        if jobs:
+            pending.append((event, jobs))
+    return pending, skipped
+
+
+def run_campaign(events, output_dir, workers=None, force=False):
+    """Render all banners of a campaign, resuming from the journal in output_dir
+
+    Args:
+        events: Normalised events (load_manifest)
+        output_dir: Banners go to output_dir/<event id>/<template>.svg
+        workers: Worker processes (default: one per CPU core, at most one per
+            pending event; 1 renders sequentially in this process)
+        force: Ignore the journal and render everything again
+
+    Returns:
+        List of result dicts of the banners rendered in this run
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    journal = CampaignJournal(os.path.join(output_dir, JOURNAL_NAME))
+    pending, skipped = plan_jobs(events, journal, force)
+
+    total = sum(len(jobs) for _, jobs in pending)
+    if skipped:
+        print(f"⏭️  {skipped} banner già generati (journal), saltati")
+    if not pending:
+        print("✅ Niente da fare: campagna già completa")
+        return []
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending)))
+
+    print(f"🚀 {total} banner per {len(pending)} eventi ({workers} processi)...")
+    start = time.perf_counter()
+    progress = _Progress(len(pending), start)
+    results = []
+
+    def collect(event_results):
+        for result in event_results:
+            journal.record(result)
+        results.extend(event_results)
+        progress.report(event_results)
+
+    try:
+        done = False
+        if workers > 1:
+            try:
+                _run_in_pool(pending, output_dir, workers, collect)
+                done = True
+            except (OSError, NotImplementedError) as e:
+                # No multiprocessing support here (e.g. missing /dev/shm): render sequentially
+                print(f"⚠️  Rendering parallelo non disponibile ({e}), procedo in sequenza")
+                pending = [(event, [job for job in jobs if not journal.is_done(event["id"], *job)])
+                           for event, jobs in pending]
+
+        if not done:
+            _init_campaign_worker()
+            for event, jobs in pending:
+                if jobs:
+                    collect(_render_event_job(event, jobs, output_dir))
+    finally:
+        journal.close()
+
+    failed = [r for r in results if not r["ok"]]
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Completato! {len(results) - len(failed)}/{total} banner generati in '{output_dir}/' ({elapsed:.2f}s)")
+    if failed:
+        print(f"⚠️  {len(failed)} banner non generati:")
+        for r in failed:
+            print(f"   - {r['event']}/{r['template']}: {r['error']}")
+        print("   Rilancia lo stesso comando per riprovare solo questi banner")
+
+    return results
+
+
+def _run_in_pool(pending, output_dir, workers, collect):
+    """Feed events to pre-initialised workers, at most QUEUE_PER_WORKER + 1 in flight per worker"""
+    queue = iter(pending)
+    limit = workers * (QUEUE_PER_WORKER + 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_campaign_worker) as pool:
+        in_flight = {}
+        while True:
+            while len(in_flight) < limit:
+                item = next(queue, None)
+                if item is None:
+                    break
+                event, jobs = item
+                try:
+                    in_flight[pool.submit(_render_event_job, event, jobs, output_dir)] = item
+                except BrokenProcessPool as e:
+                    # A worker died: the pool takes no more events, the ones left are reported as failed
+                    for event, jobs in itertools.chain((item,), queue):
+                        collect(_failed_results(event, jobs, e))
+                    break
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                event, jobs = in_flight.pop(future)
+                try:
+                    event_results = future.result()
+                except Exception as e:  # Worker died (e.g. BrokenProcessPool)
+                    event_results = _failed_results(event, jobs, e)
+                collect(event_results)
+
+
+def _failed_results(event, jobs, error):
+    """Results of the jobs of an event that never got rendered"""
+    return [{"event": event["id"], "template": template_file, "digest": digest,
+             "ok": False, "output": None, "error": str(error) or type(error).__name__, "seconds": 0.0}
+            for template_file, digest in jobs]
+
+
+class _Progress:
+    """One line per finished event: counter, outcome, time and ETA"""
+
+    def __init__(self, total_events, start):
+        self.total = total_events
+        self.done = 0
+        self.start = start
+
+    def report(self, event_results):
+        self.done += 1
+        ok = sum(1 for r in event_results if r["ok"])
+        seconds = sum(r["seconds"] for r in event_results)
+        elapsed = time.perf_counter() - self.start
+        eta = elapsed / self.done * (self.total - self.done)
+        icon = "✅" if ok == len(event_results) else "❌"
+        print(f"[{self.done}/{self.total}] {icon} {event_results[0]['event']}: "
+              f"{ok}/{len(event_results)} banner ({seconds:.2f}s) - ETA {eta:.0f}s", flush=True)
+
+
+def _template_file(name):
+    name = name.strip()
+    return name if name.endswith(".json") else f"{name}.json"
+
+
+def _slug(value):
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-")
+
+
+def _drop_empty(raw):
+    # CSV cells left blank must not hide the manifest defaults
+    return {key: value for key, value in raw.items() if value not in ("", None)} if isinstance(raw, dict) else raw
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera tutti i banner di una campagna da un manifest JSON/CSV")
+    parser.add_argument("manifest", help="Manifest degli eventi (.json o .csv)")
+    parser.add_argument("--output", default=None,
+                        help="Cartella di uscita (default: output/<nome manifest>)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processi di rendering in parallelo (default: uno per core)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignora il journal e rigenera tutti i banner")
+    args = parser.parse_args()
+
+    try:
+        events = load_manifest(args.manifest)
+    except ManifestError as e:
+        print(f"❌ Manifest non valido:\n{e}", file=sys.stderr)
+        return 2
+
+    output_dir = args.output or os.path.join("output", os.path.splitext(os.path.basename(args.manifest))[0])
+    print(f"📋 {len(events)} eventi da {args.manifest}")
+
+    try:
+        results = run_campaign(events, output_dir, workers=args.workers, force=args.force)
+    except KeyboardInterrupt:
+        print("\n\n⚠️  Interrotto: rilancia lo stesso comando per riprendere")
+        return 130
+
+    return 1 if any(not r["ok"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,37 @@
-"""Color analysis utilities for background images"""
+"""Color analysis utilities for background images
+
+Pixels are quantised into a bit-reduced RGB histogram on NumPy arrays and
+the histogram bins are merged by a few weighted k-means steps, so similar
+shades count as one palette color instead of fragmenting across exact RGB
+values. Results for the background library are computed in batch across
+processes and stored in background_index.json (see background_catalog.py).
+"""
+
+import os
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
 from PIL import Image
-import base64
-from io import BytesIO
-from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: without it Pillow's median cut builds the palette
+    np = None
+
+ANALYSIS_SIZE = 150       # Images are reduced to this size before counting
+HISTOGRAM_BITS = 4        # Bits kept per channel: 16 levels, 4096 bins
+KMEANS_ITERATIONS = 8
+
+# Bump when the palette algorithm changes: stored results are recomputed
+COLOR_ANALYSIS_VERSION = 2
+
+
+def _load_pixels(image_path: str) -> Image.Image:
+    img = Image.open(image_path)
+    img.draft("RGB", (ANALYSIS_SIZE, ANALYSIS_SIZE))  # JPEG: decode at reduced scale
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return img.resize((ANALYSIS_SIZE, ANALYSIS_SIZE), reducing_gap=2.0)
 
 
 def analyze_background_colors(image_path: str, num_colors: int = 5):
@@ -14,30 +42,70 @@ def analyze_background_colors(image_path: str, num_colors: int = 5):
         num_colors: Number of dominant colors to extract
 
     Returns:
-        List of (color_hex, percentage) tuples
+        List of (color_hex, percentage, (r, g, b)) tuples, most dominant first
     """
-    # Open and resize image for faster processing
-    img = Image.open(image_path)
-    img = img.resize((150, 150))  # Small size for speed
-    img = img.convert('RGB')
+    img = _load_pixels(image_path)
+    if np is None:
+        palette = _median_cut_palette(img, num_colors)
+    else:
+        palette = dominant_palette(np.asarray(img).reshape(-1, 3), num_colors)
 
-    # Get all pixels
-    pixels = list(img.getdata())
+    return [('#{:02x}{:02x}{:02x}'.format(*rgb), percentage, rgb) for rgb, percentage in palette]
 
-    # Count color frequencies
-    color_count = Counter(pixels)
-    most_common = color_count.most_common(num_colors)
 
-    total_pixels = len(pixels)
+def dominant_palette(pixels, num_colors: int = 5, bits: int = HISTOGRAM_BITS):
+    """Dominant colors of an (N, 3) uint8 pixel array
 
-    # Convert to hex and percentages
-    results = []
-    for color, count in most_common:
-        hex_color = '#{:02x}{:02x}{:02x}'.format(*color)
-        percentage = (count / total_pixels) * 100
-        results.append((hex_color, percentage, color))
+    Pixels are binned on their top bits per channel; each bin is
+    represented by the mean of its pixels, then bins are clustered by
+    count-weighted k-means seeded with the most populated bins.
 
-    return results
+    Returns:
+        List of ((r, g, b), percentage) pairs sorted by share
+    """
+    pixels = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    if not len(pixels):
+        return []
+
+    shift = 8 - bits
+    quantised = (pixels >> shift).astype(np.int32)
+    bins = (quantised[:, 0] << (2 * bits)) | (quantised[:, 1] << bits) | quantised[:, 2]
+
+    counts = np.bincount(bins, minlength=1 << (3 * bits))
+    occupied = np.flatnonzero(counts)
+    weights = counts[occupied].astype(np.float64)
+    means = np.stack([np.bincount(bins, weights=pixels[:, channel], minlength=len(counts))[occupied]
+                      for channel in range(3)], axis=1) / weights[:, None]
+
+    k = min(num_colors, len(occupied))
+    centers = means[np.argsort(weights)[::-1][:k]]
+    for _ in range(KMEANS_ITERATIONS):
+        distances = ((means[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        labels = distances.argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=k)
+        updated = np.stack([np.bincount(labels, weights=weights * means[:, channel], minlength=k)
+                            for channel in range(3)], axis=1)
+        nonempty = totals > 0
+        updated[nonempty] /= totals[nonempty, None]
+        updated[~nonempty] = centers[~nonempty]
+        if np.allclose(updated, centers):
+            break
+        centers = updated
+
+    distances = ((means[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+    totals = np.bincount(distances.argmin(axis=1), weights=weights, minlength=k)
+    order = np.argsort(totals)[::-1]
+    total_pixels = float(len(pixels))
+    return [(tuple(int(round(c)) for c in centers[i]), float(totals[i] / total_pixels * 100))
+            for i in order if totals[i] > 0]
+
+
+def _median_cut_palette(img, num_colors):
+    quantised = img.quantize(colors=num_colors, method=Image.Quantize.MEDIANCUT)
+    palette = quantised.getpalette()
+    total_pixels = img.width * img.height
+    colors = sorted(quantised.getcolors(), reverse=True)
+    return [(tuple(palette[index * 3:index * 3 + 3]), count / total_pixels * 100) for count, index in colors]
 
 
 def get_complementary_color(rgb_tuple, desaturation=0.3):
@@ -69,41 +137,112 @@ def get_complementary_color(rgb_tuple, desaturation=0.3):
     return '#{:02x}{:02x}{:02x}'.format(r_final, g_final, b_final)
 
 
+def darken_color(rgb_tuple, factor=0.4):
+    """Darker shade of a color (channels scaled by factor), as hex"""
+    return '#{:02x}{:02x}{:02x}'.format(*(int(channel * factor) for channel in rgb_tuple))
+
+
+def color_summary(image_path: str, num_colors: int = 5):
+    """Stored color fields of a background: palette, main/dark color and suggested left color"""
+    colors = analyze_background_colors(image_path, num_colors)
+    dominant_rgb = colors[0][2]
+    return {
+        "palette": [[hex_color, round(percentage, 2)] for hex_color, percentage, _ in colors],
+        "main_color": colors[0][0],
+        "dark_color": darken_color(dominant_rgb),
+        "suggested_color": get_complementary_color(dominant_rgb),
+    }
+
+
+def analyze_files(paths, workers=None):
+    """color_summary() of many images, spread over worker processes
+
+    Args:
+        workers: Processes (default: one per CPU core; 1 analyses in this process)
+
+    Returns:
+        Dict path -> summary (files that can't be read are left out)
+    """
+    paths = list(paths)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                summaries = pool.map(_safe_summary, paths, chunksize=max(1, len(paths) // (workers * 4)))
+                return {path: summary for path, summary in zip(paths, summaries) if summary}
+        except (OSError, NotImplementedError):
+            pass  # No multiprocessing support here: analyse sequentially
+    return {path: summary for path, summary in ((path, _safe_summary(path)) for path in paths) if summary}
+
+
+def _safe_summary(path):
+    try:
+        return color_summary(path)
+    except OSError:
+        return None
+
+
+def stored_summary(image_path: str):
+    """Color summary saved in background_index.json for this exact file, None if absent or stale"""
+    from background_catalog import get_background_catalog
+
+    entry = get_background_catalog().get(image_path)
+    if not entry or "palette" not in entry or entry.get("color_analysis") != COLOR_ANALYSIS_VERSION:
+        return None
+    try:
+        with open(image_path, "rb") as f:
+            if hashlib.sha256(f.read()).hexdigest() != entry.get("sha256"):
+                return None
+    except OSError:
+        return None
+    return entry
+
+
 def suggest_left_background_color(image_path: str):
     """Suggest a background color for the left side based on the image
 
+    Uses the result stored by the batch analysis when the file is in the
+    background index and unchanged, otherwise analyses it now.
+
     Args:
         image_path: Path to the background image
 
     Returns:
         Hex color string
     """
-    colors = analyze_background_colors(image_path, num_colors=3)
+    summary = stored_summary(image_path)
+    source = "indice sfondi"
+    if summary is None:
+        summary = color_summary(image_path)  # Same palette size as the indexed summaries
+        source = "analisi"
 
-    print(f"\n🎨 Analyzing background colors for: {image_path}")
+    print(f"\n🎨 Analyzing background colors for: {image_path} ({source})")
     print(f"   Top 3 dominant colors:")
-    for i, (hex_color, percentage, rgb) in enumerate(colors, 1):
-        print(f"   {i}. {hex_color} ({percentage:.1f}%) - RGB{rgb}")
-
-    # Get the most dominant color
-    dominant_hex, dominant_pct, dominant_rgb = colors[0]
-
-    # Get complementary dark color
-    suggested = get_complementary_color(dominant_rgb)
+    for i, (hex_color, percentage) in enumerate(summary["palette"][:3], 1):
+        print(f"   {i}. {hex_color} ({percentage:.1f}%)")
 
+    suggested = summary["suggested_color"]
     print(f"\n   ✅ Suggested left background: {suggested}")
 
     return suggested
 
 
 if __name__ == "__main__":
-    # Test with bg15.png
     import sys
-
-    if len(sys.argv) > 1:
-        bg_path = sys.argv[1]
-    else:
-        bg_path = "background/bg15.png"
-
-    suggested_color = suggest_left_background_color(bg_path)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analisi colori degli sfondi")
+    parser.add_argument("image", nargs="?", default="background/bg15.png", help="Sfondo da analizzare")
+    parser.add_argument("--batch", action="store_true",
+                        help="Analizza tutta la libreria in parallelo e salva i risultati in background_index.json")
+    parser.add_argument("--workers", type=int, default=None, help="Processi per --batch (default: uno per core)")
+    args = parser.parse_args()
+
+    if args.batch:
+        from background_catalog import scan_backgrounds
+        entries = scan_backgrounds(workers=args.workers)
+        print(f"✅ Colori di {len(entries)} sfondi salvati in background_index.json")
+        sys.exit(0)
+
+    suggested_color = suggest_left_background_color(args.image)
     print(f"\nUse this color in your template: {suggested_color}")
@@ -0,0 +1,44 @@
+"""
+CSS color parsing
+Shared by TemplateEngine ("auto" styles) and the Pillow raster backend;
+hex and rgb()/rgba() need no dependency, color names use Pillow if installed
+"""
+
+import re
+from typing import Optional, Tuple
+
+try:
+    from PIL import ImageColor
+except ImportError:  # Pillow is optional: without it color names can't be parsed
+    ImageColor = None
+
+
+def parse_color(value: Optional[str], opacity: float = 1.0) -> Tuple[int, int, int, int]:
+    """CSS color (hex, rgb(), rgba(), name, transparent) as an RGBA tuple
+
+    Hex and rgb()/rgba() colors are parsed here; names need Pillow
+    (ValueError without it).
+    """
+    if not value or value in ("none", "transparent"):
+        return (0, 0, 0, 0)
+
+    match = re.match(r"rgba?\(([^)]*)\)", value.strip())
+    hex_match = re.fullmatch(r"#([0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})", value.strip())
+    if match:
+        parts = [p.strip() for p in match.group(1).split(",")]
+        r, g, b = (int(float(p)) for p in parts[:3])
+        alpha = float(parts[3]) if len(parts) > 3 else 1.0
+    elif hex_match:
+        digits = hex_match.group(1)
+        if len(digits) <= 4:
+            digits = "".join(digit * 2 for digit in digits)
+        r, g, b = (int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        alpha = int(digits[6:8], 16) / 255 if len(digits) == 8 else 1.0
+    elif ImageColor is None:
+        raise ValueError(f"Color names need Pillow: {value}")
+    else:
+        rgb = ImageColor.getrgb(value)
+        r, g, b = rgb[:3]
+        alpha = rgb[3] / 255 if len(rgb) > 3 else 1.0
+
+    return (r, g, b, round(255 * max(0.0, min(1.0, alpha * float(opacity)))))
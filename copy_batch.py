@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Concurrent copy generation for many events (fixture lists, campaigns)
+Sends the copy_generator prompts through an asyncio backend with a
+concurrency limit, a per-call timeout and retries with exponential
+backoff, optionally packing several events into one request. Results
+stream back in input order as soon as each one (and all before it) is
+ready; the persistent response cache is shared with copy_generator.py.
+
+Usage:
+    python3 copy_batch.py eventi.txt [--concurrency 8] [--pack 4] [--stub] > testi.jsonl
+"""
+
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+from copy_generator import (G_PLUS_PROMPT, VARIANTS_PROMPT, LLMCache, PromptSpec, cache_key,
+                            get_llm_cache, parse_json_response)
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 1.0
+
+PROMPTS = {spec.name: spec for spec in (VARIANTS_PROMPT, G_PLUS_PROMPT)}
+
+PACKED_SUFFIX = """
+Eventi:
+{events}
+
+Rispondi con un unico oggetto JSON con una chiave per evento ("1", "2", ...)
+e come valore il JSON richiesto sopra per quell'evento.
+"""
+
+
+@dataclass(frozen=True)
+class CopyResult:
+    """Copy for one event of a batch
+
+    Attributes:
+        index: Position of the event in the input
+        copy: Parsed JSON copy, None if every attempt failed
+        cached: Served from the response cache
+        error: Last error message when copy is None
+    """
+    index: int
+    event: str
+    copy: Any = None
+    cached: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.copy is not None
+
+
+class OpenAIBackend:
+    """Async OpenAI chat completions (API key from OPENAI_API_KEY)"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Missing OPENAI_API_KEY environment variable. Set it with: export OPENAI_API_KEY='your-key'")
+        from openai import AsyncOpenAI
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def complete(self, spec: PromptSpec, prompt: str, events: Sequence[str], max_tokens: Optional[int]) -> str:
+        options = {"max_tokens": max_tokens} if max_tokens else {}
+        response = await self.client.chat.completions.create(
+            model=spec.model,
+            messages=[
+                {"role": "system", "content": spec.system},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=spec.temperature,
+            **options
+        )
+        return response.choices[0].message.content
+
+
+class StubBackend:
+    """Offline backend for tests and dry runs: canned copy built from the event names
+
+    Args:
+        latency: Seconds each call waits (simulates the API round trip)
+        failures: Number of initial calls that raise, to exercise retries
+    """
+
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+
+    async def complete(self, spec: PromptSpec, prompt: str, events: Sequence[str], max_tokens: Optional[int]) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.calls <= self.failures:
+            raise ConnectionError("stub failure")
+
+        copies = [self._copy(spec, event) for event in events]
+        if len(events) == 1:
+            return json.dumps(copies[0], ensure_ascii=False)
+        return json.dumps({str(i): copy for i, copy in enumerate(copies, 1)}, ensure_ascii=False)
+
+    @staticmethod
+    def _copy(spec, event):
+        title = event.upper()
+        if spec.name == G_PLUS_PROMPT.name:
+            return [{"style": style, "header": header, "main_title": event, "subtitle_text": f"{event} su G+",
+                     "cta_text": cta}
+                    for style, header, cta in (("FOMO", "PROMO FLASH", "ABBONATI ORA"),
+                                               ("Esclusiva", "ESCLUSIVA G+", "ATTIVA SUBITO"),
+                                               ("Soft", "SPECIAL PASS", "ABBONATI"))]
+        return {name: {"header": header, "main_title": title, "subtitle": f"Segui {event} in diretta", "cta": cta}
+                for name, header, cta in (("variant_1_fomo", "ULTIMI GIORNI", "Abbonati ora"),
+                                          ("variant_2_esclusiva", "SOLO SU G+", "Attiva subito"),
+                                          ("variant_3_soft", "TUTTO LO SPORT", "Scopri di più"))}
+
+
+def packed_prompt(spec: PromptSpec, events: Sequence[str]) -> str:
+    """One prompt asking for the copy of several events, answered as {"1": ..., "2": ...}"""
+    if len(events) == 1:
+        return spec.template.format(event_type=events[0])
+    listing = "\n".join(f"{i}. {event}" for i, event in enumerate(events, 1))
+    return spec.template.format(event_type="ciascuno degli eventi elencati sotto") + PACKED_SUFFIX.format(events=listing)
+
+
+def unpack_response(raw_response: str, events: Sequence[str]) -> List[Any]:
+    """Per-event copies of a (packed) response (raises ValueError if one is missing)"""
+    parsed = parse_json_response(raw_response)
+    if len(events) == 1:
+        return [parsed]
+    if not isinstance(parsed, dict):
+        raise ValueError("Packed response is not a JSON object")
+    missing = [str(i) for i in range(1, len(events) + 1) if str(i) not in parsed]
+    if missing:
+        raise ValueError(f"Packed response misses events {', '.join(missing)}")
+    return [parsed[str(i)] for i in range(1, len(events) + 1)]
+
+
+async def generate_copy_stream(events: Sequence[str], spec: PromptSpec = VARIANTS_PROMPT, backend=None,
+                               concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                               retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                               pack: int = 1, cache=None, refresh: bool = False) -> AsyncIterator[CopyResult]:
+    """Generate copy for every event, yielding CopyResults in input order
+
+    Cached events are yielded without a request; the others are grouped
+    in requests of pack events, at most concurrency in flight. A request
+    that fails or exceeds timeout seconds is retried up to retries times,
+    waiting backoff * 2**attempt seconds (with jitter) in between; after
+    that its events are yielded with an error instead of raising.
+
+    Args:
+        backend: Object with async complete(spec, prompt, events, max_tokens) -> str
+            (default: OpenAIBackend)
+    """
+    cache = cache or get_llm_cache()
+    results = [None] * len(events)
+    pending = []
+    for index, event in enumerate(events):
+        cached = None if refresh else cache.get(cache_key(spec, event))
+        if cached is not None:
+            try:
+                results[index] = CopyResult(index, event, parse_json_response(cached), cached=True)
+                continue
+            except ValueError:
+                pass
+        pending.append(index)
+
+    if pending and backend is None:
+        backend = OpenAIBackend()
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pack = max(1, pack)
+    chunks = [pending[i:i + pack] for i in range(0, len(pending), pack)]
+
+    async def run(chunk):
+        chunk_events = [events[index] for index in chunk]
+        prompt = packed_prompt(spec, chunk_events)
+        max_tokens = spec.max_tokens * len(chunk) if spec.max_tokens else None
+        error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                await asyncio.sleep(backoff * 2 ** (attempt - 1) * (1 + random.random()))
+            try:
+                async with semaphore:
+                    raw_response = await asyncio.wait_for(
+                        backend.complete(spec, prompt, chunk_events, max_tokens), timeout)
+                copies = unpack_response(raw_response, chunk_events)
+            except Exception as e:  # Timeout, API or malformed JSON: try again
+                error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+                continue
+            for event, copy in zip(chunk_events, copies):
+                cache.put(cache_key(spec, event), json.dumps(copy, ensure_ascii=False))
+            return [CopyResult(index, events[index], copy) for index, copy in zip(chunk, copies)]
+        return [CopyResult(index, events[index], error=error) for index in chunk]
+
+    tasks = {}
+    for chunk in chunks:
+        task = asyncio.ensure_future(run(chunk))
+        for index in chunk:
+            tasks[index] = task
+
+    try:
+        for index in range(len(events)):
+            if results[index] is None:
+                for result in await tasks[index]:
+                    results[result.index] = result
+            yield results[index]
+    finally:
+        for task in set(tasks.values()):
+            task.cancel()
+
+
+def generate_copy_many(events: Sequence[str], **options) -> List[CopyResult]:
+    """Synchronous wrapper of generate_copy_stream, results in input order"""
+    async def collect():
+        return [result async for result in generate_copy_stream(events, **options)]
+    return asyncio.run(collect())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera i testi per una lista di eventi (JSONL su stdout)")
+    parser.add_argument("events", help="File con un evento per riga ('-' per stdin)")
+    parser.add_argument("--prompt", choices=sorted(PROMPTS), default=VARIANTS_PROMPT.name,
+                        help="Prompt da usare (default: variants)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Richieste contemporanee (default: %(default)s)")
+    parser.add_argument("--pack", type=int, default=1, help="Eventi per richiesta (default: 1)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout per richiesta in secondi")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Tentativi extra per richiesta")
+    parser.add_argument("--refresh", action="store_true", help="Ignora la cache dei testi")
+    parser.add_argument("--stub", action="store_true", help="Backend locale finto (nessuna chiamata di rete)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.events == "-" else open(args.events, encoding="utf-8")
+    with source:
+        events = [line.strip() for line in source if line.strip()]
+
+    async def run():
+        failed = 0
+        async for result in generate_copy_stream(
+                events, PROMPTS[args.prompt], backend=StubBackend() if args.stub else None,
+                concurrency=args.concurrency, timeout=args.timeout, retries=args.retries,
+                pack=args.pack, refresh=args.refresh,
+                cache=LLMCache(None) if args.stub else None):  # Stub copy must not reach the real cache
+            failed += not result.ok
+            print(json.dumps({"event": result.event, "copy": result.copy, "cached": result.cached,
+                              **({"error": result.error} if result.error else {})}, ensure_ascii=False),
+                  flush=True)
+        return failed
+
+    try:
+        failed = asyncio.run(run())
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        return 1
+
+    if failed:
+        print(f"⚠️  {failed}/{len(events)} eventi senza testi", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Copy generation (banner texts from OpenAI) with a persistent response cache
+Shared by generate_texts.py (web wizard), gazzetta_multi_generator.py and
+gazzetta_svg_generator.py. Responses are stored in SQLite keyed by the
+normalised event, prompt template, model and sampling settings, so asking
+again for the same event is served instantly instead of waiting for the API.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache", "responses.sqlite")
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class PromptSpec:
+    """A prompt template and the completion settings it is sent with
+
+    template is formatted with event_type; every field is part of the
+    cache key, so editing the prompt or the model invalidates old entries.
+    """
+    name: str
+    template: str
+    system: str
+    model: str
+    temperature: float
+    max_tokens: Optional[int] = None
+
+
+# Three variants {variant_1_fomo, variant_2_esclusiva, variant_3_soft} -> {header, main_title, subtitle, cta}
+VARIANTS_PROMPT = PromptSpec(
+    name="variants",
+    template="""
+Sei un copywriter per La Gazzetta dello Sport.
+Evento: {event_type}
+
+Genera 3 varianti di copy per un banner promozionale:
+
+1. FOMO (urgenza, occasione limitata)
+2. Esclusiva (premium, riservata)
+3. Soft (amichevole, inclusiva)
+
+Per ogni variante genera:
+- header (breve, 3-5 parole)
+- main_title (accattivante, 6-10 parole)
+- subtitle (dettaglio, 6-10 parole)
+- cta (call to action, massimo 4 parole)
+
+Formato JSON:
+{{
+  "variant_1_fomo": {{
+    "header": "...",
+    "main_title": "...",
+    "subtitle": "...",
+    "cta": "..."
+  }},
+  "variant_2_esclusiva": {{...}},
+  "variant_3_soft": {{...}}
+}}
+""",
+    system="Sei un copywriter esperto. Rispondi SOLO con JSON valido.",
+    model="gpt-4",
+    temperature=0.8,
+)
+
+# List of three {style, header, main_title, subtitle_text, cta_text} (G+ single-banner script)
+G_PLUS_PROMPT = PromptSpec(
+    name="g_plus",
+    template="""
+    Sei un copywriter pubblicitario per G+, piattaforma di contenuti sportivi premium.
+    Evento: {event_type}
+
+    Genera ESATTAMENTE 3 varianti con toni diversi:
+    1) FOMO → urgenza, occasione limitata
+    2) Esclusiva → premium, riservata
+    3) Soft → amichevole, inclusiva
+
+    Ogni variante deve contenere:
+    - style (esattamente "FOMO", "Esclusiva" o "Soft")
+    - header (max 3 parole, es: "PROMO FLASH", "ESCLUSIVA G+")
+    - main_title (titolo evento max 4 parole)
+    - subtitle_text (max 10 parole)
+    - cta_text (CTA breve: "ABBONATI", "ABBONATI ORA", "ATTIVA SUBITO", "NON PERDERE L'OCCASIONE")
+
+    ✅ Rispondi SOLO con JSON, senza testo extra.
+    ✅ Esempio di formato corretto (contenuti puramente indicativi):
+
+    [
+      {{
+        "style": "FOMO",
+        "header": "PROMO FLASH",
+        "main_title": "Finale Volley",
+        "subtitle_text": "Ultima occasione su G+",
+        "cta_text": "ABBONATI ORA"
+      }},
+      {{
+        "style": "Esclusiva",
+        "header": "ESCLUSIVA G+",
+        "main_title": "US OPEN",
+        "subtitle_text": "Solo per i veri fan",
+        "cta_text": "ATTIVA SUBITO"
+      }},
+      {{
+        "style": "Soft",
+        "header": "SPECIAL PASS",
+        "main_title": "NBA Finals",
+        "subtitle_text": "Seguilo con la community",
+        "cta_text": "ABBONATI"
+      }}
+    ]
+    """,
+    system="Genera testi pubblicitari brevi per banner promozionali.",
+    model="gpt-4o-mini",
+    temperature=1.0,
+    max_tokens=500,
+)
+
+
+def normalize_event(event_type: str) -> str:
+    """Event string as used in cache keys (case and spacing ignored)"""
+    return " ".join(event_type.split()).casefold()
+
+
+def cache_key(spec: PromptSpec, event_type: str) -> str:
+    payload = json.dumps([normalize_event(event_type), spec.template, spec.system,
+                          spec.model, spec.temperature, spec.max_tokens])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """SQLite store of raw completion texts with TTL and size-bounded eviction
+
+    Entries older than ttl seconds are ignored and purged; when the stored
+    responses exceed max_bytes the least recently used are evicted. Any
+    SQLite error disables the cache for the process (it is an optimisation
+    only, the API call still works).
+
+    Args:
+        path: Database file, None to disable the cache
+        ttl: Seconds an entry stays valid
+        max_bytes: Budget for stored responses
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+
+    def get(self, key: str) -> Optional[str]:
+        db = self._connect()
+        if db is None:
+            return None
+        now = time.time()
+        try:
+            with db:
+                row = db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return row[0]
+        except sqlite3.Error:
+            self._disable()
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: str):
+        db = self._connect()
+        if db is None:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO responses (key, response, size, created, accessed) "
+                           "VALUES (?, ?, ?, ?, ?)", (key, response, size, now, now))
+                db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+                self._evict(db)
+        except sqlite3.Error:
+            self._disable()
+
+    def clear(self):
+        db = self._connect()
+        if db is not None:
+            with db:
+                db.execute("DELETE FROM responses")
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def _connect(self):
+        if self._db is None and self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                db = sqlite3.connect(self.path, timeout=5)
+                db.execute("PRAGMA journal_mode=WAL")  # Concurrent wizard requests read while one writes
+                db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                           "size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+                self._db = db
+            except (OSError, sqlite3.Error):
+                self.path = None
+        return self._db
+
+    def _disable(self):
+        if self._db is not None:
+            self._db.close()
+        self._db = None
+        self.path = None
+
+
+_default_cache = None
+
+
+def get_llm_cache() -> LLMCache:
+    """Return the process-wide shared LLMCache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LLMCache()
+    return _default_cache
+
+
+def parse_json_response(raw_response: str) -> Any:
+    """Parse a completion as JSON, unwrapping markdown code blocks"""
+    raw_response = raw_response.strip()
+    if raw_response.startswith("```"):
+        raw_response = raw_response.split("```")[1]
+        if raw_response.startswith("json"):
+            raw_response = raw_response[4:]
+        raw_response = raw_response.strip()
+    return json.loads(raw_response)
+
+
+def generate_copy(spec: PromptSpec, event_type: str, cache: Optional[LLMCache] = None,
+                  client=None, refresh: bool = False) -> Tuple[Any, bool]:
+    """Parsed JSON copy for an event, from the cache or the OpenAI API
+
+    Only responses that parse as JSON are cached.
+
+    Args:
+        cache: Response cache (default: the shared one)
+        client: OpenAI client (default: one built from OPENAI_API_KEY)
+        refresh: Skip the cached entry and store a fresh completion
+
+    Returns:
+        (parsed response, True if served from the cache)
+    """
+    cache = cache or get_llm_cache()
+    key = cache_key(spec, event_type)
+
+    if not refresh:
+        cached = cache.get(key)
+        if cached is not None:
+            try:
+                return parse_json_response(cached), True
+            except ValueError:
+                pass  # Corrupt entry: ask again and overwrite it
+
+    if client is None:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Missing OPENAI_API_KEY environment variable. Set it with: export OPENAI_API_KEY='your-key'")
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
+
+    options = {"max_tokens": spec.max_tokens} if spec.max_tokens else {}
+    response = client.chat.completions.create(
+        model=spec.model,
+        messages=[
+            {"role": "system", "content": spec.system},
+            {"role": "user", "content": spec.template.format(event_type=event_type)}
+        ],
+        temperature=spec.temperature,
+        **options
+    )
+
+    raw_response = response.choices[0].message.content
+    parsed = parse_json_response(raw_response)
+    cache.put(key, raw_response)
+    return parsed, False
+
+
+def generate_text_variants(event_type: str, refresh: bool = False) -> dict:
+    """Three copy variants for an event (VARIANTS_PROMPT), cached"""
+    return generate_copy(VARIANTS_PROMPT, event_type, refresh=refresh)[0]
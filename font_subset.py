@@ -0,0 +1,129 @@
+"""
+Font subsetting for embedded @font-face rules
+Reduces each font to the codepoints a banner actually renders, caching the
+subsets by glyph set so repeated renders of the same texts cost nothing
+"""
+
+import io
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from asset_cache import mark_used, prune_cache_dir
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # fontTools is optional: without it full fonts are embedded
+    ft_subset = None
+
+try:
+    import brotli  # noqa: F401 - required by fontTools to write WOFF2
+    SUBSET_FLAVOR = "woff2"
+except ImportError:
+    SUBSET_FLAVOR = "woff"
+
+DEFAULT_SUBSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asset_cache", "fonts")
+MAX_MEMORY_BYTES = 16 * 1024 * 1024  # Subsets kept in memory (least recently used are evicted)
+MAX_DISK_BYTES = 32 * 1024 * 1024    # Subsets kept in DEFAULT_SUBSETS_DIR
+
+_memory_cache = OrderedDict()  # filename -> subset bytes
+_memory_bytes = 0
+
+
+def glyph_set_key(codepoints: Iterable[int]) -> str:
+    """Stable hash of a set of codepoints"""
+    ordered = ",".join(str(cp) for cp in sorted(set(codepoints)))
+    return hashlib.sha1(ordered.encode("ascii")).hexdigest()[:16]
+
+
+def subset_font(path: str, codepoints: Iterable[int], subsets_dir: str = DEFAULT_SUBSETS_DIR) -> Optional[bytes]:
+    """Return the font at path reduced to the given codepoints
+
+    Subsets are cached in memory and on disk (both bounded by bytes, least
+    recently used evicted first), keyed by source file (path, size, mtime)
+    and glyph set hash.
+
+    Returns:
+        Font bytes in SUBSET_FLAVOR format, or None if fontTools is missing
+        or the font can't be subset (callers then embed the full font)
+    """
+    if ft_subset is None:
+        return None
+
+    codepoints = set(codepoints)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    source_key = f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    source_digest = hashlib.sha1(source_key.encode("utf-8")).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    filename = f"{stem}_{source_digest}_{glyph_set_key(codepoints)}.{SUBSET_FLAVOR}"
+
+    data = _memory_cache.get(filename)
+    if data is not None:
+        _memory_cache.move_to_end(filename)
+        return data
+
+    cached_path = os.path.join(subsets_dir, filename)
+    try:
+        with open(cached_path, "rb") as f:
+            data = f.read()
+        mark_used(cached_path)
+    except OSError:
+        data = _build_subset(path, codepoints)
+        if data is None:
+            return None
+        _write_cached(cached_path, data)
+
+    _remember(filename, data)
+    return data
+
+
+def _remember(filename: str, data: bytes):
+    global _memory_bytes
+    if len(data) > MAX_MEMORY_BYTES:
+        return
+
+    _memory_cache[filename] = data
+    _memory_bytes += len(data)
+    while _memory_bytes > MAX_MEMORY_BYTES:
+        _, evicted = _memory_cache.popitem(last=False)
+        _memory_bytes -= len(evicted)
+
+
+def _build_subset(path: str, codepoints: set) -> Optional[bytes]:
+    options = ft_subset.Options()
+    options.flavor = SUBSET_FLAVOR
+    options.layout_features = ["*"]  # Keep kerning and ligatures
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    options.ignore_missing_unicodes = True
+
+    try:
+        font = TTFont(path)
+        subsetter = ft_subset.Subsetter(options=options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        out = io.BytesIO()
+        font.flavor = SUBSET_FLAVOR
+        font.save(out)
+    except Exception:
+        return None
+
+    return out.getvalue()
+
+
+def _write_cached(cached_path: str, data: bytes):
+    try:
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        tmp_path = f"{cached_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, cached_path)
+    except OSError:
+        return  # Disk cache is an optimisation only
+    prune_cache_dir(os.path.dirname(cached_path), MAX_DISK_BYTES, keep=cached_path)
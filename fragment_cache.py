@@ -0,0 +1,70 @@
+"""
+Fragment cache for incremental re-renders
+Memoises per-component layouts and their serialised fragments (plus the
+full-canvas background and the font defs) in a byte-bounded LRU, so a
+warm TemplateEngine (render_server.py) that re-renders a banner after a
+single-field edit only recomputes the components reading that field.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class FragmentCache:
+    """LRU of computed values bounded by their approximate size in bytes
+
+    Keys must be hashable and capture everything the value depends on
+    (TemplateEngine builds them from the component plan, the content
+    values it reads and the asset settings).
+
+    Args:
+        max_bytes: Memory budget (least recently used entries are evicted)
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any], size: Callable[[Any], int] = len) -> Any:
+        """Cached value for key, computing and storing it on a miss
+
+        size(value) gives the bytes charged to the budget; values larger
+        than the whole budget are returned without being stored.
+        """
+        try:
+            entry = self._entries.get(key)
+        except TypeError:  # Unhashable content value: nothing to memoise
+            return compute()
+
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        self.misses += 1
+        value = compute()
+        self._store(key, value, size(value))
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store(self, key, value, size: int):
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
@@ -6,10 +6,13 @@ Generates multiple SVG banners from JSON templates with AI-powered copywriting
 
 import os
 import sys
-import base64
-import json
-from openai import OpenAI
-from template_engine import TemplateEngine, load_template, save_svg
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from template_engine import TemplateEngine, load_template
+from asset_cache import get_asset_cache
+from background_catalog import CLI_BACKGROUNDS_DIR, get_background_catalog
+from copy_generator import VARIANTS_PROMPT, generate_copy
 
 
 def step1_get_parameters():
@@ -59,61 +62,10 @@ def step2_generate_texts(params):
     print("STEP 2: GENERAZIONE TESTI AI")
     print("=" * 60)
 
-    api_key = os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("Missing OPENAI_API_KEY environment variable. Set it with: export OPENAI_API_KEY='your-key'")
-
-    client = OpenAI(api_key=api_key)
-
-    prompt = f"""
-Sei un copywriter per La Gazzetta dello Sport.
-Evento: {params['event_type']}
-
-Genera 3 varianti di copy per un banner promozionale:
-
-1. FOMO (urgenza, occasione limitata)
-2. Esclusiva (premium, riservata)
-3. Soft (amichevole, inclusiva)
-
-Per ogni variante genera:
-- Header (breve, 3-5 parole)
-- Main Title (accattivante, 6-10 parole)
-- Subtitle (dettaglio, 6-10 parole)
-- CTA (call to action, massimo 4 parole)
-
-Formato JSON:
-{{
-  "variant_1_fomo": {{
-    "header": "...",
-    "main_title": "...",
-    "subtitle": "...",
-    "cta": "..."
-  }},
-  "variant_2_esclusiva": {{...}},
-  "variant_3_soft": {{...}}
-}}
-"""
-
     print("🤖 Generazione testi in corso...")
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "Sei un copywriter esperto. Rispondi SOLO con JSON valido."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.8
-    )
-
-    raw_response = response.choices[0].message.content.strip()
-
-    # Clean JSON if wrapped in markdown code blocks
-    if raw_response.startswith("```"):
-        raw_response = raw_response.split("```")[1]
-        if raw_response.startswith("json"):
-            raw_response = raw_response[4:]
-        raw_response = raw_response.strip()
-
-    variants = json.loads(raw_response)
+    variants, cached = generate_copy(VARIANTS_PROMPT, params["event_type"])
+    if cached:
+        print("⚡ Testi già generati per questo evento (cache)")
 
     print("\n✅ Testi generati:")
     for variant_name, texts in variants.items():
@@ -161,101 +113,56 @@ def step4_load_resources(params):
     image_path = input("\nPath immagine opzionale (invio per saltare): ").strip()
 
     user_image = None
+    user_image_file = None
     if image_path and os.path.exists(image_path):
-        with open(image_path, "rb") as f:
-            img_bytes = f.read()
-            b64 = base64.b64encode(img_bytes).decode("utf-8")
-
-            ext = image_path.lower().split('.')[-1]
-            mime = "image/jpeg" if ext in ["jpg", "jpeg"] else "image/png"
+        ext = image_path.lower().split('.')[-1]
+        mime = "image/jpeg" if ext in ["jpg", "jpeg"] else "image/png"
 
-            user_image = f"data:{mime};base64,{b64}"
-            print(f"✅ Immagine caricata: {image_path}")
+        user_image = get_asset_cache().data_uri(image_path, mime)
+        user_image_file = (image_path, mime)
+        print(f"✅ Immagine caricata: {image_path}")
     else:
         print("⏭️  Nessuna immagine caricata")
 
     # Background selection by sport
     print("\n🎨 Selezione background...")
 
-    # Background catalog organized by sport
-    backgrounds_catalog = {
-        "Generico": [
-            {"name": "Sfondo 1", "file": "bg01.png", "color": "#223047"},
-            {"name": "Sfondo 2", "file": "bg02.png", "color": "#223047"},
-            {"name": "Sfondo 3", "file": "bg03.png", "color": "#223047"}
-        ],
-        "Pallavolo/Volley": [
-            {"name": "Volley 1", "file": "bg06.png", "color": "#cc0000"},
-            {"name": "Volley 2", "file": "bg07.png", "color": "#cc0000"},
-            {"name": "Volley 3", "file": "bg08.png", "color": "#cc0000"},
-            {"name": "Volley 4", "file": "bg09.png", "color": "#cc0000"},
-            {"name": "Volley 5", "file": "bg10.png", "color": "#cc0000"}
-        ],
-        "Tennis": [
-            {"name": "Wimbledon", "file": "bg11.png", "color": "#006633"},
-            {"name": "US Open", "file": "bg12.png", "color": "#0066cc"}
-        ],
-        "Ciclismo": [
-            {"name": "Ciclismo", "file": "bg14.png", "color": "#FFD700"}
-        ],
-        "Calcio": [
-            {"name": "Champions League 1", "file": "bg15.png", "color": "#003399"},
-            {"name": "Champions League 2", "file": "bg16.png", "color": "#003399"},
-            {"name": "Champions League 3", "file": "bg17.png", "color": "#003399"},
-            {"name": "Generico 1", "file": "bg18.png", "color": "#0066cc"},
-            {"name": "Generico 2", "file": "bg19.png", "color": "#0066cc"},
-            {"name": "Generico 3", "file": "bg20.png", "color": "#0066cc"},
-            {"name": "Generico 4", "file": "bg22.png", "color": "#0066cc"},
-            {"name": "Generico 5", "file": "bg23.png", "color": "#0066cc"},
-            {"name": "Generico 6", "file": "bg24.png", "color": "#0066cc"}
-        ],
-        "Golf": [
-            {"name": "Golf 1", "file": "bg21.png", "color": "#228B22"},
-            {"name": "Golf 2", "file": "bg13.png", "color": "#228B22"}
-        ],
-        "Formula 1/Moto GP": [
-            {"name": "F1/MotoGP 1", "file": "bg25.png", "color": "#E10600"},
-            {"name": "F1/MotoGP 2", "file": "bg26.png", "color": "#E10600"},
-            {"name": "F1/MotoGP 3", "file": "bg27.png", "color": "#E10600"},
-            {"name": "F1/MotoGP 4", "file": "bg28.png", "color": "#E10600"},
-            {"name": "F1/MotoGP 5", "file": "bg29.png", "color": "#E10600"}
-        ]
-    }
-
-    # Get backgrounds for selected sport
+    # Get backgrounds for selected sport (background_index.json)
     selected_sport = params.get("sport", "Generico")
-    sport_backgrounds = backgrounds_catalog.get(selected_sport, backgrounds_catalog["Generico"])
+    catalog = get_background_catalog()
+    sport_backgrounds = catalog.for_sport(selected_sport, CLI_BACKGROUNDS_DIR)
+    if not sport_backgrounds:
+        raise FileNotFoundError("Nessuno sfondo nell'indice: esegui 'python3 background_catalog.py scan'")
 
     print(f"\nBackground disponibili per {selected_sport}:")
     for i, bg in enumerate(sport_backgrounds, 1):
-        print(f"  {i}. {bg['file']} - {bg['name']}")
+        print(f"  {i}. {bg['id']} - {bg['name']}")
 
     bg_choice = input(f"\nScegli background [1-{len(sport_backgrounds)}] (default=1): ").strip() or "1"
     chosen_bg = sport_backgrounds[int(bg_choice) - 1]
 
     # Load and encode background
+    color = catalog.color(chosen_bg["id"])
     try:
-        bg_path = os.path.join("background", chosen_bg["file"])
-        with open(bg_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-            mime = "image/jpeg" if chosen_bg["file"].endswith((".jpg", ".jpeg")) else "image/png"
-
-            chosen = {
-                "image": f"data:{mime};base64,{b64}",
-                "main_color": chosen_bg["color"],
-                "dark_color": chosen_bg["color"]
-            }
-            print(f"✅ Background: {chosen_bg['file']} ({chosen_bg['name']})")
+        bg_path = catalog.path(chosen_bg["id"], CLI_BACKGROUNDS_DIR)
+        chosen = {
+            "path": bg_path,
+            "image": get_asset_cache().data_uri(bg_path),
+            "main_color": color,
+            "dark_color": color
+        }
+        print(f"✅ Background: {chosen_bg['id']} ({chosen_bg['name']})")
     except FileNotFoundError:
-        print(f"⚠️ File {chosen_bg['file']} non trovato, sfondo disabilitato")
+        print(f"⚠️ File {chosen_bg['id']} non trovato, sfondo disabilitato")
         chosen = {
             "image": None,
-            "main_color": chosen_bg["color"],
-            "dark_color": chosen_bg["color"]
+            "main_color": color,
+            "dark_color": color
         }
 
     return {
         "user_image": user_image,
+        "user_image_file": user_image_file,  # (path, mime): worker processes re-read the file
         "background": chosen
     }
 
@@ -294,45 +201,153 @@ def step5_select_templates():
     return selected
 
 
-def step6_render_banners(templates, texts, resources, params):
-    """STEP 6: Rendering multi-banner"""
-    print("\n" + "=" * 60)
-    print("STEP 6: RENDERING BANNERS")
-    print("=" * 60)
-
-    # Prepare content data
-    content_data = {
+def build_content_data(texts, user_image, price):
+    """TemplateEngine content data for the selected texts of one event"""
+    return {
         "header_text": texts.get("header", ""),
         "main_title": texts.get("main_title", ""),
         "subtitle": texts.get("subtitle", ""),
-        "cta_text": f"{texts.get('cta', '')} a {params['price']}",
-        "user_image": resources.get("user_image", ""),
+        "cta_text": f"{texts.get('cta', '')} a {price}",
+        "user_image": user_image or "",
         "bullet1": "✓ Contenuti e Speciali esclusivi",
         "bullet2": "✓ Analisi e interviste",
         "bullet3": "✓ Il meglio delle grandi firme de La Gazzetta dello Sport"
     }
 
-    # Initialize engine
+
+# Pool worker state: one warm engine per process (set by _init_render_worker)
+_worker_engine = None
+
+
+def _init_render_worker(content_data, background, user_image_file=None):
+    """Load fonts, content and background once per worker process
+
+    Images given as files (user_image_file (path, mime), a background
+    "path" without "image") are encoded here through the worker's own
+    AssetCache, so their data URIs are not pickled into every worker.
+    """
+    global _worker_engine
+    cache = get_asset_cache()
+    if user_image_file:
+        content_data = {**content_data, "user_image": cache.data_uri(*user_image_file)}
+    if background.get("path") and "image" not in background:
+        background = {**background, "image": cache.data_uri(background["path"])}
+
     engine = TemplateEngine()
     engine.load_fonts()
     engine.set_content_data(content_data)
-    engine.set_background(resources.get("background", {}))
+    engine.set_background(background)
+    _worker_engine = engine
 
-    output_dir = "output"
-    os.makedirs(output_dir, exist_ok=True)
 
-    print(f"\n🚀 Generazione {len(templates)} banner in corso...")
+def _worker_initargs(content_data, background, user_image_file):
+    """_init_render_worker arguments with file paths instead of data URIs"""
+    if user_image_file:
+        content_data = {**content_data, "user_image": ""}
+    if background.get("path"):
+        background = {key: value for key, value in background.items() if key != "image"}
+    return content_data, background, user_image_file
 
-    for template_file in templates:
-        template_path = os.path.join("templates", template_file)
-        template = load_template(template_path)
 
-        svg_content = engine.render_template(template)
+def _render_template_job(template_file, output_dir):
+    """Render one template with the worker engine, never raising
 
-        output_file = os.path.join(output_dir, template_file.replace(".json", ".svg"))
-        save_svg(svg_content, output_file)
+    Returns:
+        Result dict (template, output, ok, seconds[, error])
+    """
+    start = time.perf_counter()
+    output_file = os.path.join(output_dir, template_file.replace(".json", ".svg"))
+    try:
+        template = load_template(os.path.join("templates", template_file))
+        _worker_engine.export(template, {"svg": output_file})  # Streamed to disk
+        return {"template": template_file, "output": output_file, "ok": True,
+                "seconds": time.perf_counter() - start}
+    except Exception as e:
+        return {"template": template_file, "output": None, "ok": False, "error": str(e),
+                "seconds": time.perf_counter() - start}
+
+
+def _report_render(result):
+    if result["ok"]:
+        print(f"✅ Generated: {result['output']} ({result['seconds']:.2f}s)")
+    else:
+        print(f"❌ {result['template']}: {result['error']} ({result['seconds']:.2f}s)")
+
+
+def step6_render_banners(templates, texts, resources, params, workers=None):
+    """STEP 6: Rendering multi-banner
+
+    With more than one worker the templates are rendered in parallel by a
+    ProcessPoolExecutor whose processes load fonts, content and background
+    once; a failing template is reported and does not stop the others.
+
+    Args:
+        workers: Worker processes (default: one per CPU core, at most one per
+            template; 1 renders sequentially in this process)
 
-    print(f"\n✅ Completato! {len(templates)} banner generati in '{output_dir}/'")
+    Returns:
+        List of result dicts (template, output, ok, seconds[, error]) in template order
+    """
+    print("\n" + "=" * 60)
+    print("STEP 6: RENDERING BANNERS")
+    print("=" * 60)
+
+    content_data = build_content_data(texts, resources.get("user_image", ""), params["price"])
+    background = resources.get("background", {})
+
+    output_dir = "output"
+    os.makedirs(output_dir, exist_ok=True)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(templates)))
+
+    print(f"\n🚀 Generazione {len(templates)} banner in corso ({workers} processi)...")
+    start = time.perf_counter()
+
+    results = None
+    if workers > 1:
+        try:
+            results = _render_in_pool(templates, output_dir, workers,
+                                      _worker_initargs(content_data, background, resources.get("user_image_file")))
+        except (OSError, NotImplementedError) as e:
+            # No multiprocessing support here (e.g. missing /dev/shm): render sequentially
+            print(f"⚠️  Rendering parallelo non disponibile ({e}), procedo in sequenza")
+
+    if results is None:
+        _init_render_worker(content_data, background)
+        results = []
+        for template_file in templates:
+            result = _render_template_job(template_file, output_dir)
+            _report_render(result)
+            results.append(result)
+
+    failed = [r for r in results if not r["ok"]]
+    elapsed = time.perf_counter() - start
+    print(f"\n✅ Completato! {len(results) - len(failed)}/{len(templates)} banner generati in '{output_dir}/' ({elapsed:.2f}s)")
+    if failed:
+        print(f"⚠️  {len(failed)} template non generati: {', '.join(r['template'] for r in failed)}")
+
+    return results
+
+
+def _render_in_pool(templates, output_dir, workers, initargs):
+    """Fan templates out to pre-initialised worker processes, results in template order"""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                             initargs=initargs) as pool:
+        futures = {pool.submit(_render_template_job, template_file, output_dir): template_file
+                   for template_file in templates}
+        for future in as_completed(futures):
+            template_file = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:  # Worker died (e.g. BrokenProcessPool)
+                result = {"template": template_file, "output": None, "ok": False, "error": str(e), "seconds": 0.0}
+            _report_render(result)
+            results[template_file] = result
+
+    return [results[template_file] for template_file in templates]
 
 
 def main():
@@ -344,6 +359,11 @@ def main():
 ╚═══════════════════════════════════════════════════════════╝
 """)
 
+    parser = argparse.ArgumentParser(description="Gazzetta multi-banner SVG generator")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processi di rendering in parallelo (default: uno per core)")
+    args = parser.parse_args()
+
     try:
         # Step 1: Parameters
         params = step1_get_parameters()
@@ -361,7 +381,7 @@ def main():
         templates = step5_select_templates()
 
         # Step 6: Render banners
-        step6_render_banners(templates, texts, resources, params)
+        step6_render_banners(templates, texts, resources, params, workers=args.workers)
 
         print("\n🎉 Processo completato con successo!")
 
@@ -5,11 +5,12 @@ Convertito da notebook Jupyter a script procedurale
 """
 
 import os
-import json
-import base64
 import random
 import copy
-from openai import OpenAI
+from asset_cache import get_asset_cache
+from background_catalog import CLI_BACKGROUNDS_DIR, get_background_catalog
+from copy_generator import G_PLUS_PROMPT, generate_copy
+from text_metrics import measure, fit_font_size
 
 
 # ============================================================================
@@ -58,72 +59,17 @@ def step2_generate_texts(event_type):
     print("STEP 2: GENERAZIONE TESTI")
     print("="*60)
 
-    # API Key (DEVE essere impostata come variabile d'ambiente: export OPENAI_API_KEY='your-key')
-    if "OPENAI_API_KEY" not in os.environ:
-        print("⚠️  ERRORE: Variabile d'ambiente OPENAI_API_KEY non impostata")
-        print("   Imposta la chiave con: export OPENAI_API_KEY='your-key'")
-        raise ValueError("Missing OPENAI_API_KEY environment variable")
-
-    client = OpenAI()
-
-    prompt = f"""
-    Sei un copywriter pubblicitario per G+, piattaforma di contenuti sportivi premium.
-    Evento: {event_type}
-
-    Genera ESATTAMENTE 3 varianti con toni diversi:
-    1) FOMO → urgenza, occasione limitata
-    2) Esclusiva → premium, riservata
-    3) Soft → amichevole, inclusiva
-
-    Ogni variante deve contenere:
-    - style (esattamente "FOMO", "Esclusiva" o "Soft")
-    - header (max 3 parole, es: "PROMO FLASH", "ESCLUSIVA G+")
-    - main_title (titolo evento max 4 parole)
-    - subtitle_text (max 10 parole)
-    - cta_text (CTA breve: "ABBONATI", "ABBONATI ORA", "ATTIVA SUBITO", "NON PERDERE L'OCCASIONE")
-
-    ✅ Rispondi SOLO con JSON, senza testo extra.
-    ✅ Esempio di formato corretto (contenuti puramente indicativi):
-
-    [
-      {{
-        "style": "FOMO",
-        "header": "PROMO FLASH",
-        "main_title": "Finale Volley",
-        "subtitle_text": "Ultima occasione su G+",
-        "cta_text": "ABBONATI ORA"
-      }},
-      {{
-        "style": "Esclusiva",
-        "header": "ESCLUSIVA G+",
-        "main_title": "US OPEN",
-        "subtitle_text": "Solo per i veri fan",
-        "cta_text": "ATTIVA SUBITO"
-      }},
-      {{
-        "style": "Soft",
-        "header": "SPECIAL PASS",
-        "main_title": "NBA Finals",
-        "subtitle_text": "Seguilo con la community",
-        "cta_text": "ABBONATI"
-      }}
-    ]
-    """
-
+    # La API key (export OPENAI_API_KEY='your-key') serve solo se i testi non sono già in cache
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Genera testi pubblicitari brevi per banner promozionali."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=1.0,
-            max_tokens=500
-        )
-
-        texts = json.loads(response.choices[0].message.content)
+        texts, cached = generate_copy(G_PLUS_PROMPT, event_type)
+        if cached:
+            print("⚡ Testi già generati per questo evento (cache)")
 
     except Exception as e:
+        if "OPENAI_API_KEY" not in os.environ:
+            print("⚠️  ERRORE: Variabile d'ambiente OPENAI_API_KEY non impostata")
+            print("   Imposta la chiave con: export OPENAI_API_KEY='your-key'")
+            raise
         print(f"⚠️  Errore generazione testi: {e}")
         print("   Uso testi di fallback...")
         texts = [
@@ -291,13 +237,10 @@ def step3_select_template_and_texts(texts):
     uploaded_image = None
     if image_path and os.path.exists(image_path):
         try:
-            with open(image_path, "rb") as f:
-                uploaded_bytes = f.read()
-                uploaded_b64 = base64.b64encode(uploaded_bytes).decode("utf-8")
-                # Rileva formato immagine
-                ext = image_path.lower().split('.')[-1]
-                mime_type = "image/jpeg" if ext in ["jpg", "jpeg"] else "image/png"
-                uploaded_image = f"data:{mime_type};base64,{uploaded_b64}"
+            # Rileva formato immagine
+            ext = image_path.lower().split('.')[-1]
+            mime_type = "image/jpeg" if ext in ["jpg", "jpeg"] else "image/png"
+            uploaded_image = get_asset_cache().data_uri(image_path, mime_type)
             print(f"✅ Immagine caricata: {image_path}")
         except Exception as e:
             print(f"⚠️  Errore caricamento immagine: {e}")
@@ -333,78 +276,28 @@ def step4_pick_background(event_type):
     print("STEP 4: SELEZIONE SFONDO")
     print("="*60)
 
-    # Database sfondi (mock - in produzione usa file reali)
-    backgrounds = [
-        # Calcio
-        {"sport": "calcio", "competition": "champions league", "image": "bg15.png", "main_color": "#052d97", "dark_color": "#00073b"},
-        {"sport": "calcio", "competition": "champions league", "image": "bg16.png", "main_color": "#052d97", "dark_color": "#00073b"},
-        {"sport": "calcio", "competition": "champions league", "image": "bg17.png", "main_color": "#052d97", "dark_color": "#00073b"},
-
-        {"sport": "calcio", "competition": "serie a", "image": "bg_seriea_1.png", "main_color": "#0066b2", "dark_color": "#00334d"},
-        {"sport": "calcio", "competition": "serie a", "image": "bg_seriea_2.png", "main_color": "#0066b2", "dark_color": "#00334d"},
-        {"sport": "calcio", "competition": "serie a", "image": "bg_seriea_3.png", "main_color": "#0066b2", "dark_color": "#00334d"},
-
-        {"sport": "calcio", "competition": "coppa italia", "image": "bg_coppa_1.png", "main_color": "#1b8a5a", "dark_color": "#0d4430"},
-        {"sport": "calcio", "competition": "coppa italia", "image": "bg_coppa_2.png", "main_color": "#1b8a5a", "dark_color": "#0d4430"},
-        {"sport": "calcio", "competition": "coppa italia", "image": "bg_coppa_3.png", "main_color": "#1b8a5a", "dark_color": "#0d4430"},
-
-        # Tennis
-        {"sport": "tennis", "competition": "wimbledon", "image": "bg_wimbledon_1.png", "main_color": "#2e8b57", "dark_color": "#145c32"},
-        {"sport": "tennis", "competition": "wimbledon", "image": "bg_wimbledon_2.png", "main_color": "#2e8b57", "dark_color": "#145c32"},
-        {"sport": "tennis", "competition": "wimbledon", "image": "bg_wimbledon_3.png", "main_color": "#2e8b57", "dark_color": "#145c32"},
-
-        {"sport": "tennis", "competition": "roland garros", "image": "bg_rg_1.png", "main_color": "#b7410e", "dark_color": "#5a2007"},
-        {"sport": "tennis", "competition": "roland garros", "image": "bg_rg_2.png", "main_color": "#b7410e", "dark_color": "#5a2007"},
-        {"sport": "tennis", "competition": "roland garros", "image": "bg_rg_3.png", "main_color": "#b7410e", "dark_color": "#5a2007"},
-
-        {"sport": "tennis", "competition": "us open", "image": "bg04.png", "main_color": "#ffcc00", "dark_color": "#806600"},
-        {"sport": "tennis", "competition": "us open", "image": "bg_usopen_2.png", "main_color": "#ffcc00", "dark_color": "#806600"},
-        {"sport": "tennis", "competition": "us open", "image": "bg_usopen_3.png", "main_color": "#ffcc00", "dark_color": "#806600"},
-
-        # Volley
-        {"sport": "volley", "competition": "volley", "image": "bg07.png", "main_color": "#e63946", "dark_color": "#7a1a20"},
-        {"sport": "volley", "competition": "volley", "image": "bg_wimbledon_2.png", "main_color": "#e63946", "dark_color": "#7a1a20"},
-        {"sport": "volley", "competition": "volley", "image": "bg_wimbledon_3.png", "main_color": "#e63946", "dark_color": "#7a1a20"},
-
-        # Default
-        {"sport": "default", "competition": "default", "image": "bg01.png", "main_color": "#444444", "dark_color": "#222222"},
-        {"sport": "default", "competition": "default", "image": "bg02.png", "main_color": "#444444", "dark_color": "#222222"},
-        {"sport": "default", "competition": "default", "image": "bg03.png", "main_color": "#444444", "dark_color": "#222222"},
-        {"sport": "default", "competition": "default", "image": "bg06.png", "main_color": "#444444", "dark_color": "#222222"},
-        {"sport": "default", "competition": "default", "image": "bg07.png", "main_color": "#444444", "dark_color": "#222222"}
-    ]
-
-    event_lower = event_type.lower()
-
-    # Match competition
-    candidates = [bg for bg in backgrounds if bg["competition"] in event_lower]
-    if not candidates:
-        # Match sport
-        candidates = [bg for bg in backgrounds if bg["sport"] in event_lower]
+    # Sfondi dall'indice (background_index.json): competizione, poi sport, poi Generico
+    candidates = get_background_catalog().match(event_type, CLI_BACKGROUNDS_DIR)
     if not candidates:
-        # Fallback default
-        candidates = [bg for bg in backgrounds if bg["sport"] == "default"]
+        raise FileNotFoundError("Nessuno sfondo nell'indice: esegui 'python3 background_catalog.py scan'")
 
     chosen = random.choice(candidates)
-    chosen_bg = copy.deepcopy(chosen)
+    chosen_bg = {
+        "sport": ", ".join(chosen.get("sports", ())),
+        "competition": ", ".join(chosen.get("competitions", ())) or "-",
+        "main_color": chosen["main_color"],
+        "dark_color": chosen["dark_color"]
+    }
 
     # Converti immagine in base64 (se esiste)
     try:
-        bg_path = os.path.join("background", chosen["image"])
-        with open(bg_path, "rb") as f:
-            b64 = base64.b64encode(f.read()).decode("utf-8")
-            if chosen["image"].endswith(".png"):
-                mime = "image/png"
-            elif chosen["image"].endswith(".jpg") or chosen["image"].endswith(".jpeg"):
-                mime = "image/jpeg"
-            else:
-                mime = "image/png"
-            chosen_bg["image"] = f"data:{mime};base64,{b64}"
+        chosen_bg["image"] = get_asset_cache().data_uri(chosen["paths"][0])
     except FileNotFoundError:
-        print(f"⚠️  File {chosen['image']} non trovato, sfondo disabilitato")
+        print(f"⚠️  File {chosen['id']} non trovato, sfondo disabilitato")
         chosen_bg["image"] = None
 
     print(f"\n✅ Sfondo selezionato automaticamente:")
+    print(f"   Sfondo: {chosen['id']} ({chosen['name']})")
     print(f"   Sport: {chosen_bg['sport']}")
     print(f"   Competition: {chosen_bg['competition']}")
     print(f"   Colore principale: {chosen_bg['main_color']}")
@@ -463,9 +356,7 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
 
     # Carica font embedded
     def font_to_base64(path):
-        full_path = os.path.join("font", path)
-        with open(full_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+        return get_asset_cache().base64(os.path.join("font", path))
 
     # Prova a caricare i font (fallback se non esistono)
     try:
@@ -554,13 +445,13 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
     def esc(txt):
         return (txt or "").replace("&","&amp;").replace("<","&lt;").replace(">","&gt;").replace('"',"&quot;").replace("'","&apos;")
 
-    def wrap_text(text, max_width, font_size):
+    def wrap_text(text, max_width, font_size, font_family="Roboto Regular"):
         words = (text or "").split()
         lines, current = [], []
         for w in words:
             test_line = current + [w]
-            approx_w = len(" ".join(test_line)) * (font_size * 0.6)
-            if approx_w <= max_width:
+            line_w = measure(" ".join(test_line), font_family, font_size)
+            if line_w <= max_width:
                 current = test_line
             else:
                 if current:
@@ -579,8 +470,7 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
     # --- HEADER ---
     svg.append(f'<rect x="0" y="0" width="{W}" height="{header_h}" fill="{header_bg}"/>')
     max_header_fs = int(header_h * 0.75)
-    approx_header_width = len(header_text) * (max_header_fs * 0.6)
-    header_fs = int((W * 0.9) / (len(header_text) * 0.6)) if len(header_text) and approx_header_width > W * 0.9 else max_header_fs
+    header_fs = int(fit_font_size(header_text, "Oswald Bold", W * 0.9, max_header_fs))
     svg.append(f'''
     <text x="{W/2}" y="{header_h/2 + header_fs*0.1}"
           text-anchor="middle" dominant-baseline="middle"
@@ -597,8 +487,7 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
 
     # --- MAIN TITLE ---
     max_title_fs = int(main_title_h * 0.75)
-    approx_title_w = len(main_title_text) * (max_title_fs * 0.6)
-    title_fs = int((W * 0.9) / (len(main_title_text) * 0.6)) if len(main_title_text) and approx_title_w > W * 0.9 else max_title_fs
+    title_fs = int(fit_font_size(main_title_text, "Roboto Bold", W * 0.9, max_title_fs))
     svg.append(f'''
     <text x="{W/2}" y="{body_y + main_title_h/2 + title_fs*0.1}"
           text-anchor="middle" dominant-baseline="middle"
@@ -633,8 +522,7 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
     subtitle_block_h = max(line_height * len(lines), subtitle_fs)
 
     max_price_fs = int(body_right_h * 0.25)
-    approx_price_w = len(price_text) * (max_price_fs * 0.6) if price_text else 0
-    price_fs = int((body_right_w_effective * 0.9) / (len(price_text) * 0.6)) if price_text and approx_price_w > body_right_w_effective * 0.9 else max_price_fs
+    price_fs = int(fit_font_size(price_text, "Roboto Bold", body_right_w_effective * 0.9, max_price_fs))
     price_block_h = int(price_fs * 1.1)
 
     cta_fs = int(body_right_h * 0.12)
@@ -703,9 +591,9 @@ def step6_render_svg(template, width, height, out_path="banner.svg"):
 
     svg.append('</svg>')
 
-    # Salva file
+    # Salva file (frammento per frammento, senza concatenare i data URI)
     with open(out_path, "w", encoding="utf-8") as f:
-        f.write("".join(svg))
+        f.writelines(svg)
 
     print(f"\n✅ SVG salvato: {os.path.abspath(out_path)}")
     return out_path
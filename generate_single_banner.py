@@ -1,58 +1,70 @@
 #!/usr/bin/env python3
 """
 Single banner generator - Called by PHP frontend
-Receives JSON data and generates one SVG banner
+Receives JSON data and generates one SVG banner (or a batch of templates)
 """
 
+import os
 import sys
 import json
-import base64
 import warnings
 
 # Suppress all warnings to avoid polluting SVG output
 warnings.filterwarnings('ignore')
 
 from template_engine import TemplateEngine, load_template
+from asset_cache import get_asset_cache
+from background_catalog import WEB_BACKGROUNDS_DIR, get_background_catalog
 
-def generate_banner(data_json):
-    """Generate a single banner from JSON data"""
 
-    # Parse input data
-    data = json.loads(data_json)
-
-    # Initialize engine
-    engine = TemplateEngine()
-    engine.load_fonts()
+class BannerResources:
+    """Loads templates, logos and backgrounds from disk
 
-    # Load template
-    template_file = f"templates/{data['template']}.json"
-    template = load_template(template_file)
+    Images go through the shared AssetCache, so repeated renders in the
+    same process skip re-encoding.
+    render_server.py subclasses it to keep templates warm too.
+    """
 
-    # Load logo images as base64
-    logo_small_dark = None
-    logo_large_dark = None
-    user_image = None
+    def __init__(self, cache=None):
+        self.cache = cache or get_asset_cache()
 
-    if data.get('logo_small_dark'):
-        try:
-            with open(data['logo_small_dark'], 'rb') as f:
-                logo_small_dark = f'data:image/png;base64,{base64.b64encode(f.read()).decode("utf-8")}'
-        except FileNotFoundError:
-            pass
+    def template(self, template_id):
+        """Load template JSON by id (e.g. '728x90')"""
+        return load_template(f"templates/{template_id}.json")
 
-    if data.get('logo_large_dark'):
+    def image_data_uri(self, path):
+        """Read an image as a data URI, None if missing"""
         try:
-            with open(data['logo_large_dark'], 'rb') as f:
-                logo_large_dark = f'data:image/png;base64,{base64.b64encode(f.read()).decode("utf-8")}'
+            return self.cache.data_uri(path)
         except FileNotFoundError:
-            pass
+            return None
+
+    def background_path(self, bg_id):
+        """Path of a frontend background from background_index.json, None if unknown"""
+        catalog = get_background_catalog()
+        if catalog:
+            return catalog.path(bg_id, WEB_BACKGROUNDS_DIR)
+        # No index yet (python3 background_catalog.py scan): probe the file
+        path = f'{WEB_BACKGROUNDS_DIR}/{bg_id}.png'
+        return path if os.path.exists(path) else None
+
+
+def prepare_banner(engine, data, resources, asset_dir='assets'):
+    """Set content, background and asset mode on the engine from the JSON payload
+
+    Args:
+        engine: TemplateEngine with fonts loaded
+        data: Parsed JSON payload (same format sent by the PHP frontend)
+        resources: BannerResources used to read logos and background
+        asset_dir: Default directory for referenced assets
+            (payload "asset_mode": "reference")
+    """
+    engine.set_asset_mode(data.get('asset_mode', 'inline'), data.get('asset_dir', asset_dir), data.get('asset_url'))
 
-    if data.get('user_image'):
-        try:
-            with open(data['user_image'], 'rb') as f:
-                user_image = f'data:image/png;base64,{base64.b64encode(f.read()).decode("utf-8")}'
-        except FileNotFoundError:
-            pass
+    # Load logo images as base64
+    logo_small_dark = resources.image_data_uri(data['logo_small_dark']) if data.get('logo_small_dark') else None
+    logo_large_dark = resources.image_data_uri(data['logo_large_dark']) if data.get('logo_large_dark') else None
+    user_image = resources.image_data_uri(data['user_image']) if data.get('user_image') else None
 
     # Set content data
     engine.set_content_data({
@@ -68,24 +80,120 @@ def generate_banner(data_json):
         'user_image': user_image
     })
 
-    # Set background
-    bg_id = data.get('background', 'bg01')
-    try:
-        with open(f'web/frontend/backgrounds/{bg_id}.png', 'rb') as f:
-            bg_data = base64.b64encode(f.read()).decode('utf-8')
-    except FileNotFoundError:
-        bg_data = None
-
+    # Set background (the engine embeds a variant resized to each area)
+    engine.background_scale = data.get('background_scale', 1)
     engine.set_background({
-        'image_data': bg_data,
+        'path': resources.background_path(data.get('background', 'bg01')),
         'color': '#0f364c'  # Fallback color
     })
 
-    # Render template
-    svg = engine.render_template(template)
 
-    # Output SVG to stdout
-    print(svg)
+def render_banner(engine, data, resources):
+    """Render one banner with an engine whose fonts are already loaded
+
+    Returns:
+        SVG string
+    """
+    template = resources.template(data['template'])
+    prepare_banner(engine, data, resources)
+    return engine.render_template(template)
+
+
+def stream_banner(engine, data, resources, sink):
+    """Like render_banner, but stream the SVG into a file-like sink
+
+    Embedded images are base64-encoded in chunks while writing, so the
+    whole SVG is never held in memory.
+    """
+    template = resources.template(data['template'])
+    prepare_banner(engine, data, resources)
+    engine.render_to(template, sink)
+
+
+def render_banners(engine, data, resources, output_dir):
+    """Render every template in data['templates'] sharing one payload
+
+    Content, logos and background are prepared once; each template is then
+    rendered and written to {output_dir}/{template_id}.svg. A failing
+    template is reported and does not stop the batch.
+
+    With "png_scales" (e.g. [1, 2]) in the payload, PNGs are also drawn
+    in-process by the Pillow raster backend, no browser needed:
+    {template_id}.png for scale 1, {template_id}@2x.png for scale 2.
+    Each template is laid out once and the same layout tree is written
+    as SVG and as every PNG.
+
+    Returns:
+        List of result dicts (template_id, svg_path, generated, file_size
+        [, png_paths] | error)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    prepare_banner(engine, data, resources, os.path.join(output_dir, 'assets'))
+
+    rasterizers = []
+    if data.get('png_scales'):
+        from raster_renderer import RasterRenderer
+        rasterizers = [RasterRenderer(engine, int(scale)) for scale in data['png_scales']]
+
+    results = []
+    for template_id in data['templates']:
+        output_path = os.path.join(output_dir, f"{template_id}.svg")
+        try:
+            tree = engine.export(resources.template(template_id), {'svg': output_path})
+            result = {
+                'template_id': template_id,
+                'svg_path': output_path,
+                'generated': True,
+                'file_size': os.path.getsize(output_path)
+            }
+            if rasterizers:
+                result['png_paths'] = [write_png(rasterizer, tree, os.path.join(output_dir, f"{template_id}.png"))
+                                       for rasterizer in rasterizers]
+            results.append(result)
+        except Exception as e:
+            results.append({
+                'template_id': template_id,
+                'svg_path': None,
+                'generated': False,
+                'error': str(e)
+            })
+
+    return results
+
+
+def write_png(rasterizer, tree, png_path):
+    """Draw a layout tree with a RasterRenderer, return the path written for its scale"""
+    from raster_renderer import scaled_png_path
+    path = scaled_png_path(png_path, rasterizer.scale)
+    rasterizer.save(tree, path)
+    return path
+
+
+def generate_banner(data_json):
+    """Generate a single banner from JSON data
+
+    If the payload has a "templates" list instead of "template", every
+    template is rendered in this process into data["output_dir"] (default
+    "output") and a JSON summary is printed instead of the SVG.
+    """
+
+    # Parse input data
+    data = json.loads(data_json)
+
+    # Initialize engine
+    engine = TemplateEngine()
+    engine.load_fonts()
+
+    if 'templates' in data:
+        results = render_banners(engine, data, BannerResources(), data.get('output_dir', 'output'))
+        print(json.dumps({'banners': results}))
+        if not all(r['generated'] for r in results):
+            sys.exit(1)
+        return
+
+    # Stream SVG to stdout
+    stream_banner(engine, data, BannerResources(), sys.stdout)
+    sys.stdout.write('\n')
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
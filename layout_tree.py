@@ -0,0 +1,275 @@
+"""
+Layout tree
+Typed, positioned description of a banner (boxes, text runs, images,
+clips) computed once by TemplateEngine.layout() from a template and the
+content data. Serialisers turn the same tree into SVG (svg_serializer.py),
+PNG (raster_renderer.py) or any format registered here, so a multi-format
+export runs the layout only once.
+"""
+
+import importlib
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Format -> module that registers its serialiser, imported on first use
+BUILTIN_SERIALIZERS = {
+    "svg": "svg_serializer",
+    "png": "raster_renderer",
+}
+
+SERIALIZERS: Dict[str, Callable] = {}
+
+
+@dataclass(frozen=True)
+class Box:
+    """Position and size in template px"""
+    x: float
+    y: float
+    width: float
+    height: float
+
+
+@dataclass(frozen=True)
+class TextRun:
+    """A string set in one font (family as written in the template, e.g. 'Oswald Bold')"""
+    text: str
+    font_family: Optional[str]
+    font_size: float
+    color: str
+    italic: bool = False
+
+
+class Node:
+    """Base of all layout nodes"""
+
+    def text_runs(self) -> Tuple[TextRun, ...]:
+        """Text drawn by this node (drives font embedding and subsetting)"""
+        return ()
+
+
+@dataclass(frozen=True)
+class RectNode(Node):
+    """Filled rectangle, optionally rounded"""
+    box: Box
+    fill: str
+    radius: Optional[float] = None
+    opacity: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Clip:
+    """Clip area (rounded rectangle) referenced by id"""
+    id: str
+    box: Box
+    radius: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class ImageNode(Node):
+    """Image filling box
+
+    Attributes:
+        source: Data URI or file path
+        fit: "slice" (cover, cropped) or "meet" (contain)
+        variant_path: Background file that may be replaced by a variant
+            pre-cropped to box (see background_variants)
+    """
+    box: Box
+    source: str
+    fit: str = "slice"
+    clip: Optional[Clip] = None
+    variant_path: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class TextNode(Node):
+    """Single line of text with its baseline at (x, y); anchor "middle" centers it on x"""
+    x: float
+    y: float
+    run: TextRun
+    anchor: Optional[str] = None
+
+    def text_runs(self):
+        return (self.run,)
+
+
+@dataclass(frozen=True)
+class Paragraph:
+    """Wrapped text paragraph of a TextFlowNode"""
+    run: TextRun
+    margin_top: float = 0
+
+
+@dataclass(frozen=True)
+class TextFlowNode(Node):
+    """Paragraphs stacked in a column, wrapped at the box width
+
+    The column is centered vertically and justified by align. overflow
+    "scale" shrinks the whole column by scale to fit the box; "clip"
+    keeps the font size and hides what does not fit.
+    """
+    box: Box
+    paragraphs: Tuple[Paragraph, ...]
+    align: str = "center"
+    scale: float = 1.0
+    background: Optional[str] = None
+    overflow: str = "scale"
+
+    def text_runs(self):
+        return tuple(paragraph.run for paragraph in self.paragraphs)
+
+
+@dataclass(frozen=True)
+class ButtonNode(Node):
+    """Rounded button with a single-line label centered and scaled to fit"""
+    box: Box
+    label: TextRun
+    background: str
+    radius: float
+    scale: float = 1.0
+
+    def text_runs(self):
+        return (self.label,)
+
+
+@dataclass(frozen=True)
+class PriceNode(Node):
+    """Price row: large integer part, then decimals over the period in a column
+
+    gap separates integer and column, offset lowers the column top; the
+    row is justified by align and scaled by scale around its center.
+    """
+    box: Box
+    integer: TextRun
+    decimal: Optional[TextRun]
+    period: Optional[TextRun]
+    gap: float
+    offset: float
+    align: str = "center"
+    scale: float = 1.0
+
+    def text_runs(self):
+        return tuple(run for run in (self.integer, self.decimal, self.period) if run)
+
+
+@dataclass(frozen=True)
+class ListNode(Node):
+    """Vertically centered list, each item prefixed by marker"""
+    box: Box
+    items: Tuple[TextRun, ...]
+    marker: str = "✓"
+    gap: float = 8
+
+    def text_runs(self):
+        return tuple(TextRun(self.marker + item.text, item.font_family, item.font_size, item.color, item.italic)
+                     for item in self.items)
+
+
+@dataclass(frozen=True)
+class InlineImage:
+    """Image inside a row, height fixed and width from its aspect ratio"""
+    source: str
+    height: float
+    tint: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class GroupNode(Node):
+    """Optional image and a label in a centered row, scaled together to fit"""
+    box: Box
+    label: TextRun
+    image: Optional[InlineImage]
+    gap: float
+    scale: float = 1.0
+
+    def text_runs(self):
+        return (self.label,)
+
+
+@dataclass(frozen=True)
+class FittedImageNode(Node):
+    """Image centered in box minus padding, shrunk to fit but never enlarged"""
+    box: Box
+    source: str
+    padding: float = 0
+    tint: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class ComponentLayout:
+    """Nodes of one template component, in paint order"""
+    id: Optional[str]
+    type: Optional[str]
+    nodes: Tuple[Node, ...]
+
+
+@dataclass(frozen=True)
+class ByteBudget:
+    """Maximum output size declared by a template ("max_bytes", "image_formats")
+
+    Attributes:
+        max_bytes: Largest SVG document allowed, in bytes
+        formats: Encodings images may be converted to, preferred first
+    """
+    max_bytes: int
+    formats: Tuple[str, ...] = ("jpeg", "webp")
+
+
+@dataclass(frozen=True)
+class LayoutTree:
+    """Resolved layout of a whole banner
+
+    Attributes:
+        background: Full-canvas background image, painted first
+        components: One ComponentLayout per template component
+        guides: Debug guide nodes painted last (empty unless debug_guides)
+        budget: Output size limit of the template, if any (see byte_budget)
+    """
+    width: int
+    height: int
+    background: Optional[ImageNode]
+    components: Tuple[ComponentLayout, ...]
+    guides: Tuple[Node, ...] = ()
+    budget: Optional[ByteBudget] = None
+
+    def nodes(self) -> Iterator[Node]:
+        """All nodes in paint order"""
+        if self.background:
+            yield self.background
+        for component in self.components:
+            yield from component.nodes
+        yield from self.guides
+
+    def text_runs(self) -> Iterator[TextRun]:
+        for node in self.nodes():
+            yield from node.text_runs()
+
+
+def approximate_size(value) -> int:
+    """Rough memory weight of a node or layout in bytes (its strings dominate: data URIs)"""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(approximate_size(item) for item in value)
+    if is_dataclass(value):
+        return 64 + sum(approximate_size(getattr(value, field.name)) for field in fields(value))
+    return 8
+
+
+def register_serializer(name: str, factory: Callable):
+    """Register an output format
+
+    factory(engine, **options) must return an object with
+    serialize(tree) -> output and write(tree, path).
+    """
+    SERIALIZERS[name] = factory
+
+
+def get_serializer(name: str) -> Callable:
+    """Serialiser factory for a format name (raises ValueError if unknown)"""
+    if name not in SERIALIZERS and name in BUILTIN_SERIALIZERS:
+        importlib.import_module(BUILTIN_SERIALIZERS[name])
+    try:
+        return SERIALIZERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown output format: {name}") from None
@@ -0,0 +1,491 @@
+"""
+Pillow raster backend for TemplateEngine
+PNG serialiser for layout trees: draws the engine's LayoutTree (boxes,
+text runs, images) with Pillow instead of rasterizing the SVG string in
+a browser, so PNG jobs need no Node, Puppeteer or Chromium. Wrapped text
+mirrors the flex boxes of the SVG output; small differences from the
+browser (hinting, kerning, synthetic italic) are expected.
+"""
+
+import io
+import os
+import re
+import base64
+import html
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional: without it use svg_to_png.js
+    Image = None
+
+from background_variants import slice_crop_box
+from colors import parse_color
+from layout_tree import (
+    ButtonNode, FittedImageNode, GroupNode, ImageNode, LayoutTree, ListNode, PriceNode, RectNode, TextFlowNode,
+    TextNode, register_serializer,
+)
+from text_metrics import font_path
+
+ITALIC_SKEW = 0.2  # Synthetic oblique, like the browser does without an italic face
+LINE_HEIGHT = 1.2
+
+
+def split_lines(text: str) -> List[str]:
+    """Paragraphs of a content string (<br> and newlines), HTML entities decoded"""
+    text = re.sub(r"<br\s*/?>", "\n", text or "", flags=re.IGNORECASE)
+    text = re.sub(r"<[^>]+>", "", text)
+    return html.unescape(text).split("\n")
+
+
+def scaled_png_path(png_path: str, scale: int) -> str:
+    """Output path for one density, same convention as svg_to_png.js (banner@2x.png)"""
+    if scale == 1:
+        return png_path
+    stem, ext = os.path.splitext(png_path)
+    return f"{stem}@{scale}x{ext}"
+
+
+class RasterRenderer:
+    """Draws LayoutTrees of a TemplateEngine to Pillow images
+
+    The tree is the same one the SVG serialiser writes (see
+    TemplateEngine.layout), so both outputs share one layout pass. Decoded
+    images and loaded fonts are cached on the instance: reuse one renderer
+    for a whole batch.
+
+    Args:
+        engine: TemplateEngine with fonts loaded (content/background are
+            only read when a template is passed instead of a tree)
+        scale: Pixel density (1 = template size, 2 = retina)
+    """
+
+    def __init__(self, engine, scale: int = 1):
+        if Image is None:
+            raise RuntimeError("Pillow is required for the raster backend (pip install pillow)")
+        self.engine = engine
+        self.scale = scale
+        self._images = {}
+        self._fonts = {}
+        self.canvas = None
+
+    def render(self, template: Dict[str, Any]) -> "Image.Image":
+        """Draw a LayoutTree (or a template, laid out first), return an RGB image of width*scale x height*scale"""
+        tree = template if isinstance(template, LayoutTree) else self.engine.layout(template)
+        self.canvas = Image.new("RGBA", (round(tree.width * self.scale), round(tree.height * self.scale)), (255, 255, 255, 255))
+
+        for node in tree.nodes():
+            draw = self.NODE_DRAWERS.get(type(node))
+            if draw:
+                draw(self, node)
+
+        image = self.canvas.convert("RGB")
+        self.canvas = None
+        return image
+
+    def serialize(self, tree: LayoutTree) -> "Image.Image":
+        return self.render(tree)
+
+    def save(self, template: Dict[str, Any], png_path: str):
+        """Render a LayoutTree or template and write it as PNG"""
+        self.render(template).save(png_path, format="PNG", optimize=True)
+
+    def write(self, tree: LayoutTree, png_path: str):
+        self.save(tree, png_path)
+
+    # Nodes
+
+    def _draw_rect(self, node: RectNode):
+        box = node.box
+        opacity = node.opacity if node.opacity is not None else 1
+        self._fill_rect(box.x, box.y, box.width, box.height, parse_color(node.fill, opacity), node.radius or 0)
+
+    def _draw_image(self, node: ImageNode):
+        # Backgrounds are resampled from the original file, not from a variant
+        source = node.variant_path if node.variant_path and os.path.exists(node.variant_path) else node.source
+        try:
+            image = self._load_image(source)
+        except (OSError, ValueError):
+            return
+        box = node.box
+        radius = node.clip.radius if node.clip and node.clip.radius else 0
+        self._paste_image(image, box.x, box.y, box.width, box.height, node.fit, radius=radius)
+
+    def _draw_text_node(self, node: TextNode):
+        run = node.run
+        self._draw_text(run.text, run.font_family or "Roboto", run.font_size, run.italic, parse_color(run.color),
+                        node.x, node.y, anchor="ms" if node.anchor == "middle" else "ls")
+
+    def _draw_text_flow(self, node: TextFlowNode):
+        runs, block_h = [], 0.0
+        for paragraph in node.paragraphs:
+            run = paragraph.run
+            block_h += paragraph.margin_top
+            block_h = self._layout_paragraph(runs, run.text, run.font_family, run.font_size, run.italic,
+                                             parse_color(run.color), node.box.width, block_h)
+
+        if node.overflow == "clip":
+            self._draw_block(runs, node.box, block_h, node.align, 1.0, clip=True)
+        else:
+            if node.background:
+                box = node.box
+                self._fill_rect(box.x, box.y, box.width, box.height, parse_color(node.background))
+            self._draw_block(runs, node.box, block_h, node.align, node.scale)
+
+    def _draw_button(self, node: ButtonNode):
+        box, label = node.box, node.label
+        self._fill_rect(box.x, box.y, box.width, box.height, parse_color(node.background), node.radius)
+        if not label.text:
+            return
+
+        # transform: scale on the centered span
+        size = label.font_size * node.scale
+        ascent, descent = self._metrics(label.font_family, size, label.italic)
+        baseline = box.y + (box.height - (ascent + descent)) / 2 + ascent
+        self._draw_text(label.text, label.font_family, size, label.italic, parse_color(label.color),
+                        box.x + box.width / 2, baseline, anchor="ms")
+
+    def _draw_fitted_image(self, node: FittedImageNode):
+        box, padding = node.box, node.padding
+        try:
+            image = self._load_image(node.source)
+        except (OSError, ValueError):
+            return
+        box_w, box_h = box.width - padding * 2, box.height - padding * 2
+        # <img> with max-width/max-height 100%: shrink to fit, never enlarge
+        fit = min(1.0, box_w / image.width, box_h / image.height)
+        w, h = image.width * fit, image.height * fit
+        self._paste_image(image, box.x + padding + (box_w - w) / 2, box.y + padding + (box_h - h) / 2, w, h,
+                          "meet", tint=parse_color(node.tint) if node.tint else None)
+
+    def _draw_price(self, node: PriceNode):
+        integer = node.integer
+        color = parse_color(integer.color)
+
+        # Row: [integer] gap [decimal / period column], line-height 1
+        runs = [self._line_run(integer.text, integer.font_family, integer.font_size, integer.italic, color, 0, 0, integer.font_size)]
+        block_w = self._text_width(integer.text, integer.font_family, integer.font_size)
+        block_h = float(integer.font_size)
+        if node.decimal or node.period:
+            column_x = block_w + node.gap
+            column_y = float(node.offset)
+            column_w = 0.0
+            if node.decimal:
+                part = node.decimal
+                runs.append(self._line_run(part.text, part.font_family, part.font_size, part.italic, color, column_x, column_y, part.font_size))
+                column_w = self._text_width(part.text, part.font_family, part.font_size)
+                column_y += part.font_size
+            if node.period:
+                part = node.period
+                column_y += 2
+                runs.append(self._line_run(part.text, part.font_family, part.font_size, part.italic, color, column_x, column_y, part.font_size))
+                column_w = max(column_w, self._text_width(part.text, part.font_family, part.font_size))
+                column_y += part.font_size
+            block_w = column_x + column_w
+            block_h = max(block_h, column_y)
+
+        for run in runs:
+            run["block_width"] = block_w
+        self._draw_block(runs, node.box, block_h, node.align, node.scale, block_width=block_w)
+
+    def _draw_list(self, node: ListNode):
+        first = node.items[0]
+        mark_w = self._text_width(node.marker, first.font_family, first.font_size)
+
+        runs, block_h = [], 0.0
+        for index, item in enumerate(node.items):
+            if index:
+                block_h += node.gap
+            color = parse_color(item.color)
+            runs.append(self._line_run(node.marker, item.font_family, item.font_size, False, color, 0, block_h, item.font_size * LINE_HEIGHT))
+            item_runs = []
+            item_h = self._layout_paragraph(item_runs, item.text, item.font_family, item.font_size, item.italic, color,
+                                            node.box.width - mark_w - node.gap, 0.0, align="left")
+            for run in item_runs:
+                run["x"] += mark_w + node.gap
+                run["y"] += block_h
+                run["baseline"] += block_h
+            runs.extend(item_runs)
+            block_h += item_h
+
+        self._draw_block(runs, node.box, block_h, "left", 1.0, block_width=node.box.width)
+
+    def _draw_group(self, node: GroupNode):
+        box, label, scale = node.box, node.label, node.scale
+        text_w = self._text_width(label.text, label.font_family, label.font_size)
+
+        # Row: [logo, height logo_size] gap [text], items centered vertically
+        try:
+            image = self._load_image(node.image.source) if node.image else None
+        except (OSError, ValueError):
+            image = None  # Unreadable logo: the text alone is laid out
+        logo_size = node.image.height if image else 0
+        logo_w = image.width * logo_size / image.height if image else 0
+        ascent, descent = self._metrics(label.font_family, label.font_size, label.italic)
+        text_h = ascent + descent
+        block_h = max(logo_size, text_h)
+        text_x = logo_w + node.gap if image else 0
+        block_w = text_x + text_w
+
+        cx = box.x + box.width / 2
+        cy = box.y + box.height / 2
+        left = cx - block_w * scale / 2
+        top = cy - block_h * scale / 2
+
+        if image:
+            logo_h = logo_size * scale
+            tint = node.image.tint
+            self._paste_image(image, left, top + (block_h * scale - logo_h) / 2, logo_w * scale, logo_h, "meet",
+                              tint=parse_color(tint) if tint else None)
+        baseline = top + ((block_h - text_h) / 2 + ascent) * scale
+        self._draw_text(label.text, label.font_family, label.font_size * scale, label.italic, parse_color(label.color),
+                        left + text_x * scale, baseline)
+
+    NODE_DRAWERS = {
+        RectNode: _draw_rect,
+        ImageNode: _draw_image,
+        TextNode: _draw_text_node,
+        TextFlowNode: _draw_text_flow,
+        ButtonNode: _draw_button,
+        FittedImageNode: _draw_fitted_image,
+        PriceNode: _draw_price,
+        ListNode: _draw_list,
+        GroupNode: _draw_group,
+    }
+
+    # Layout helpers
+
+    def _layout_paragraph(self, runs, text, family, size, italic, color, max_width, top, align=None) -> float:
+        """Append wrapped lines of text (line-height 1.2) starting at top, return the new bottom"""
+        line_h = size * LINE_HEIGHT
+        for paragraph in split_lines(text):
+            for line in self._wrap(paragraph, family, size, max_width):
+                run = self._line_run(line, family, size, italic, color, 0, top, line_h)
+                run["align"] = align
+                runs.append(run)
+                top += line_h
+        return top
+
+    def _line_run(self, text, family, size, italic, color, x, y, line_h) -> Dict[str, Any]:
+        """A single line of text whose line box is (x, y, width, line_h) in block coordinates"""
+        ascent, descent = self._metrics(family, size, italic)
+        return {
+            "text": text, "family": family, "size": size, "italic": italic, "color": color,
+            "x": x, "y": y, "width": self._text_width(text, family, size),
+            "baseline": y + (line_h - (ascent + descent)) / 2 + ascent,
+        }
+
+    def _wrap(self, text, family, size, max_width) -> List[str]:
+        words = text.split()
+        lines, current = [], ""
+        for word in words:
+            candidate = f"{current} {word}" if current else word
+            if current and self._text_width(candidate, family, size) > max_width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        if current or not lines:
+            lines.append(current)
+        return lines
+
+    def _draw_block(self, runs, box, block_h, alignment, scale, clip=False, block_width=None):
+        """Place a block of runs in box like the serialised flex containers
+
+        The block is centered vertically and justified horizontally per
+        alignment; each line is aligned within the block by text-align, and
+        the whole block is scaled around its center (CSS transform: scale).
+        """
+        if not runs:
+            return
+        block_w = block_width if block_width is not None else max(run["width"] for run in runs)
+        block_w = min(block_w, box.width) if block_width is None else block_w
+
+        if alignment == "left":
+            left = box.x
+        elif alignment == "right":
+            left = box.x + box.width - block_w
+        else:
+            left = box.x + (box.width - block_w) / 2
+        top = box.y + (box.height - block_h) / 2
+        cx, cy = left + block_w / 2, top + block_h / 2
+
+        clip_box = (box.x, box.y, box.width, box.height) if clip else None
+        for run in runs:
+            align = run.get("align") or alignment
+            if "block_width" in run or align == "left":
+                x = left + run["x"]
+            elif align == "right":
+                x = left + block_w - run["width"] - run["x"]
+            else:
+                x = left + run["x"] + (block_w - run["x"] - run["width"]) / 2
+            baseline = top + run["baseline"]
+            self._draw_text(run["text"], run["family"], run["size"] * scale, run["italic"], run["color"],
+                            cx + (x - cx) * scale, cy + (baseline - cy) * scale, clip=clip_box)
+
+    # Drawing primitives (coordinates in template px, converted with self.scale)
+
+    def _box(self, x, y, w, h) -> Tuple[int, int, int, int]:
+        s = self.scale
+        return (round(x * s), round(y * s), round((x + w) * s), round((y + h) * s))
+
+    def _fill_rect(self, x, y, w, h, color, radius=0):
+        if color[3] == 0:
+            return
+        left, top, right, bottom = self._box(x, y, w, h)
+        if right <= left or bottom <= top:
+            return
+        layer = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(layer)
+        if radius:
+            draw.rounded_rectangle((0, 0, layer.width - 1, layer.height - 1), radius=radius * self.scale, fill=color)
+        else:
+            draw.rectangle((0, 0, layer.width, layer.height), fill=color)
+        self._composite(layer, left, top)
+
+    def _paste_image(self, image, x, y, w, h, fit, radius=0, tint=None):
+        left, top, right, bottom = self._box(x, y, w, h)
+        box_w, box_h = right - left, bottom - top
+        if box_w <= 0 or box_h <= 0:
+            return
+
+        if fit == "slice":
+            crop = slice_crop_box(image.width, image.height, box_w, box_h)
+            placed = image.resize((box_w, box_h), Image.LANCZOS, box=crop)
+            offset = (left, top)
+        else:
+            factor = min(box_w / image.width, box_h / image.height)
+            size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+            placed = image.resize(size, Image.LANCZOS)
+            offset = (left + (box_w - size[0]) // 2, top + (box_h - size[1]) // 2)
+
+        if tint:
+            colored = Image.new("RGBA", placed.size, tint[:3] + (255,))
+            colored.putalpha(placed.getchannel("A"))
+            placed = colored
+
+        if radius:
+            mask = Image.new("L", placed.size, 0)
+            ImageDraw.Draw(mask).rounded_rectangle((0, 0, placed.width - 1, placed.height - 1), radius=radius * self.scale, fill=255)
+            alpha = Image.new("L", placed.size, 0)
+            alpha.paste(placed.getchannel("A"), mask=mask)
+            placed.putalpha(alpha)
+
+        self._composite(placed, *offset)
+
+    def _draw_text(self, text, family, size, italic, color, x, baseline, anchor="ls", clip=None):
+        """Draw one line with its baseline at (x, baseline); anchor 'ls' = left, 'ms' = middle"""
+        if not text or size <= 0:
+            return
+        font = self._font(family, size, italic)
+        s = self.scale
+        bbox = font.getbbox(text, anchor=anchor)
+        skew = ITALIC_SKEW if italic and not self._has_italic_face(family) else 0
+        extra = int(abs(bbox[1]) * skew) + 2 if skew else 0
+
+        width = bbox[2] - bbox[0] + extra + 2
+        height = bbox[3] - bbox[1] + 2
+        origin_x = -bbox[0] + 1
+        origin_y = -bbox[1] + 1
+        layer = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        ImageDraw.Draw(layer).text((origin_x, origin_y), text, font=font, fill=color, anchor=anchor)
+
+        if skew:
+            # Slant around the baseline: rows above it shift right
+            layer = layer.transform(layer.size, Image.AFFINE, (1, skew, -skew * origin_y, 0, 1, 0), resample=Image.BICUBIC)
+
+        left = round(x * s - origin_x)
+        top = round(baseline * s - origin_y)
+        if clip:
+            clip_left, clip_top, clip_right, clip_bottom = self._box(*clip)
+            crop = (max(0, clip_left - left), max(0, clip_top - top),
+                    min(width, clip_right - left), min(height, clip_bottom - top))
+            if crop[2] <= crop[0] or crop[3] <= crop[1]:
+                return
+            layer = layer.crop(crop)
+            left, top = left + crop[0], top + crop[1]
+        self._composite(layer, left, top)
+
+    def _composite(self, layer, left, top):
+        """Alpha-composite layer onto the canvas at (left, top), clipping at the edges"""
+        crop_left, crop_top = max(0, -left), max(0, -top)
+        if crop_left or crop_top or left + layer.width > self.canvas.width or top + layer.height > self.canvas.height:
+            right = min(layer.width, self.canvas.width - left)
+            bottom = min(layer.height, self.canvas.height - top)
+            if right <= crop_left or bottom <= crop_top:
+                return
+            layer = layer.crop((crop_left, crop_top, right, bottom))
+            left, top = left + crop_left, top + crop_top
+        if layer.mode != "RGBA":
+            layer = layer.convert("RGBA")
+        self.canvas.alpha_composite(layer, (left, top))
+
+    # Resources
+
+    def _load_image(self, source: str) -> "Image.Image":
+        """Decode a data URI or open a file path, as RGBA (cached per source)"""
+        image = self._images.get(source)
+        if image is None:
+            if source.startswith("data:"):
+                raw = base64.b64decode(source.split(",", 1)[1])
+                image = Image.open(io.BytesIO(raw))
+            else:
+                image = Image.open(source)
+            image = image.convert("RGBA")
+            self._images[source] = image
+        return image
+
+    def _has_italic_face(self, family: str) -> bool:
+        name = self.engine._font_face(family, italic=True)
+        return bool(name) and "Italic" in name
+
+    def _font(self, family: str, size: float, italic: bool = False) -> "ImageFont.FreeTypeFont":
+        """Font for a CSS family at size template px (rendered at self.scale)"""
+        key = (family, italic, round(size * self.scale, 2))
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+
+        name = self.engine._font_face(family, italic)
+        path = self.engine.font_files.get(name) if name else None
+        path = path or font_path(family)
+        if path is None:
+            font = ImageFont.load_default(size * self.scale)
+        else:
+            font = ImageFont.truetype(path, size * self.scale)
+            self._set_weight(font, name or family)
+        self._fonts[key] = font
+        return font
+
+    @staticmethod
+    def _set_weight(font, name: str):
+        """Variable fonts (Oswald) default to regular: select the declared weight"""
+        try:
+            axes = font.get_variation_axes()
+        except OSError:
+            return  # Not a variable font
+        values = []
+        for axis in axes:
+            if axis.get("name") in (b"Weight", "Weight") and "Bold" in name:
+                values.append(min(700, axis["maximum"]))
+            else:
+                values.append(axis["default"])
+        font.set_variation_by_axes(values)
+
+    def _metrics(self, family, size, italic=False) -> Tuple[float, float]:
+        """Ascent and descent in template px"""
+        ascent, descent = self._font(family, size, italic).getmetrics()
+        return ascent / self.scale, descent / self.scale
+
+    def _text_width(self, text, family, size) -> float:
+        if not text:
+            return 0.0
+        return self._font(family, size).getlength(text) / self.scale
+
+
+def render_png(engine, template: Dict[str, Any], png_path: str, scale: int = 1):
+    """Render a template (or LayoutTree) of a prepared engine straight to a PNG file"""
+    RasterRenderer(engine, scale).save(template, png_path)
+
+
+register_serializer("png", RasterRenderer)
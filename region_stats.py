@@ -0,0 +1,233 @@
+"""
+Region statistics of backgrounds
+Summed-area tables (integral images) of a background's RGB channels and
+relative luminance, built once per file and kept on disk, so the mean
+color and the luminance contrast under any rectangle of any template
+geometry cost four lookups instead of decoding the image again. Used by
+TemplateEngine to resolve "auto" text colors, overlay opacity and logo
+variants. Backgrounds are assumed to cover the whole canvas
+(xMidYMid slice), as in every template.
+"""
+
+import os
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: without it "auto" styles use the fallback colors
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from asset_cache import mark_used, prune_cache_dir
+from background_variants import slice_crop_box
+
+DEFAULT_STATS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".asset_cache", "region_stats")
+MAX_STATS_BYTES = 256 * 1024 * 1024  # Tables kept in DEFAULT_STATS_DIR (a full library scan fits)
+TABLE_SIZE = 128          # Longest side of the downsampled image the tables are built on
+MEMORY_ENTRIES = 32       # Tables kept in memory per process
+
+# Channels of the tables: R, G, B (0-255), relative luminance and its square (contrast)
+_CHANNELS = 5
+
+
+@dataclass(frozen=True)
+class RegionSummary:
+    """What lies under a rectangle
+
+    Attributes:
+        color: Mean sRGB color
+        luminance: Mean relative luminance (0 black - 1 white)
+        contrast: Standard deviation of the luminance (0 flat, ~0.5 very busy)
+    """
+    color: Tuple[int, int, int]
+    luminance: float
+    contrast: float = 0.0
+
+
+def relative_luminance(rgb) -> float:
+    """WCAG relative luminance of an sRGB color (0-255 channels)"""
+    def linear(channel):
+        c = channel / 255
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+    r, g, b = (linear(channel) for channel in rgb[:3])
+    return 0.2126 * r + 0.7152 * g + 0.0722 * b
+
+
+def contrast_ratio(luminance_a: float, luminance_b: float) -> float:
+    """WCAG contrast ratio between two luminances (1 to 21)"""
+    lighter, darker = max(luminance_a, luminance_b), min(luminance_a, luminance_b)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def prefers_light(region: RegionSummary, light_rgb=(255, 255, 255), dark_rgb=(0, 0, 0)) -> bool:
+    """Whether light_rgb contrasts more than dark_rgb with the region, its brightest/darkest parts included"""
+    light_ratio = contrast_ratio(relative_luminance(light_rgb), min(1.0, region.luminance + region.contrast))
+    dark_ratio = contrast_ratio(relative_luminance(dark_rgb), max(0.0, region.luminance - region.contrast))
+    return light_ratio >= dark_ratio
+
+
+def overlay_opacity(region: RegionSummary, fill_rgb, text_rgb, target: float = 4.5,
+                    minimum: float = 0.0, maximum: float = 0.9, step: float = 0.05) -> float:
+    """Smallest opacity of a fill_rgb overlay that gives text_rgb the target contrast over region
+
+    The worst case of the region (mean luminance one standard deviation
+    towards the text) is composited with the overlay in linear light.
+    Returns maximum if even that is not enough.
+    """
+    text_luminance = relative_luminance(text_rgb)
+    fill_luminance = relative_luminance(fill_rgb)
+    towards_text = 1 if text_luminance > region.luminance else -1
+    worst = min(1.0, max(0.0, region.luminance + towards_text * region.contrast))
+
+    opacity = minimum
+    while opacity < maximum:
+        blended = opacity * fill_luminance + (1 - opacity) * worst
+        if contrast_ratio(text_luminance, blended) >= target:
+            return round(opacity, 2)
+        opacity += step
+    return maximum
+
+
+class RegionStats:
+    """Summed-area tables of one background image
+
+    tables[y, x] holds the sums of each channel over the pixels above and
+    left of (x, y) on the downsampled image, with a leading zero row and
+    column, so any rectangle sum is T[y1, x1] - T[y0, x1] - T[y1, x0] + T[y0, x0].
+
+    Args:
+        tables: (height + 1, width + 1, 5) float64 array
+        source_size: Pixel size of the original image (coordinates of region())
+    """
+
+    def __init__(self, tables, source_size: Tuple[int, int]):
+        self.tables = tables
+        self.source_width, self.source_height = source_size
+        self.height = tables.shape[0] - 1
+        self.width = tables.shape[1] - 1
+
+    @classmethod
+    def from_image(cls, path: str) -> "RegionStats":
+        with Image.open(path) as img:
+            source_size = img.size
+            img.draft("RGB", (TABLE_SIZE, TABLE_SIZE))
+            img = img.convert("RGB")
+            img.thumbnail((TABLE_SIZE, TABLE_SIZE), Image.BOX)
+            pixels = np.asarray(img, dtype=np.float64)
+
+        srgb = pixels / 255
+        linear = np.where(srgb <= 0.04045, srgb / 12.92, ((srgb + 0.055) / 1.055) ** 2.4)
+        luminance = linear @ np.array([0.2126, 0.7152, 0.0722])
+
+        channels = np.dstack([pixels, luminance, luminance ** 2])
+        tables = np.zeros((channels.shape[0] + 1, channels.shape[1] + 1, _CHANNELS))
+        tables[1:, 1:] = channels.cumsum(axis=0).cumsum(axis=1)
+        return cls(tables, source_size)
+
+    @classmethod
+    def load(cls, stats_path: str) -> "RegionStats":
+        with np.load(stats_path) as data:
+            return cls(data["tables"], tuple(int(n) for n in data["source_size"]))
+
+    def save(self, stats_path: str):
+        os.makedirs(os.path.dirname(stats_path), exist_ok=True)
+        tmp_path = f"{stats_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, tables=self.tables, source_size=np.array([self.source_width, self.source_height]))
+        os.replace(tmp_path, stats_path)
+
+    def summary(self, left: float, top: float, right: float, bottom: float) -> RegionSummary:
+        """Statistics of a rectangle in source image pixels (O(1))"""
+        sx = self.width / self.source_width
+        sy = self.height / self.source_height
+        x0 = min(self.width - 1, max(0, int(left * sx)))
+        y0 = min(self.height - 1, max(0, int(top * sy)))
+        x1 = max(x0 + 1, min(self.width, int(np.ceil(right * sx))))
+        y1 = max(y0 + 1, min(self.height, int(np.ceil(bottom * sy))))
+
+        t = self.tables
+        sums = t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]
+        count = (x1 - x0) * (y1 - y0)
+        mean = sums / count
+        variance = max(0.0, mean[4] - mean[3] ** 2)
+        return RegionSummary(tuple(int(round(c)) for c in mean[:3]), float(mean[3]), float(variance ** 0.5))
+
+    def region(self, box, canvas_width: float, canvas_height: float) -> RegionSummary:
+        """Statistics under a template box when the image covers the canvas (xMidYMid slice)"""
+        left, top, right, bottom = slice_crop_box(self.source_width, self.source_height, canvas_width, canvas_height)
+        scale_x = (right - left) / canvas_width
+        scale_y = (bottom - top) / canvas_height
+        return self.summary(left + box.x * scale_x, top + box.y * scale_y,
+                            left + (box.x + box.width) * scale_x, top + (box.y + box.height) * scale_y)
+
+
+_memory = OrderedDict()
+
+
+def get_region_stats(path: str, stats_dir: str = DEFAULT_STATS_DIR) -> Optional[RegionStats]:
+    """Tables for a background, from memory, the disk cache or built now
+
+    Keyed by path, size and mtime like background variants; least recently
+    used tables are deleted beyond MAX_STATS_BYTES. Returns None
+    if NumPy is missing or the image can't be read.
+    """
+    if np is None or not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    stats = _memory.get(key)
+    if stats is not None:
+        _memory.move_to_end(key)
+        return stats
+
+    digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:16]
+    stats_path = os.path.join(stats_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{digest}.npz")
+    try:
+        stats = RegionStats.load(stats_path)
+        mark_used(stats_path)
+    except (OSError, ValueError, KeyError):
+        if Image is None:
+            return None
+        try:
+            stats = RegionStats.from_image(path)
+        except OSError:
+            return None
+        try:
+            stats.save(stats_path)
+        except OSError:
+            pass  # Disk cache is an optimisation only
+        else:
+            prune_cache_dir(stats_dir, MAX_STATS_BYTES, keep=stats_path)
+
+    _memory[key] = stats
+    if len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+    return stats
+
+
+def precompute(paths, workers=None) -> int:
+    """Build the disk tables of many backgrounds across processes; returns how many are available"""
+    paths = list(paths)
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths) or 1))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return sum(pool.map(_precompute_one, paths))
+        except (OSError, NotImplementedError):
+            pass  # No multiprocessing support here: build sequentially
+    return sum(_precompute_one(path) for path in paths)
+
+
+def _precompute_one(path):
+    return get_region_stats(path) is not None
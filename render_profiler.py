@@ -0,0 +1,139 @@
+"""
+Per-component render profiling
+Opt-in instrumentation for TemplateEngine: while a RenderProfiler is
+attached (see TemplateEngine.profile) the engine records, for every
+component id/type, the wall time of its layout and of its SVG
+serialisation, the bytes it emitted and the assets (images, fonts) it
+embedded. Results export as JSON or as Chrome trace events, viewable in
+chrome://tracing or https://ui.perfetto.dev. Without a profiler the
+render path only checks engine.profiler once per layout/serialisation.
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class RenderProfiler:
+    """Collected profiling events of one or more renders
+
+    Events are dicts with phase ("layout", "serialize"), name (component
+    id, or "layout"/"svg" for whole-tree spans, "font_defs",
+    "background_image"), type, start and duration in seconds from the profiler
+    creation, bytes, assets and section (the label given to section()).
+    """
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self.origin = time.perf_counter()
+        self.section_label = None
+
+    @contextmanager
+    def section(self, label: str):
+        """Tag the events recorded inside with label (one track per label in traces)"""
+        previous = self.section_label
+        self.section_label = label
+        try:
+            yield self
+        finally:
+            self.section_label = previous
+
+    def record(self, phase: str, name: str, kind: str, start: float, duration: float,
+               size: Optional[int] = None, assets: Iterable[Dict[str, Any]] = ()):
+        self.events.append({
+            "phase": phase, "name": name, "type": kind, "section": self.section_label,
+            "start": start - self.origin, "duration": duration, "bytes": size, "assets": list(assets),
+        })
+
+    @contextmanager
+    def span(self, phase: str, name: str, kind: str):
+        """Time the enclosed block as one event"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, name, kind, start, time.perf_counter() - start)
+
+    def timed(self, phase: str, name: str, kind: str, compute: Callable):
+        """compute() timed as one event; returns its result"""
+        start = time.perf_counter()
+        result = compute()
+        self.record(phase, name, kind, start, time.perf_counter() - start)
+        return result
+
+    def stream(self, phase: str, name: str, kind: str, parts: Iterable[str],
+               assets: Iterable[str] = ()) -> Iterator[str]:
+        """Yield parts, recording one event from the first to the last part with their UTF-8 bytes"""
+        start = time.perf_counter()
+        size = 0
+        for part in parts:
+            size += len(part.encode("utf-8"))
+            yield part
+        self.record(phase, name, kind, start, time.perf_counter() - start, size,
+                    (describe_asset(source) for source in assets))
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per section and component: layout/serialise milliseconds, bytes and assets, largest first"""
+        rows = {}
+        for event in self.events:
+            if event["type"] is None:
+                continue  # Whole-tree spans
+            row = rows.setdefault((event["section"], event["name"]), {
+                "section": event["section"], "id": event["name"], "type": event["type"],
+                "layout_ms": 0.0, "serialize_ms": 0.0, "bytes": 0, "assets": [],
+            })
+            row[f"{event['phase']}_ms"] += event["duration"] * 1000
+            row["bytes"] += event["bytes"] or 0
+            row["assets"].extend(event["assets"])
+        for row in rows.values():
+            row["layout_ms"] = round(row["layout_ms"], 3)
+            row["serialize_ms"] = round(row["serialize_ms"], 3)
+        return sorted(rows.values(), key=lambda row: row["bytes"], reverse=True)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"summary": self.summary(), "events": self.events}
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """Trace Event Format: complete ("X") events in microseconds, one thread per section"""
+        threads = {}
+        trace = []
+        for event in self.events:
+            tid = threads.setdefault(event["section"], len(threads) + 1)
+            args = {"type": event["type"]}
+            if event["bytes"] is not None:
+                args["bytes"] = event["bytes"]
+            if event["assets"]:
+                args["assets"] = event["assets"]
+            trace.append({"name": event["name"], "cat": event["phase"], "ph": "X", "pid": 1, "tid": tid,
+                          "ts": round(event["start"] * 1e6, 3), "dur": round(event["duration"] * 1e6, 3),
+                          "args": args})
+        for section, tid in threads.items():
+            trace.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                          "args": {"name": section or "render"}})
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def write_json(self, path: str):
+        _write(path, self.to_json())
+
+    def write_chrome_trace(self, path: str):
+        _write(path, self.to_chrome_trace())
+
+
+def describe_asset(source: str) -> Dict[str, Any]:
+    """Short description of an embedded image or font: file path or data URI MIME, and size"""
+    if source.startswith("data:"):
+        header = source[:source.find(",")] if "," in source[:100] else "data:"
+        return {"source": header.split(";")[0], "bytes": len(source)}
+    try:
+        size = os.path.getsize(source)
+    except OSError:
+        size = None
+    return {"source": source, "bytes": size}
+
+
+def _write(path: str, data: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False)
+        f.write("\n")
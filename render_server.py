@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Persistent render server - keeps TemplateEngine warm between banners
+Accepts the same JSON payload as generate_single_banner.py over localhost HTTP
+
+Usage: python3 render_server.py [--host 127.0.0.1] [--port 8765]
+
+Endpoints:
+    POST /render         JSON payload -> SVG (image/svg+xml)
+    POST /render_batch   JSON payload with "templates" list -> JSON summary,
+                         SVGs written to payload["output_dir"] (default "output")
+    GET  /health         "ok"
+"""
+
+import os
+import sys
+import json
+import argparse
+import warnings
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+# Suppress all warnings to avoid polluting SVG output
+warnings.filterwarnings('ignore')
+
+from template_engine import TemplateEngine
+from generate_single_banner import BannerResources, render_banner, render_banners
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler: single banner (/render) or whole template set (/render_batch)"""
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, "text/plain", b"ok")
+        else:
+            self._send(404, "text/plain", b"Not found")
+
+    def do_POST(self):
+        if self.path not in ("/render", "/render_batch"):
+            self._send(404, "text/plain", b"Not found")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send(400, "text/plain", f"Error: invalid JSON ({e})".encode("utf-8"))
+            return
+
+        if self.path == "/render_batch":
+            self._render_batch(data)
+            return
+
+        if not data.get("template"):
+            self._send(400, "text/plain", b"Error: missing template")
+            return
+
+        try:
+            svg = render_banner(self.server.engine, data, self.server.resources)
+        except FileNotFoundError as e:
+            self._send(404, "text/plain", f"Error: {e}".encode("utf-8"))
+            return
+        except Exception as e:
+            self._send(500, "text/plain", f"Error: {e}".encode("utf-8"))
+            return
+
+        self._send(200, "image/svg+xml; charset=utf-8", svg.encode("utf-8"))
+
+    def _render_batch(self, data):
+        if not isinstance(data.get("templates"), list):
+            self._send(400, "text/plain", b"Error: missing templates list")
+            return
+
+        try:
+            results = render_banners(self.server.engine, data, self.server.resources, data.get("output_dir", "output"))
+        except Exception as e:
+            self._send(500, "text/plain", f"Error: {e}".encode("utf-8"))
+            return
+
+        self._send(200, "application/json", json.dumps({"banners": results}).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep stderr quiet unless something goes wrong
+        pass
+
+
+class RenderServer(HTTPServer):
+    """Single-threaded HTTP server owning one warm TemplateEngine
+
+    TemplateEngine keeps per-render state (content, background), so requests
+    are served one at a time; run several servers on different ports to scale out.
+    """
+
+    def __init__(self, address):
+        super().__init__(address, RenderRequestHandler)
+        self.engine = TemplateEngine()
+        self.engine.load_fonts()
+        # Templates are compiled once (load_template caches plans by mtime);
+        # logos and backgrounds stay warm in the shared AssetCache, and the
+        # engine's fragment cache re-renders only components whose content changed
+        self.resources = BannerResources()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent SVG banner render server")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    # Paths in the payload are relative to the project root, like the CLI
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    server = RenderServer((args.host, args.port))
+    print(f"🚀 Render server in ascolto su http://{args.host}:{args.port}", file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⚠️  Render server interrotto", file=sys.stderr)
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
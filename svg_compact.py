@@ -0,0 +1,177 @@
+"""
+Compact SVG output
+Minification of the markup written by SvgSerializer when the engine runs
+with compact_svg: insignificant whitespace (the newlines between elements
+and inside style attributes) is dropped, decimal numbers are rounded to a
+fixed precision ("364.0" -> "364", "182.456px" -> "182.46px"), inline
+styles repeated across the document become shared classes in the one
+<defs><style> and identical clip paths are written once. Text content and
+URLs are left as they are (the serializer cuts data URIs out beforehand).
+"""
+
+import re
+import hashlib
+from collections import Counter
+from typing import Dict
+
+DEFAULT_PRECISION = 2
+
+# Attributes holding URLs (data URIs included) or namespaces: never rewritten
+URL_ATTRIBUTES = frozenset(("href", "xlink:href", "src", "xmlns"))
+# Attributes holding coordinates and lengths, rounded to the precision
+LENGTH_ATTRIBUTES = frozenset(("x", "y", "width", "height", "rx", "ry", "font-size"))
+
+_TAG = re.compile(r'<[^>]*>')
+_TAG_NAME = re.compile(r'<(/?[\w:-]+)')
+_ATTRIBUTE = re.compile(r'([\w:-]+)="([^"]*)"')
+_NUMBER = re.compile(r'(?<![\w#.])(-?\d*\.\d+)(?![\d.])(px)?')
+_COMMA = re.compile(r'\s*,\s*')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};:,])\s*')
+_STYLE_ATTRIBUTE = re.compile(r' style="([^"]*)"')
+_CLIP_DEFS = re.compile(r'<defs><clipPath id="([^"]*)">(.*?)</clipPath></defs>')
+
+
+def format_number(value: float, precision: int = DEFAULT_PRECISION) -> str:
+    """Shortest decimal form of value rounded to precision digits (1200.0 -> "1200", 0.40 -> "0.4")"""
+    text = f"{value:.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def compact_numbers(text: str, precision: int = DEFAULT_PRECISION, lengths: bool = False) -> str:
+    """Decimal numbers of text shortened
+
+    px lengths (every number with lengths) are rounded to precision;
+    the others (scale factors, opacities) only lose trailing zeros.
+    """
+    def shorten(match):
+        number, unit = match.group(1), match.group(2) or ""
+        if lengths or unit:
+            return format_number(float(number), precision) + unit
+        number = number.rstrip("0").rstrip(".")
+        return (number if number not in ("", "-", "-0") else "0") + unit
+    return _NUMBER.sub(shorten, text)
+
+
+def compact_style(style: str, precision: int = DEFAULT_PRECISION) -> str:
+    """Inline CSS without whitespace between declarations, empty declarations or long numbers"""
+    declarations = []
+    for declaration in style.split(";"):
+        name, colon, value = declaration.partition(":")
+        if not colon:
+            continue
+        value = _COMMA.sub(",", compact_numbers(" ".join(value.split()), precision))
+        declarations.append(f"{name.strip()}:{value}")
+    return ";".join(declarations)
+
+
+def compact_css(css: str) -> str:
+    """Style sheet without insignificant whitespace (font data URIs contain none)"""
+    css = _CSS_PUNCTUATION.sub(r"\1", " ".join(css.split()))
+    return css.replace(";}", "}")
+
+
+def compact_markup(markup: str, precision: int = DEFAULT_PRECISION) -> str:
+    """Markup of SvgSerializer without insignificant whitespace and with rounded numbers
+
+    Whitespace-only text containing a newline is the serialiser's own
+    indentation (between SVG elements or flex items) and is dropped;
+    other text is kept verbatim, <style> contents are minified as CSS.
+    """
+    parts = []
+    position = 0
+    in_style = False
+    for match in _TAG.finditer(markup):
+        text = markup[position:match.start()]
+        if in_style:
+            parts.append(compact_css(text))
+        elif text and not (text.isspace() and "\n" in text):
+            parts.append(text)
+        tag = _compact_tag(match.group(0), precision)
+        in_style = tag.startswith("<style")
+        parts.append(tag)
+        position = match.end()
+    tail = markup[position:]
+    if not tail.isspace():
+        parts.append(tail)
+    return "".join(parts)
+
+
+def _compact_tag(tag: str, precision: int) -> str:
+    name = _TAG_NAME.match(tag)
+    if name is None or name.group(1).startswith("/"):
+        return tag  # Closing tags, comments
+    attributes = []
+    for attribute in _ATTRIBUTE.finditer(tag, name.end()):
+        key, value = attribute.groups()
+        if key == "style":
+            value = compact_style(value, precision)
+        elif key not in URL_ATTRIBUTES:
+            value = _COMMA.sub(",", compact_numbers(value, precision, key in LENGTH_ATTRIBUTES))
+        attributes.append(f' {key}="{value}"')
+    close = "/>" if tag[:-1].rstrip().endswith("/") else ">"
+    return f"<{name.group(1)}{''.join(attributes)}{close}"
+
+
+class CompactDocument:
+    """Document-wide pass over the compact fragments of one SVG
+
+    Every fragment goes through add() first (clip paths are taken out and
+    merged, styles counted), then through rewrite() once all are known
+    (repeated styles replaced by classes); defs() completes the document's
+    <defs> with the class rules and the clip paths.
+    """
+
+    def __init__(self):
+        self.style_counts = Counter()
+        self.clips: Dict[str, str] = {}    # clipPath content -> id written
+        self.classes: Dict[str, str] = {}  # style -> class name
+
+    def add(self, markup: str) -> str:
+        """markup without its clip path definitions, references pointing to the merged ones"""
+        aliases = {}
+
+        def merge_clip(match):
+            clip_id, content = match.groups()
+            kept = self.clips.setdefault(content, clip_id)
+            if kept != clip_id:
+                aliases[clip_id] = kept
+            return ""
+
+        markup = _CLIP_DEFS.sub(merge_clip, markup)
+        for clip_id, kept in aliases.items():
+            markup = markup.replace(f"url(#{clip_id})", f"url(#{kept})")
+        self.style_counts.update(_STYLE_ATTRIBUTE.findall(markup))
+        return markup
+
+    def assign_classes(self):
+        """One class per style used more than once, when the rule costs less than the repeats
+
+        Names carry a hash of the repeated styles: an SVG inlined in a page
+        shares its style sheet with the page and the other banners there.
+        """
+        repeated = [style for style, count in self.style_counts.items() if count > 1]
+        prefix = "s" + hashlib.sha1("\n".join(repeated).encode("utf-8")).hexdigest()[:4]
+        for style in repeated:
+            count = self.style_counts[style]
+            name = f"{prefix}-{len(self.classes)}"
+            rule_bytes = len(name) + len(style) + 3  # .name{style}
+            if count * (len(style) - len(name)) > rule_bytes:
+                self.classes[style] = name
+
+    def rewrite(self, markup: str) -> str:
+        if not self.classes:
+            return markup
+        return _STYLE_ATTRIBUTE.sub(
+            lambda match: f' class="{self.classes[match.group(1)]}"' if match.group(1) in self.classes else match.group(0),
+            markup)
+
+    def defs(self, font_defs: str) -> str:
+        """Compact font <defs> extended with the class rules and the clip paths"""
+        rules = "".join(f".{name}{{{style}}}" for style, name in self.classes.items())
+        clips = "".join(f'<clipPath id="{clip_id}">{content}</clipPath>' for content, clip_id in self.clips.items())
+        head, style_end, tail = font_defs.rpartition("</style>")
+        if not style_end:
+            return f"<defs><style>{rules}</style>{clips}</defs>" if rules or clips else font_defs
+        return f"{head}{rules}{style_end}{clips}{tail}"
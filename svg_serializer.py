@@ -0,0 +1,586 @@
+"""
+SVG serialiser for layout trees
+Writes the nodes of a LayoutTree as SVG: plain shapes for rects, images
+and single lines, foreignObject with HTML/CSS flexbox for wrapped and
+auto-fit text so the browser does the final line breaking. Fonts and
+images are embedded (or referenced) through the engine's asset settings.
+With the engine's compact_svg the markup is minified (svg_compact).
+"""
+
+from dataclasses import replace
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from asset_cache import get_asset_cache
+from byte_budget import fit_budget
+from layout_tree import (
+    ButtonNode, ComponentLayout, FittedImageNode, GroupNode, ImageNode, LayoutTree, ListNode, PriceNode,
+    RectNode, TextFlowNode, TextNode, register_serializer,
+)
+from svg_compact import CompactDocument, compact_markup
+
+FLEX_ALIGN = {'left': 'flex-start', 'right': 'flex-end', 'center': 'center'}
+
+# Delimits the index of a cut-out href in compact markup (never part of SVG text)
+SPLICE = '\x00'
+
+# CSS filter recoloring <img> logos (used when a logo_color is set)
+LOGO_TINT_FILTER = 'filter: brightness(0) saturate(100%) invert(48%) sepia(79%) saturate(2476%) hue-rotate(316deg) brightness(98%) contrast(119%);'
+
+
+class SvgSerializer:
+    """Serialises LayoutTrees of a TemplateEngine to SVG strings
+
+    Args:
+        engine: TemplateEngine whose fonts and asset mode (inline or
+            reference, background variants) are used for hrefs
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.replacements = {}  # Image source -> re-encoded file, to meet the tree's byte budget
+        self._replacements_key = ()
+        self._cut_hrefs = None  # While compacting: hrefs replaced by SPLICE placeholders
+
+    def serialize(self, tree: LayoutTree) -> str:
+        """Whole SVG document for a layout tree"""
+        return ''.join(self.stream(tree, chunked=False))
+
+    def write(self, tree: LayoutTree, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            self.write_to(tree, f)
+
+    def write_to(self, tree: LayoutTree, sink):
+        """Write the SVG to a file-like sink piece by piece"""
+        for chunk in self.stream(tree):
+            sink.write(chunk)
+
+    def stream(self, tree: LayoutTree, chunked: bool = True) -> Iterator[str]:
+        """SVG document as a sequence of strings
+
+        With chunked, inline images read from disk are yielded as base64
+        chunks instead of whole data URIs (see AssetCache.iter_data_uri);
+        everything else comes from the fragment cache when possible. Trees
+        with a byte budget get their images re-encoded to fit (byte_budget). With a
+        profiler on the engine, the fonts, background and each component
+        are recorded as serialize events (time includes a streaming sink;
+        in compact mode the markup is built before the first byte, so events
+        only time its rewrite and output).
+        """
+        # Recomputed for every tree: a serializer reused for a tree without budget embeds the originals
+        self.replacements = fit_budget(self, tree) if tree.budget is not None else {}
+        self._replacements_key = tuple(sorted(self.replacements.items()))
+
+        body = self._compact_stream if self.engine.compact_svg else self._stream
+        profiler = self.engine.profiler
+        if profiler is not None:
+            return profiler.stream("serialize", "svg", None, body(tree, chunked, profiler))
+        return body(tree, chunked, None)
+
+    def _size(self, tree: LayoutTree) -> int:
+        """UTF-8 bytes of the SVG with the current replacements (not profiled, budget not refitted)"""
+        body = self._compact_stream if self.engine.compact_svg else self._stream
+        return len(''.join(body(tree, False, None)).encode('utf-8'))
+
+    def _stream(self, tree: LayoutTree, chunked: bool, profiler) -> Iterator[str]:
+        yield f'<svg xmlns="http://www.w3.org/2000/svg" width="{tree.width}" height="{tree.height}" viewBox="0 0 {tree.width} {tree.height}">'
+
+        # Only the fonts (and glyphs) used by the tree are embedded
+        used_glyphs = self.engine._collect_glyphs(tree)
+        glyphs_key = frozenset((name, frozenset(glyphs)) for name, glyphs in used_glyphs.items())
+        yield '\n'
+        font_defs = (self._memo(("font_defs", glyphs_key, self.engine.font_subsetting),
+                                lambda: self.engine._generate_font_defs(used_glyphs)),)
+        if profiler is not None:
+            fonts = [self.engine.font_files[name] for name in used_glyphs if self.engine.font_files.get(name)]
+            font_defs = profiler.stream("serialize", "font_defs", "fonts", font_defs, fonts)
+        yield from font_defs
+
+        if tree.background:
+            yield '\n'
+            parts = self._background_parts(tree.background, chunked)
+            if profiler is not None:
+                parts = profiler.stream("serialize", "background_image", "background", parts, self._assets((tree.background,)))
+            yield from parts
+
+        for component in tree.components:
+            yield '\n'
+            parts = self._component_parts(component, chunked)
+            if profiler is not None:
+                parts = profiler.stream("serialize", component.id, component.type, parts, self._assets(component.nodes))
+            yield from parts
+
+        if tree.guides:
+            yield '\n'
+            yield '\n'.join(self.node(node) for node in tree.guides)
+
+        yield '\n</svg>'
+
+    def _background_parts(self, node: ImageNode, chunked: bool) -> Iterator[str]:
+        path = self._stream_path(node) if chunked else None
+        if path:
+            yield from self._image_parts(node, get_asset_cache().iter_data_uri(path))
+        else:
+            yield self._memo(("background", node), lambda: self.node(node))
+
+    def _component_parts(self, component: ComponentLayout, chunked: bool) -> Iterator[str]:
+        paths = [self._stream_path(node) for node in component.nodes] if chunked else []
+        if not any(paths):
+            yield self.component(component)
+            return
+        for index, (node, path) in enumerate(zip(component.nodes, paths)):
+            if index:
+                yield '\n'
+            if path:
+                yield from self._image_parts(node, get_asset_cache().iter_data_uri(path))
+            else:
+                yield self.node(node)
+
+    def _assets(self, nodes) -> Iterator[str]:
+        """Image sources (files or data URIs) embedded by nodes, for profiling"""
+        for node in nodes:
+            if isinstance(node, ImageNode):
+                yield self._image_source(node)
+            elif isinstance(node, FittedImageNode):
+                yield node.source
+            elif isinstance(node, GroupNode) and node.image:
+                yield node.image.source
+
+    # Compact output
+
+    def _compact_stream(self, tree: LayoutTree, chunked: bool, profiler) -> Iterator[str]:
+        """Minified document: all fragments are compacted first, so that styles repeated
+        anywhere become classes and clip paths are merged in the one <defs>"""
+        precision = self.engine.svg_precision
+        document = CompactDocument()
+
+        # (event name, type, (markup, hrefs), nodes)
+        sections = []
+        if tree.background:
+            sections.append(("background_image", "background",
+                             self._compact_fragment(("background",), (tree.background,), chunked, document),
+                             (tree.background,)))
+        for component in tree.components:
+            sections.append((component.id, component.type,
+                             self._compact_fragment(("component", component), component.nodes, chunked, document),
+                             component.nodes))
+        if tree.guides:
+            markup, hrefs = self._compact_nodes(tree.guides, [None] * len(tree.guides))
+            sections.append((None, None, (document.add(markup), hrefs), ()))
+        document.assign_classes()
+
+        yield f'<svg xmlns="http://www.w3.org/2000/svg" width="{tree.width}" height="{tree.height}" viewBox="0 0 {tree.width} {tree.height}">'
+
+        used_glyphs = self.engine._collect_glyphs(tree)
+        glyphs_key = frozenset((name, frozenset(glyphs)) for name, glyphs in used_glyphs.items())
+        markup, hrefs = self._memo(("compact", "font_defs", glyphs_key, self.engine.font_subsetting, precision),
+                                   lambda: self._compact(lambda: self.engine._generate_font_defs(used_glyphs, self._cut)),
+                                   self._compact_size)
+        font_defs = self._spliced(document.defs(markup), hrefs)
+        if profiler is not None:
+            fonts = [self.engine.font_files[name] for name in used_glyphs if self.engine.font_files.get(name)]
+            font_defs = profiler.stream("serialize", "font_defs", "fonts", font_defs, fonts)
+        yield from font_defs
+
+        for name, kind, (markup, hrefs), nodes in sections:
+            parts = self._spliced(document.rewrite(markup), hrefs)
+            if profiler is not None and name is not None:
+                parts = profiler.stream("serialize", name, kind, parts, self._assets(nodes))
+            yield from parts
+
+        yield '</svg>'
+
+    def _compact_fragment(self, key: tuple, nodes, chunked: bool, document: CompactDocument) -> Tuple[str, tuple]:
+        """(compact markup, hrefs) of nodes, the markup added to document
+
+        Images streamed from disk have (path,) as href, written as base64
+        chunks like in chunked non-compact output.
+        """
+        paths = [self._stream_path(node) for node in nodes] if chunked else [None] * len(nodes)
+        if any(paths):
+            markup, hrefs = self._compact_nodes(nodes, paths)
+        else:
+            markup, hrefs = self._memo(("compact",) + key + (self.engine.svg_precision,),
+                                       lambda: self._compact_nodes(nodes, paths), self._compact_size)
+        return document.add(markup), hrefs
+
+    def _compact_nodes(self, nodes, paths) -> Tuple[str, tuple]:
+        def markup():
+            parts = []
+            for node, path in zip(nodes, paths):
+                if isinstance(node, ImageNode):
+                    node = self._unclipped(node)
+                    if path:
+                        parts.append(''.join(self._image_parts(node, (self._cut((path,)),))))
+                        continue
+                parts.append(self.node(node))
+            return ''.join(parts)
+        return self._compact(markup)
+
+    def _compact(self, write: Callable[[], str]) -> Tuple[str, tuple]:
+        """compact_markup of write() with every href it writes cut out
+
+        The hrefs (data URIs of megabytes) are replaced by SPLICE-delimited
+        indexes into the returned tuple, so the compaction regexes never
+        scan them; _spliced() puts them back on output.
+        """
+        self._cut_hrefs = hrefs = []
+        try:
+            markup = compact_markup(write(), self.engine.svg_precision)
+        finally:
+            self._cut_hrefs = None
+        return markup, tuple(hrefs)
+
+    def _cut(self, href):
+        """Placeholder for href while compacting, href itself otherwise"""
+        if self._cut_hrefs is None:
+            return href
+        self._cut_hrefs.append(href)
+        return f'{SPLICE}{len(self._cut_hrefs) - 1}{SPLICE}'
+
+    @staticmethod
+    def _compact_size(fragment: Tuple[str, tuple]) -> int:
+        markup, hrefs = fragment
+        return len(markup) + sum(len(href) for href in hrefs if isinstance(href, str))
+
+    @staticmethod
+    def _spliced(markup: str, hrefs: tuple) -> Iterator[str]:
+        """markup with its hrefs back in place of the placeholders ((path,) streamed from disk)"""
+        for index, part in enumerate(markup.split(SPLICE)):
+            if index % 2 == 0:
+                if part:
+                    yield part
+                continue
+            href = hrefs[int(part)]
+            if isinstance(href, str):
+                yield href
+            else:
+                yield from get_asset_cache().iter_data_uri(href[0])
+
+    @staticmethod
+    def _unclipped(node: ImageNode) -> ImageNode:
+        """node without a square clip equal to its box: the <image> viewport already clips there"""
+        clip = node.clip
+        if clip is not None and clip.radius is None and clip.box == node.box:
+            return replace(node, clip=None)
+        return node
+
+    def component(self, component: ComponentLayout) -> str:
+        """SVG fragment of one component (memoised in the engine's fragment cache)"""
+        return self._memo(("component", component), lambda: '\n'.join(self.node(node) for node in component.nodes))
+
+    def _memo(self, key: tuple, compute, size: Callable[[object], int] = len):
+        cache = self.engine.fragment_cache
+        if cache is None:
+            return compute()
+        return cache.get_or_compute(("svg",) + key + (self.engine._asset_key(), self._replacements_key), compute, size)
+
+    def node(self, node) -> str:
+        writer = self.NODE_WRITERS.get(type(node))
+        if writer is None:
+            raise TypeError(f"No SVG writer for {type(node).__name__}")
+        return writer(self, node)
+
+    # Shapes
+
+    def _rect(self, node: RectNode) -> str:
+        box = node.box
+        attrs = f'x="{box.x}" y="{box.y}" width="{box.width}" height="{box.height}"'
+        if node.radius is not None:
+            attrs += f' rx="{node.radius}" ry="{node.radius}"'
+        attrs += f' fill="{node.fill}"'
+        if node.opacity is not None:
+            attrs += f' opacity="{node.opacity}"'
+        return f'<rect {attrs}/>'
+
+    def _image(self, node: ImageNode) -> str:
+        return ''.join(self._image_parts(node, (self._href(self._image_source(node)),)))
+
+    def _image_parts(self, node: ImageNode, href: Iterable[str]) -> Iterator[str]:
+        box = node.box
+        aspect = "xMidYMid slice" if node.fit == "slice" else "xMidYMid meet"
+
+        clip = node.clip
+        if clip is not None:
+            radius = f' rx="{clip.radius}" ry="{clip.radius}"' if clip.radius is not None else ''
+            yield (f'<defs><clipPath id="{clip.id}"><rect x="{clip.box.x}" y="{clip.box.y}" width="{clip.box.width}" '
+                   f'height="{clip.box.height}"{radius}/></clipPath></defs>\n')
+
+        yield '<image href="'
+        yield from href
+        yield f'" x="{box.x}" y="{box.y}" width="{box.width}" height="{box.height}" preserveAspectRatio="{aspect}"'
+        yield f' clip-path="url(#{clip.id})"/>' if clip is not None else '/>'
+
+    def _image_source(self, node: ImageNode) -> str:
+        """File path or data URI actually embedded: budget re-encoding, background variant, else the node source"""
+        source = node.source
+        if node.variant_path:
+            source = self.engine._background_variant_path(node.box.width, node.box.height, node.variant_path) or source
+        return self.replacements.get(source, source)
+
+    def _stream_path(self, node) -> Optional[str]:
+        """File of an inline image from disk (written in base64 chunks when streaming), else None"""
+        if not isinstance(node, ImageNode) or self.engine.asset_publisher is not None:
+            return None
+        source = self._image_source(node)
+        return None if source.startswith("data:") else source
+
+    def _href(self, source: str) -> str:
+        source = self.replacements.get(source, source)
+        if source.startswith("data:"):
+            return self._cut(self.engine._data_href(source))
+        return self._cut(self.engine._file_href(source))
+
+    def _text(self, node: TextNode) -> str:
+        run = node.run
+        attrs = f'x="{node.x}" y="{node.y}"'
+        if run.font_family:
+            attrs += f' font-family="{run.font_family}"'
+        attrs += f' font-size="{run.font_size}" fill="{run.color}"'
+        if node.anchor:
+            attrs += f' text-anchor="{node.anchor}"'
+        return f'<text {attrs}>{run.text}</text>'
+
+    # HTML/CSS boxes
+
+    @staticmethod
+    def _foreign_object(box) -> str:
+        return f'<foreignObject x="{box.x}" y="{box.y}" width="{box.width}" height="{box.height}">'
+
+    def _text_flow(self, node: TextFlowNode) -> str:
+        if node.overflow == "clip":
+            return self._text_box(node)
+
+        parts = [self._foreign_object(node.box)]
+
+        # Outer container for centering
+        align_items_css = FLEX_ALIGN.get(node.align, 'center')
+        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%; height: 100%;')
+        parts.append('display: flex; align-items: center;')
+        parts.append(f'justify-content: {align_items_css};')
+        if node.background:
+            parts.append(f'background: {node.background};')
+        parts.append('">')
+
+        # Inner container with scale and column layout
+        parts.append('<div style="')
+        parts.append('display: flex; flex-direction: column;')
+        parts.append(f'align-items: {align_items_css};')
+        parts.append(f'transform: scale({node.scale});')
+        parts.append('transform-origin: center;')
+        parts.append('">')
+
+        for paragraph in node.paragraphs:
+            run = paragraph.run
+            parts.append(f'<div style="')
+            parts.append(f'color: {run.color};')
+            parts.append(f'font-family: \'{run.font_family}\';')
+            parts.append(f'font-size: {run.font_size}px;')
+            parts.append(f'text-align: {node.align};')
+            parts.append('word-wrap: break-word;')
+            parts.append(f'max-width: {node.box.width}px;')
+            parts.append('line-height: 1.2;')
+            if paragraph.margin_top:
+                parts.append(f'margin-top: {paragraph.margin_top}px;')
+            parts.append('">' + run.text + '</div>')
+
+        parts.append('</div>')  # Close inner
+        parts.append('</div>')  # Close outer
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _text_box(self, node: TextFlowNode) -> str:
+        """Fixed-size container, overflow hidden (single paragraph)"""
+        box = node.box
+        run = node.paragraphs[0].run
+
+        parts = [self._foreign_object(box)]
+        parts.append(f'<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append(f'width: {box.width}px;')
+        parts.append(f'height: {box.height}px;')
+        parts.append('box-sizing: border-box;')
+        parts.append('display: flex;')
+        parts.append('align-items: center;')
+        parts.append(f'justify-content: {node.align};')
+        parts.append('overflow: hidden;')
+        parts.append(f'color: {run.color};')
+        parts.append(f'font-family: \'{run.font_family}\';')
+        parts.append(f'font-size: {run.font_size}px;')
+        parts.append(f'text-align: {node.align};')
+        parts.append('word-wrap: break-word;')
+        parts.append('line-height: 1.2;')
+        parts.append(f'">{run.text}</div>')
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _button(self, node: ButtonNode) -> str:
+        label = node.label
+
+        parts = [self._foreign_object(node.box)]
+
+        # Button div with border-radius and flexbox centering
+        parts.append(f'<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%; height: 100%;')
+        parts.append(f'background: {node.background};')
+        parts.append(f'border-radius: {node.radius}px;')
+        parts.append('display: flex; align-items: center; justify-content: center;')
+        parts.append('">')
+
+        # Text with scale
+        parts.append(f'<span style="')
+        parts.append(f'color: {label.color};')
+        parts.append(f'font-family: \'{label.font_family}\';')
+        parts.append(f'font-style: {self._font_style(label)};')
+        parts.append(f'font-size: {label.font_size}px;')
+        parts.append(f'transform: scale({node.scale});')
+        parts.append('white-space: nowrap;')
+        parts.append('">' + label.text + '</span>')
+
+        parts.append('</div>')
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _fitted_image(self, node: FittedImageNode) -> str:
+        parts = [self._foreign_object(node.box)]
+
+        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%; height: 100%;')
+        parts.append('display: flex; justify-content: center; align-items: center;')
+        parts.append(f'padding: {node.padding}px;')
+        parts.append('box-sizing: border-box;')
+        parts.append('">')
+
+        logo_filter = LOGO_TINT_FILTER if node.tint else ''
+        parts.append(f'<img src="{self._href(node.source)}" style="max-width: 100%; max-height: 100%; {logo_filter}" />')
+        parts.append('</div>')
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _price(self, node: PriceNode) -> str:
+        parts = [self._foreign_object(node.box)]
+
+        # Outer container for centering
+        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%; height: 100%; display: flex;')
+        parts.append('align-items: center;')
+        parts.append(f'justify-content: {FLEX_ALIGN.get(node.align, "center")};')
+        parts.append('">')
+
+        # Inner container with scale
+        parts.append('<div style="')
+        parts.append(f'display: flex; gap: {node.gap}px;')
+        parts.append(f'transform: scale({node.scale}); transform-origin: center;')
+        parts.append('">')
+
+        # Integer part (left side, large)
+        parts.append(self._price_part(node.integer))
+
+        # Decimal + period column (right side)
+        if node.decimal or node.period:
+            parts.append(f'<div style="display: flex; flex-direction: column; align-items: flex-start; margin-top: {node.offset}px;">')
+            if node.decimal:
+                parts.append(self._price_part(node.decimal))
+            if node.period:
+                parts.append(self._price_part(node.period, ' margin-top: 2px;'))
+            parts.append('</div>')
+
+        parts.append('</div>')  # Close inner container
+        parts.append('</div>')  # Close outer container
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _price_part(self, run, extra: str = '') -> str:
+        return (f'<div style="color: {run.color}; font-family: \'{run.font_family}\'; font-style: {self._font_style(run)}; '
+                f'font-size: {run.font_size}px; line-height: 1;{extra}">{run.text}</div>')
+
+    def _list(self, node: ListNode) -> str:
+        first = node.items[0]
+
+        parts = [self._foreign_object(node.box)]
+
+        # Container div
+        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%; height: 100%;')
+        parts.append('display: flex; flex-direction: column;')
+        parts.append('justify-content: center;')
+        parts.append(f'color: {first.color};')
+        parts.append(f'font-family: \'{first.font_family}\';')
+        parts.append(f'font-size: {first.font_size}px;')
+        parts.append(f'gap: {node.gap}px;')
+        parts.append('">')
+
+        for item in node.items:
+            parts.append(f'<div style="display: flex; gap: {node.gap}px; align-items: flex-start;">')
+            parts.append(f'<span style="flex-shrink: 0;">{node.marker}</span>')
+            parts.append(f'<span style="word-wrap: break-word; overflow-wrap: break-word;">{item.text}</span>')
+            parts.append('</div>')
+
+        parts.append('</div>')
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    def _group(self, node: GroupNode) -> str:
+        label = node.label
+
+        parts = [self._foreign_object(node.box)]
+
+        # Outer container for centering
+        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
+        parts.append('width: 100%;')
+        parts.append('height: 100%;')
+        parts.append('display: flex;')
+        parts.append('justify-content: center;')
+        parts.append('align-items: center;')
+        parts.append('">')
+
+        # Inner content container with transform scale applied
+        parts.append('<div style="')
+        parts.append('display: flex;')
+        parts.append('align-items: center;')
+        parts.append(f'gap: {node.gap}px;')
+        parts.append(f'transform: scale({node.scale});')
+        parts.append('transform-origin: center center;')
+        parts.append('">')
+
+        if node.image:
+            logo_filter = LOGO_TINT_FILTER if node.image.tint else ''
+            parts.append(f'<img src="{self._href(node.image.source)}" style="height: {node.image.height}px; width: auto; {logo_filter}" />')
+
+        parts.append(f'<span style="')
+        parts.append(f'color: {label.color};')
+        parts.append(f'font-family: \'{label.font_family}\';')
+        parts.append(f'font-style: {self._font_style(label)};')
+        parts.append(f'font-size: {label.font_size}px;')
+        parts.append('white-space: nowrap;')
+        parts.append('">' + label.text + '</span>')
+
+        parts.append('</div>')  # Close inner content
+        parts.append('</div>')  # Close outer container
+        parts.append('</foreignObject>')
+
+        return '\n'.join(parts)
+
+    @staticmethod
+    def _font_style(run) -> str:
+        return 'italic' if run.italic else 'normal'
+
+    NODE_WRITERS = {
+        RectNode: _rect,
+        ImageNode: _image,
+        TextNode: _text,
+        TextFlowNode: _text_flow,
+        ButtonNode: _button,
+        FittedImageNode: _fitted_image,
+        PriceNode: _price,
+        ListNode: _list,
+        GroupNode: _group,
+    }
+
+
+register_serializer("svg", SvgSerializer)
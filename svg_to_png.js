@@ -1,71 +1,187 @@
 #!/usr/bin/env node
 
+// SVG -> PNG conversion with Puppeteer
+//
+//   node svg_to_png.js <svg_path> <png_path> [scale]      single file
+//   node svg_to_png.js --server [--port 8766] [--pages 4]  persistent HTTP service
+//   node svg_to_png.js --stdin [--pages 4]                 JSON lines jobs on stdin
+//   node svg_to_png.js --manifest <file> [--pages 4]       batch of JSON lines jobs
+//   node svg_to_png.js --dir <dir> [--scales 1,2]          every SVG of a folder
+//
+// A job is {"svg": ..., "png": ..., "scale": 2} or, for several densities in
+// one pass, {"svg": ..., "png": ..., "scales": [1, 2]}: scale 1 is written to
+// png, any other scale N to png with an "@Nx" suffix (banner@2x.png).
+//
+// The service modes keep one warm Chromium with a pool of pages, so each
+// conversion only costs the page render instead of a browser launch.
+
 const puppeteer = require('puppeteer');
 const fs = require('fs');
+const http = require('http');
 const path = require('path');
+const readline = require('readline');
+const { pathToFileURL } = require('url');
+
+const DEFAULT_HOST = '127.0.0.1';
+const DEFAULT_PORT = 8766;
+const DEFAULT_PAGES = 4;
+const DEFAULT_SCALE = 2; // Default 2x for retina quality
+const DEFAULT_TIMEOUT = 30000; // Per page operation, ms
+
+// SVGs rendered with asset_mode "reference" point to files next to them
+// (assets/...) instead of embedding data URIs
+function referencesExternalAssets(svgContent) {
+    return /(?:href|src)="(?!data:|#|https?:)[^"]+"/.test(svgContent) || /url\('(?!data:)[^']+'\)/.test(svgContent);
+}
 
-async function convertSvgToPng(svgPath, pngPath, scale = 2) {
-    const browser = await puppeteer.launch({
+function launchBrowser() {
+    return puppeteer.launch({
         headless: true,
-        args: ['--no-sandbox', '--disable-setuid-sandbox']
+        args: ['--no-sandbox', '--disable-setuid-sandbox', '--allow-file-access-from-files']
     });
+}
 
-    try {
-        const page = await browser.newPage();
+// Fixed-size pool of pages on one browser; callers wait for a free page
+class PagePool {
+    constructor(browser, size, timeout = DEFAULT_TIMEOUT) {
+        this.browser = browser;
+        this.size = Math.max(1, size);
+        this.timeout = timeout;
+        this.created = 0;
+        this.idle = [];
+        this.waiters = [];  // { resolve, reject } of callers waiting for a page
+    }
 
-        // Read SVG file
-        const svgContent = fs.readFileSync(svgPath, 'utf8');
+    async acquire() {
+        if (this.idle.length) {
+            return this.idle.pop();
+        }
+        if (this.created < this.size) {
+            this.created++;
+            try {
+                const page = await this.browser.newPage();
+                page.setDefaultTimeout(this.timeout);
+                return page;
+            } catch (error) {
+                this.created--;
+                throw error;
+            }
+        }
+        return new Promise((resolve, reject) => this.waiters.push({ resolve, reject }));
+    }
 
-        // Extract dimensions from SVG
-        const widthMatch = svgContent.match(/width="(\d+)"/);
-        const heightMatch = svgContent.match(/height="(\d+)"/);
+    release(page) {
+        const waiter = this.waiters.shift();
+        if (waiter) {
+            waiter.resolve(page);
+        } else {
+            this.idle.push(page);
+        }
+    }
 
-        if (!widthMatch || !heightMatch) {
-            throw new Error('Could not extract SVG dimensions');
+    // Run fn(page); a page that failed is replaced so a broken state isn't reused
+    async run(fn) {
+        const page = await this.acquire();
+        try {
+            const result = await fn(page);
+            this.release(page);
+            return result;
+        } catch (error) {
+            await page.close().catch(() => {});
+            this.created--;
+            // Hand the free slot to a waiting caller, if any; if no page can be
+            // opened for it, that caller fails too instead of waiting forever
+            const waiter = this.waiters.shift();
+            if (waiter) {
+                this.acquire().then(waiter.resolve, waiter.reject);
+            }
+            throw error;
         }
+    }
+}
 
-        const width = parseInt(widthMatch[1]);
-        const height = parseInt(heightMatch[1]);
+// PNG path for one scale of a multi-scale job
+function scaledPngPath(pngPath, scale) {
+    if (scale === 1) {
+        return pngPath;
+    }
+    const ext = path.extname(pngPath);
+    return `${pngPath.slice(0, pngPath.length - ext.length)}@${scale}x${ext}`;
+}
 
-        // Set viewport to SVG dimensions * scale for high quality
-        await page.setViewport({
-            width: width * scale,
-            height: height * scale,
-            deviceScaleFactor: scale
-        });
+// [{ png, scale }] written by a job
+function jobOutputs(job) {
+    if (Array.isArray(job.scales) && job.scales.length) {
+        return job.scales.map(scale => parseInt(scale)).map(scale => ({ png: scaledPngPath(job.png, scale), scale }));
+    }
+    return [{ png: job.png, scale: job.scale ? parseInt(job.scale) : DEFAULT_SCALE }];
+}
+
+// Load the SVG once and screenshot it at every requested scale
+async function renderSvg(page, svgPath, outputs) {
+    // Read SVG file
+    const svgContent = fs.readFileSync(svgPath, 'utf8');
+
+    // Extract dimensions from SVG
+    const widthMatch = svgContent.match(/width="(\d+)"/);
+    const heightMatch = svgContent.match(/height="(\d+)"/);
 
-        // Create HTML with embedded SVG
-        const html = `
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <style>
-                    body {
-                        margin: 0;
-                        padding: 0;
-                        width: ${width}px;
-                        height: ${height}px;
-                    }
-                    svg {
-                        display: block;
-                    }
-                </style>
-            </head>
-            <body>
-                ${svgContent}
-            </body>
-            </html>
-        `;
+    if (!widthMatch || !heightMatch) {
+        throw new Error('Could not extract SVG dimensions');
+    }
+
+    const width = parseInt(widthMatch[1]);
+    const height = parseInt(heightMatch[1]);
 
+    // Set viewport to SVG dimensions * scale for high quality
+    const setScale = scale => page.setViewport({
+        width: width * scale,
+        height: height * scale,
+        deviceScaleFactor: scale
+    });
+    await setScale(outputs[0].scale);
+
+    // Create HTML with embedded SVG
+    const html = `
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <style>
+                body {
+                    margin: 0;
+                    padding: 0;
+                    width: ${width}px;
+                    height: ${height}px;
+                }
+                svg {
+                    display: block;
+                }
+            </style>
+        </head>
+        <body>
+            ${svgContent}
+        </body>
+        </html>
+    `;
+
+    if (referencesExternalAssets(svgContent)) {
+        // Load the SVG from disk so relative asset hrefs resolve
+        await page.goto(pathToFileURL(path.resolve(svgPath)).href, { waitUntil: 'load' });
+    } else {
         // Load the HTML
-        await page.setContent(html, { waitUntil: 'networkidle0' });
+        await page.setContent(html, { waitUntil: 'load' });
+    }
 
-        // Wait a bit for fonts to load
-        await new Promise(resolve => setTimeout(resolve, 500));
+    // Wait until the @font-face fonts are actually loaded
+    await page.evaluate(() => document.fonts.ready.then(() => undefined));
 
-        // Take screenshot
+    // Take screenshots (changing the scale only re-rasterizes, no reload)
+    for (const [index, output] of outputs.entries()) {
+        if (index > 0) {
+            await setScale(output.scale);
+        }
         await page.screenshot({
-            path: pngPath,
+            path: output.png,
             type: 'png',
             clip: {
                 x: 0,
@@ -74,32 +190,232 @@ async function convertSvgToPng(svgPath, pngPath, scale = 2) {
                 height: height
             }
         });
+    }
+}
 
+// Returns { svg, png, ok, ms, render_ms, outputs[, error] }; ms includes the wait
+// for a free page, render_ms only the load and screenshots
+async function runJob(pool, job) {
+    const start = Date.now();
+    const result = { svg: job.svg, png: job.png, ok: false, ms: 0, render_ms: 0, outputs: [] };
+    try {
+        if (!job.svg || !job.png) {
+            throw new Error('Job needs "svg" and "png"');
+        }
+        if (!fs.existsSync(job.svg)) {
+            throw new Error(`SVG file not found: ${job.svg}`);
+        }
+        const outputs = jobOutputs(job);
+        await pool.run(async page => {
+            const renderStart = Date.now();
+            await renderSvg(page, job.svg, outputs);
+            result.render_ms = Date.now() - renderStart;
+        });
+        result.ok = true;
+        result.outputs = outputs.map(output => output.png);
+    } catch (error) {
+        result.error = error.message;
+    }
+    result.ms = Date.now() - start;
+    return result;
+}
+
+async function convertSvgToPng(svgPath, pngPath, scale = DEFAULT_SCALE) {
+    const browser = await launchBrowser();
+
+    try {
+        const pool = new PagePool(browser, 1);
+        await pool.run(page => renderSvg(page, svgPath, [{ png: pngPath, scale }]));
         console.log(`PNG generated successfully: ${pngPath}`);
 
     } catch (error) {
         console.error('Error converting SVG to PNG:', error);
+        process.exitCode = 1;
+    } finally {
+        await browser.close();
+    }
+}
+
+function exitOnBrowserLoss(browser) {
+    browser.on('disconnected', () => {
+        console.error('Browser disconnected, exiting');
         process.exit(1);
+    });
+}
+
+// POST /convert {"svg": ..., "png": ..., "scale": 2} -> {"ok": true, "ms": ...}
+async function serve(host, port, pages, timeout) {
+    const browser = await launchBrowser();
+    exitOnBrowserLoss(browser);
+    const pool = new PagePool(browser, pages, timeout);
+
+    const server = http.createServer((req, res) => {
+        const send = (status, body) => {
+            res.writeHead(status, { 'Content-Type': 'application/json' });
+            res.end(JSON.stringify(body));
+        };
+
+        if (req.method === 'GET' && req.url === '/health') {
+            res.writeHead(200, { 'Content-Type': 'text/plain' });
+            res.end('ok');
+            return;
+        }
+        if (req.method !== 'POST' || req.url !== '/convert') {
+            send(404, { ok: false, error: 'Not found' });
+            return;
+        }
+
+        let body = '';
+        req.on('data', chunk => { body += chunk; });
+        req.on('end', async () => {
+            let job;
+            try {
+                job = JSON.parse(body);
+            } catch (error) {
+                send(400, { ok: false, error: `Invalid JSON (${error.message})` });
+                return;
+            }
+            const result = await runJob(pool, job);
+            send(result.ok ? 200 : 500, result);
+        });
+    });
+
+    server.listen(port, host, () => {
+        console.error(`PNG server listening on http://${host}:${port} (${pages} pages)`);
+    });
+}
+
+// One JSON job per line on stdin, one JSON result per line on stdout (completion order)
+async function serveStdin(pages, timeout) {
+    const browser = await launchBrowser();
+    exitOnBrowserLoss(browser);
+    const pool = new PagePool(browser, pages, timeout);
+    const pending = [];
+
+    const lines = readline.createInterface({ input: process.stdin });
+    for await (const line of lines) {
+        if (!line.trim()) {
+            continue;
+        }
+        let job;
+        try {
+            job = JSON.parse(line);
+        } catch (error) {
+            console.log(JSON.stringify({ ok: false, error: `Invalid JSON (${error.message})` }));
+            continue;
+        }
+        pending.push(runJob(pool, job).then(result => console.log(JSON.stringify(result))));
+    }
+
+    await Promise.all(pending);
+    await browser.close();
+}
+
+// Render a list of jobs across the page pool; one JSON result line per job,
+// then a summary on stderr. Exit code 1 if any job failed.
+async function runBatch(jobs, pages, timeout) {
+    const start = Date.now();
+    const browser = await launchBrowser();
+    const pool = new PagePool(browser, pages, timeout);
+
+    let failed = 0;
+    try {
+        await Promise.all(jobs.map(job => runJob(pool, job).then(result => {
+            if (!result.ok) {
+                failed++;
+            }
+            console.log(JSON.stringify(result));
+        })));
     } finally {
         await browser.close();
     }
+
+    const elapsed = Date.now() - start;
+    console.error(`${jobs.length - failed}/${jobs.length} SVG converted in ${elapsed} ms (${pages} pages)`);
+    if (failed) {
+        process.exitCode = 1;
+    }
 }
 
-// Get command line arguments
-const args = process.argv.slice(2);
+function readManifest(manifestPath) {
+    const content = fs.readFileSync(manifestPath === '-' ? 0 : manifestPath, 'utf8');
+    return content.split('\n').filter(line => line.trim()).map((line, index) => {
+        try {
+            return JSON.parse(line);
+        } catch (error) {
+            throw new Error(`Manifest line ${index + 1}: ${error.message}`);
+        }
+    });
+}
 
-if (args.length < 2) {
-    console.error('Usage: node svg_to_png.js <svg_path> <png_path> [scale]');
-    process.exit(1);
+// One job per SVG of a folder, PNG next to it
+function directoryJobs(dir, scales) {
+    return fs.readdirSync(dir)
+        .filter(name => name.endsWith('.svg'))
+        .sort()
+        .map(name => {
+            const svg = path.join(dir, name);
+            return { svg, png: svg.replace(/\.svg$/, '.png'), scales };
+        });
 }
 
-const svgPath = args[0];
-const pngPath = args[1];
-const scale = args[2] ? parseInt(args[2]) : 2; // Default 2x for retina quality
+function optionString(args, name, fallback) {
+    const index = args.indexOf(name);
+    return index !== -1 && args[index + 1] ? args[index + 1] : fallback;
+}
 
-if (!fs.existsSync(svgPath)) {
-    console.error(`SVG file not found: ${svgPath}`);
-    process.exit(1);
+function optionValue(args, name, fallback) {
+    const index = args.indexOf(name);
+    return index !== -1 && args[index + 1] ? parseInt(args[index + 1]) : fallback;
 }
 
-convertSvgToPng(svgPath, pngPath, scale);
+// Get command line arguments
+const args = process.argv.slice(2);
+const pages = optionValue(args, '--pages', DEFAULT_PAGES);
+const timeout = optionValue(args, '--timeout', DEFAULT_TIMEOUT);
+
+if (args[0] === '--server') {
+    serve(DEFAULT_HOST, optionValue(args, '--port', DEFAULT_PORT), pages, timeout).catch(error => {
+        console.error('Error starting PNG server:', error);
+        process.exit(1);
+    });
+} else if (args[0] === '--stdin') {
+    serveStdin(pages, timeout).catch(error => {
+        console.error('Error in stdin mode:', error);
+        process.exit(1);
+    });
+} else if (args[0] === '--manifest' || args[0] === '--dir') {
+    let jobs;
+    try {
+        jobs = args[0] === '--manifest'
+            ? readManifest(optionString(args, '--manifest', '-'))
+            : directoryJobs(args[1], optionString(args, '--scales', '1,2').split(',').map(scale => parseInt(scale)));
+    } catch (error) {
+        console.error(`Error reading jobs: ${error.message}`);
+        process.exit(1);
+    }
+    runBatch(jobs, pages, timeout).catch(error => {
+        console.error('Error in batch mode:', error);
+        process.exit(1);
+    });
+} else {
+    if (args.length < 2) {
+        console.error('Usage: node svg_to_png.js <svg_path> <png_path> [scale]');
+        console.error('       node svg_to_png.js --server [--port 8766] [--pages 4]');
+        console.error('       node svg_to_png.js --stdin [--pages 4]');
+        console.error('       node svg_to_png.js --manifest <jobs.jsonl|-> [--pages 4] [--timeout 30000]');
+        console.error('       node svg_to_png.js --dir <dir> [--scales 1,2] [--pages 4] [--timeout 30000]');
+        process.exit(1);
+    }
+
+    const svgPath = args[0];
+    const pngPath = args[1];
+    const scale = args[2] ? parseInt(args[2]) : DEFAULT_SCALE;
+
+    if (!fs.existsSync(svgPath)) {
+        console.error(`SVG file not found: ${svgPath}`);
+        process.exit(1);
+    }
+
+    convertSvgToPng(svgPath, pngPath, scale);
+}
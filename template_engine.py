@@ -3,19 +3,86 @@ Template Engine for Gazzetta SVG Banner Generator
 Renders SVG banners based on JSON template configurations
 """
 
-import json
 import base64
 import os
-from typing import Dict, List, Any, Optional
+import re
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from asset_cache import get_asset_cache, AssetPublisher, base64_mime
+from background_variants import get_background_variant
+from font_subset import subset_font, SUBSET_FLAVOR
+from render_profiler import RenderProfiler
+from region_stats import RegionSummary, get_region_stats, overlay_opacity, prefers_light, relative_luminance
+from text_metrics import measure, fit_font_size
+from fragment_cache import FragmentCache
+from template_plan import ComponentPlan, TemplatePlan, compile_template, load_template_plan, parse_dimension, resolve_geometry
+from layout_tree import (
+    Box, ButtonNode, Clip, ComponentLayout, FittedImageNode, GroupNode, ImageNode, InlineImage, LayoutTree, ListNode,
+    Node, Paragraph, PriceNode, RectNode, TextFlowNode, TextNode, TextRun, approximate_size, get_serializer,
+)
+from svg_serializer import SvgSerializer
+from svg_compact import DEFAULT_PRECISION
 
 
 class TemplateEngine:
     """Generic SVG rendering engine driven by JSON templates"""
 
-    def __init__(self):
+    # Light/dark choices of "auto" styles: the light one goes on dark surfaces
+    AUTO_TEXT_COLORS = ("#FFFFFF", "#1A1A1A")
+    LOGO_VARIANTS = {
+        "G": ("images/G_bianco.png", "images/G_nero.png"),
+        "gazzetta": ("images/logo_gazzetta_bianco.png", "images/logo_gazzetta_nero.png"),
+    }
+    DEFAULT_OVERLAY_OPACITY = 0.4  # opacity "auto" when nothing is known about the background
+
+    def __init__(self, background_variants: bool = True, background_scale: int = 1,
+                 asset_mode: str = "inline", asset_dir: str = "assets", asset_url: Optional[str] = None,
+                 font_subsetting: bool = True, fragment_cache: bool = True,
+                 compact_svg: bool = False, svg_precision: int = DEFAULT_PRECISION):
+        """
+        Args:
+            background_variants: Embed backgrounds cropped/resized to each area
+                (needs Pillow and a background "path"), instead of the original file
+            background_scale: Pixel density of background variants (2 = retina)
+            asset_mode: "inline" embeds fonts and images as data URIs (default,
+                self-contained for ad servers); "reference" writes them once to
+                asset_dir and emits relative hrefs
+            asset_dir: Directory for referenced assets
+            asset_url: Href prefix for referenced assets, relative to the SVG
+                (defaults to the asset_dir folder name)
+            font_subsetting: Reduce embedded fonts to the glyphs each banner uses
+                (needs fontTools; unused faces are always left out)
+            fragment_cache: Memoise component layouts and SVG fragments across
+                renders (see fragment_cache), so re-rendering a compiled template
+                after an edit only recomputes the components whose content changed
+            compact_svg: Minify the SVG (no indentation, shared style classes,
+                merged clip paths, see svg_compact)
+            svg_precision: Decimal digits of numbers in compact SVG
+        """
         self.fonts = {}
+        self.font_files = {}
+        self.font_subsetting = font_subsetting
+        self.compact_svg = compact_svg
+        self.svg_precision = svg_precision
+        self.fragment_cache = FragmentCache() if fragment_cache else None
         self.content_data = {}
         self.background = {}
+        self.background_variants = background_variants
+        self.background_scale = background_scale
+        self.profiler = None  # RenderProfiler while profile() is active
+        self.set_asset_mode(asset_mode, asset_dir, asset_url)
+
+    def set_asset_mode(self, asset_mode: str = "inline", asset_dir: str = "assets", asset_url: Optional[str] = None):
+        """Choose between inline data URIs and referenced assets (see __init__)"""
+        if asset_mode not in ("inline", "reference"):
+            raise ValueError(f"Unknown asset_mode: {asset_mode}")
+
+        self.asset_mode = asset_mode
+        self.asset_publisher = None
+        if asset_mode == "reference":
+            url_prefix = asset_url if asset_url is not None else os.path.basename(os.path.normpath(asset_dir)) + "/"
+            self.asset_publisher = AssetPublisher(asset_dir, url_prefix)
 
     def load_fonts(self):
         """Load and encode fonts as base64"""
@@ -27,18 +94,19 @@ class TemplateEngine:
             "Roboto-BoldItalic": ["Roboto-BoldItalic.woff2", "Roboto-BoldItalic.ttf"]
         }
 
+        cache = get_asset_cache()
+
         for name, filenames in font_files.items():
             loaded = False
             for filename in filenames:
                 try:
                     path = os.path.join("font", filename)
-                    with open(path, "rb") as f:
-                        b64 = base64.b64encode(f.read()).decode("utf-8")
-                        # Determine format from extension
-                        font_format = "woff2" if filename.endswith(".woff2") else "truetype"
-                        self.fonts[name] = f"data:font/{font_format};base64,{b64}"
-                        loaded = True
-                        break
+                    # Determine format from extension
+                    font_format = "woff2" if filename.endswith(".woff2") else "truetype"
+                    self.fonts[name] = cache.data_uri(path, f"font/{font_format}")
+                    self.font_files[name] = path
+                    loaded = True
+                    break
                 except FileNotFoundError:
                     continue
 
@@ -46,57 +114,187 @@ class TemplateEngine:
                 # Suppress font warnings to avoid polluting SVG output when called from frontend
                 # print(f"⚠️ Font {name} not found (tried {', '.join(filenames)}), using system fallback", file=sys.stderr)
                 self.fonts[name] = None
+                self.font_files[name] = None
 
     def set_content_data(self, data: Dict[str, Any]):
         """Set content data (texts, images, background, etc.)"""
         self.content_data = data
 
     def set_background(self, bg_data: Dict[str, str]):
-        """Set background data"""
-        self.background = bg_data
+        """Set background data
 
-    def render_template(self, template: Dict[str, Any]) -> str:
-        """Render SVG from template configuration"""
-        width = template["width"]
-        height = template["height"]
+        Keys: "path" (source file, enables pre-resized variants), "image"
+        (data URI for the full-canvas background), "image_data" (raw base64
+        image for background_layer components), "color" (fallback fill)
+        """
+        self.background = bg_data
 
-        svg_parts = []
-        svg_parts.append(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">')
+    def layout(self, template: Dict[str, Any]) -> LayoutTree:
+        """Resolve a template against the current content data and background
 
-        # Add font definitions
-        svg_parts.append(self._generate_font_defs())
+        Returns a LayoutTree (positioned boxes, text runs, images, clips)
+        that any serialiser can write without laying the banner out again.
+        Components of compiled plans (load_template) are memoised in the
+        fragment cache by the content values they read.
+        """
+        reusable = self.fragment_cache is not None and isinstance(template, TemplatePlan)
+        plan = compile_template(template, self.LAYOUTS)
+        width = plan.width
+        height = plan.height
 
-        # Render background if present
+        background = None
         if self.background.get("image"):
-            svg_parts.append(self._render_background(width, height))
+            background = ImageNode(Box(0, 0, width, height), self.background["image"], variant_path=self.background.get("path"))
+
+        if self.profiler is not None:
+            return self._profiled_layout(plan, reusable, background)
+
+        components = []
+        for component in plan.components:
+            if reusable:
+                components.append(self.fragment_cache.get_or_compute(
+                    self._layout_key(component), lambda: self._component_layout(component, width, height), approximate_size))
+            else:
+                components.append(self._component_layout(component, width, height))
+
+        guides = self._layout_debug_guides(plan) if plan.debug_guides else ()
+
+        return LayoutTree(width, height, background, tuple(components), guides, plan.budget)
+
+    def _profiled_layout(self, plan: TemplatePlan, reusable: bool, background: Optional[ImageNode]) -> LayoutTree:
+        """layout() with each component timed by the active profiler"""
+        profiler = self.profiler
+        width, height = plan.width, plan.height
+        components = []
+        with profiler.span("layout", "layout", None):
+            for component in plan.components:
+                if reusable:
+                    compute = lambda: self.fragment_cache.get_or_compute(
+                        self._layout_key(component), lambda: self._component_layout(component, width, height),
+                        approximate_size)
+                else:
+                    compute = lambda: self._component_layout(component, width, height)
+                components.append(profiler.timed("layout", component.id, component.type, compute))
+            guides = self._layout_debug_guides(plan) if plan.debug_guides else ()
+        return LayoutTree(width, height, background, tuple(components), guides, plan.budget)
+
+    def _component_layout(self, component: ComponentPlan, width: int, height: int) -> ComponentLayout:
+        nodes = component.layout(self, component, width, height) if component.layout else ()
+        return ComponentLayout(component.id, component.type, tuple(nodes))
+
+    def _layout_key(self, component: ComponentPlan) -> tuple:
+        """Everything a component layout depends on: its plan, the content it reads, the background"""
+        content = tuple(self.content_data.get(key) for key in component.content_keys)
+        return ("layout", component, content, tuple(sorted(self.background.items())))
+
+    def _asset_key(self) -> tuple:
+        """Settings that change the hrefs written for the same layout"""
+        publisher = self.asset_publisher
+        return (self.asset_mode, publisher.asset_dir if publisher else None, publisher.url_prefix if publisher else None,
+                self.background_variants, self.background_scale)
+
+    @contextmanager
+    def profile(self, profiler: Optional[RenderProfiler] = None):
+        """Record per-component layout and serialisation time, bytes and assets while active
+
+        Usage:
+            with engine.profile() as profiler:
+                engine.render_template(template)
+            profiler.write_chrome_trace("trace.json")
+
+        Yields the RenderProfiler (a new one unless given, so several
+        renders can share one). Fragment cache hits show as near-zero times.
+        """
+        previous = self.profiler
+        self.profiler = profiler or RenderProfiler()
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
+
+    def render_template(self, template: Dict[str, Any]) -> str:
+        """Render SVG from a TemplatePlan (see load_template), a raw template dict or a LayoutTree"""
+        tree = template if isinstance(template, LayoutTree) else self.layout(template)
+        return SvgSerializer(self).serialize(tree)
 
-        # Render each component
-        for component in template.get("components", []):
-            svg_parts.append(self._render_component(component, width, height))
+    def render_to(self, template: Dict[str, Any], sink) -> LayoutTree:
+        """Stream the SVG of a template into a file-like sink (anything with write(str))
+
+        Images from disk are base64-encoded in chunks as they are written, so
+        memory stays flat whatever their size. Returns the LayoutTree.
+        """
+        tree = template if isinstance(template, LayoutTree) else self.layout(template)
+        SvgSerializer(self).write_to(tree, sink)
+        return tree
 
-        # Add debug guides if enabled
-        if template.get("debug_guides", False):
-            svg_parts.append(self._render_debug_guides(template))
+    def export(self, template: Dict[str, Any], outputs: Dict[str, str]) -> LayoutTree:
+        """Write one banner in several formats from a single layout
 
-        svg_parts.append('</svg>')
+        Args:
+            template: TemplatePlan, template dict or LayoutTree
+            outputs: Format name -> output path, e.g. {"svg": "a.svg", "png": "a.png"}
+                (formats are registered in layout_tree)
 
-        return '\n'.join(svg_parts)
+        Returns:
+            The LayoutTree used for every output
+        """
+        tree = template if isinstance(template, LayoutTree) else self.layout(template)
+        for format_name, path in outputs.items():
+            get_serializer(format_name)(self).write(tree, path)
+        return tree
+
+    @staticmethod
+    def _font_face_descriptor(name: str):
+        """CSS (family, weight, style) declared for a loaded font, e.g. Oswald-BoldItalic"""
+        font_family = name.replace("-", " ").replace("BoldItalic", "Bold").replace("Italic", "")
+        weight = "bold" if "Bold" in name else "normal"
+        style = "italic" if "Italic" in name else "normal"
+        return font_family, weight, style
+
+    def _font_face(self, font_family: str, italic: bool = False) -> Optional[str]:
+        """Loaded font face used for a CSS family/style, None if the family isn't declared"""
+        wanted_style = "italic" if italic else "normal"
+        fallback = None
+        for name, data_uri in self.fonts.items():
+            if not data_uri:
+                continue
+            family, _, style = self._font_face_descriptor(name)
+            if family != font_family:
+                continue
+            if style == wanted_style:
+                return name
+            if style == "normal":
+                fallback = name  # Browser synthesizes italic from the upright face
+        return fallback
+
+    def _collect_glyphs(self, tree: LayoutTree) -> Dict[str, set]:
+        """Loaded font face -> characters the tree sets in it (drives font embedding/subsetting)"""
+        used_glyphs = {}
+        for run in tree.text_runs():
+            if not run.text or not run.font_family:
+                continue
+            name = self._font_face(run.font_family, run.italic)
+            if name:
+                used_glyphs.setdefault(name, set()).update(run.text)
+        return used_glyphs
 
-    def _generate_font_defs(self) -> str:
-        """Generate font face definitions"""
+    def _generate_font_defs(self, used_glyphs: Dict[str, set], url: Optional[Callable[[str], str]] = None) -> str:
+        """Generate font face definitions (url, if given, maps each font src before it is written)"""
         defs = ['<defs>', '<style type="text/css">']
 
         for name, data_uri in self.fonts.items():
-            if data_uri:
-                font_family = name.replace("-", " ").replace("BoldItalic", "Bold").replace("Italic", "")
-                weight = "bold" if "Bold" in name else "normal"
-                style = "italic" if "Italic" in name else "normal"
+            # Only faces used by some component are embedded
+            if data_uri and name in used_glyphs:
+                src, font_format = self._font_src(name, data_uri, used_glyphs[name])
+                if url is not None:
+                    src = url(src)
+                font_family, weight, style = self._font_face_descriptor(name)
                 defs.append(f'''
                 @font-face {{
                     font-family: '{font_family}';
                     font-weight: {weight};
                     font-style: {style};
-                    src: url('{data_uri}') format('woff2');
+                    src: url('{src}') format('{font_format}');
                 }}''')
 
         defs.append('</style>')
@@ -104,90 +302,177 @@ class TemplateEngine:
 
         return '\n'.join(defs)
 
-    def _render_background(self, width: int, height: int) -> str:
-        """Render background image"""
-        if self.background.get("image"):
-            return f'<image href="{self.background["image"]}" x="0" y="0" width="{width}" height="{height}" preserveAspectRatio="xMidYMid slice"/>'
-        return ""
-
-    def _render_component(self, comp: Dict[str, Any], canvas_width: int, canvas_height: int) -> str:
-        """Render a single component based on its type"""
-        comp_type = comp.get("type")
-
-        if comp_type == "background_layer":
-            return self._render_background_layer(comp, canvas_width, canvas_height)
-        elif comp_type == "text_block":
-            return self._render_text_block(comp, canvas_width, canvas_height)
-        elif comp_type == "text_only":
-            return self._render_text_only(comp, canvas_width, canvas_height)
-        elif comp_type == "image":
-            return self._render_image(comp, canvas_width, canvas_height)
-        elif comp_type == "smartphone_mockup":
-            return self._render_smartphone(comp, canvas_width, canvas_height)
-        elif comp_type == "cta_button":
-            return self._render_cta_button(comp, canvas_width, canvas_height)
-        elif comp_type == "logo":
-            return self._render_logo(comp, canvas_width, canvas_height)
-        elif comp_type == "bullet_list":
-            return self._render_bullet_list(comp, canvas_width, canvas_height)
-        elif comp_type == "price_display":
-            return self._render_price_display(comp, canvas_width, canvas_height)
-        elif comp_type == "logo_text_group":
-            return self._render_logo_text_group(comp, canvas_width, canvas_height)
-
-        return ""
+    def _font_src(self, name: str, data_uri: str, glyphs: set):
+        """(url, format) for a font face: glyph subset when possible, full font otherwise"""
+        if self.font_subsetting:
+            codepoints = {ord(ch) for ch in glyphs}
+            subset = subset_font(self.font_files[name], codepoints)
+            if subset is not None:
+                if self.asset_publisher:
+                    return self.asset_publisher.publish_bytes(subset, f".{SUBSET_FLAVOR}"), SUBSET_FLAVOR
+                b64 = base64.b64encode(subset).decode("utf-8")
+                return f"data:font/{SUBSET_FLAVOR};base64,{b64}", SUBSET_FLAVOR
+
+        if self.asset_publisher:
+            return self.asset_publisher.publish_file(self.font_files[name]), "woff2"
+        return data_uri, "woff2"
+
+    def _background_variant_path(self, width: float, height: float, path: Optional[str] = None) -> Optional[str]:
+        """File of the background (or path) pre-cropped to a width x height area, if available"""
+        path = path or self.background.get("path")
+        if not (path and self.background_variants):
+            return None
+        return get_background_variant(path, width, height, self.background_scale)
+
+    def _background_layer_source(self) -> Optional[str]:
+        """Image source for background_layer areas: image_data, then the background file"""
+        if self.background.get("image_data"):
+            data = self.background["image_data"]
+            return f'data:{base64_mime(data)};base64,{data}'
+
+        path = self.background.get("path")
+        if path and os.path.exists(path):
+            return path
+        return None
+
+    def _file_href(self, path: str) -> str:
+        """Href for a file on disk: data URI inline, or published asset in reference mode"""
+        if self.asset_publisher:
+            return self.asset_publisher.publish_file(path)
+        return get_asset_cache().data_uri(path)
+
+    def _data_href(self, data_uri: str) -> str:
+        """Href for an image given as data URI (content data, backgrounds)"""
+        if self.asset_publisher:
+            return self.asset_publisher.publish_data_uri(data_uri)
+        return data_uri
+
+    def _style(self, comp: Dict, box: Box, canvas_width: int, canvas_height: int,
+               fill: Optional[str] = None) -> Dict[str, Any]:
+        """Component style with "auto" values resolved against what lies under box
+
+        "*_color": "auto" picks the light or dark AUTO_TEXT_COLORS, whichever
+        reads better on the component's own background (fill is its default)
+        composited over the banner background; "logo_variant": "auto" picks
+        the white or black file of logo_family the same way; "opacity":
+        "auto" (background_layer) is the lowest overlay opacity that keeps
+        overlay_text_color readable over the busiest part of the area.
+        Background statistics come from summed-area tables (region_stats),
+        so no image is decoded here.
+        """
+        style = comp.get("style", {})
+        auto = [key for key, value in style.items() if value == "auto"]
+        if not auto:
+            return style
+
+        backdrop = self._backdrop(box, canvas_width, canvas_height)
+        resolved = dict(style)
+        if style.get("opacity") == "auto":
+            resolved["opacity"] = self._auto_opacity(resolved, backdrop)
+
+        surface = self._surface(resolved.get("background", fill), resolved.get("opacity", 1), backdrop)
+        light = surface is None or prefers_light(surface, self._rgb(self.AUTO_TEXT_COLORS[0]),
+                                                 self._rgb(self.AUTO_TEXT_COLORS[1]))
+        for key in auto:
+            if key.endswith("_color"):
+                resolved[key] = self.AUTO_TEXT_COLORS[0 if light else 1]
+        if style.get("logo_variant") == "auto":
+            resolved["logo_variant"] = "light" if light else "dark"
+        return resolved
+
+    def _backdrop(self, box: Box, canvas_width: int, canvas_height: int) -> Optional[RegionSummary]:
+        """Mean color and contrast of the banner background under box (None if unknown)"""
+        stats = get_region_stats(self.background.get("path"))
+        if stats is not None:
+            return stats.region(box, canvas_width, canvas_height)
+        rgb = self._rgb(self.background.get("color"))
+        return RegionSummary(rgb, relative_luminance(rgb)) if rgb else None
+
+    def _surface(self, fill: Optional[str], opacity: Any, backdrop: Optional[RegionSummary]) -> Optional[RegionSummary]:
+        """What a component's content sits on: its fill at opacity over the backdrop"""
+        try:
+            rgba = parse_color(fill, float(opacity)) if fill else None
+        except (ValueError, TypeError, AttributeError):  # Unparsable color, or no Pillow for names
+            rgba = None
+        if not rgba or not rgba[3]:
+            return backdrop
+
+        alpha = rgba[3] / 255
+        luminance = relative_luminance(rgba)
+        if backdrop is None or alpha == 1:
+            return RegionSummary(rgba[:3], luminance)
+        color = tuple(round(alpha * f + (1 - alpha) * b) for f, b in zip(rgba, backdrop.color))
+        return RegionSummary(color, alpha * luminance + (1 - alpha) * backdrop.luminance,
+                             (1 - alpha) * backdrop.contrast)
+
+    def _auto_opacity(self, style: Dict[str, Any], backdrop: Optional[RegionSummary]) -> float:
+        fill = self._rgb(style.get("background", self.background.get("color", "#223047")))
+        text = self._rgb(style.get("overlay_text_color", self.AUTO_TEXT_COLORS[0]))
+        if backdrop is None or fill is None or text is None:
+            return self.DEFAULT_OVERLAY_OPACITY
+        return overlay_opacity(backdrop, fill, text)
+
+    @staticmethod
+    def _rgb(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+        try:
+            return parse_color(value)[:3] if value else None
+        except (ValueError, AttributeError):
+            return None
+
+    def _logo_variant_source(self, style: Dict[str, Any]) -> Optional[str]:
+        """File of the "light"/"dark" logo_variant of logo_family (default G), None if unset"""
+        variant = style.get("logo_variant")
+        files = self.LOGO_VARIANTS.get(style.get("logo_family", "G"))
+        if variant not in ("light", "dark") or not files:
+            return None
+        return files[0 if variant == "light" else 1]
+
+    def _layout_component(self, comp: Dict[str, Any], canvas_width: int, canvas_height: int) -> Tuple[Node, ...]:
+        """Lay out a single component based on its type"""
+        layout = self.LAYOUTS.get(comp.get("type"))
+        if layout is None:
+            return ()
+        return tuple(layout(self, comp, canvas_width, canvas_height))
 
     def _parse_dimension(self, value: Any, reference: int) -> float:
         """Parse dimension value (%, px, or number)"""
-        if isinstance(value, str):
-            if value.endswith("%"):
-                return float(value.rstrip("%")) / 100 * reference
-            elif value.endswith("px"):
-                return float(value.rstrip("px"))
-        return float(value)
+        return parse_dimension(value, reference)
 
     def _get_geometry(self, comp: Dict, canvas_width: int, canvas_height: int) -> Dict[str, float]:
-        """Calculate actual geometry from component definition"""
-        geom = comp.get("geometry", {})
-
-        return {
-            "x": self._parse_dimension(geom.get("x", 0), canvas_width),
-            "y": self._parse_dimension(geom.get("y", 0), canvas_height),
-            "width": self._parse_dimension(geom.get("width", canvas_width), canvas_width),
-            "height": self._parse_dimension(geom.get("height", canvas_height), canvas_height)
-        }
+        """Calculate actual geometry from component definition (precomputed in compiled plans)"""
+        if isinstance(comp, ComponentPlan):
+            return comp.geometry
+        return resolve_geometry(comp.get("geometry", {}), canvas_width, canvas_height)
+
+    def _get_box(self, comp: Dict, canvas_width: int, canvas_height: int) -> Box:
+        geom = self._get_geometry(comp, canvas_width, canvas_height)
+        return Box(geom["x"], geom["y"], geom["width"], geom["height"])
 
     def _get_content(self, source: str) -> str:
         """Get content from content_data by source key"""
         return self.content_data.get(source, "")
 
-    def _render_background_layer(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render a colored background layer or background image"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
-
-        parts = []
+    def _layout_background_layer(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Colored background layer or background image"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         # Check if this component should use the background image
-        use_bg_image = style.get("use_background_image", False)
-
-        if use_bg_image and self.background.get("image_data"):
-            # Render background image clipped to this area
-            clip_id = f"clip-{comp.get('id', 'bg')}"
-            parts.append(f'<defs><clipPath id="{clip_id}"><rect x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}"/></clipPath></defs>')
-            parts.append(f'<image href="data:image/png;base64,{self.background["image_data"]}" x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" preserveAspectRatio="xMidYMid slice" clip-path="url(#{clip_id})"/>')
-        else:
-            # Render solid color
-            fill = style.get("background", self.background.get("color", "#223047"))
-            opacity = style.get("opacity", 1)
-            parts.append(f'<rect x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" fill="{fill}" opacity="{opacity}"/>')
-
-        return '\n'.join(parts)
-
-    def _render_text_block(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render text block with header and main text using HTML/CSS with auto-fit"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+        if style.get("use_background_image", False):
+            source = self._background_layer_source()
+            if source:
+                # Background image clipped to this area
+                clip = Clip(f"clip-{comp.get('id', 'bg')}", box)
+                return [ImageNode(box, source, "slice", clip, variant_path=self.background.get("path"))]
+
+        # Solid color
+        fill = style.get("background", self.background.get("color", "#223047"))
+        return [RectNode(box, fill, opacity=style.get("opacity", 1))]
+
+    def _layout_text_block(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Text block with header and main text, scaled down to fit"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         # Get header and main content
         header_source = comp.get("header_source", "")
@@ -197,12 +482,11 @@ class TemplateEngine:
         main_text = self._get_content(content_source)
 
         if not header_text and not main_text:
-            return ""
+            return []
 
         # Text styling
         text_color = style.get("text_color", "#FFFFFF")
         alignment = style.get("alignment", "center")
-        bg_color = style.get("background", None)
 
         header_font_family = style.get("header_font_family", "Roboto Bold")
         header_font_size = style.get("header_font_size", 24)
@@ -219,182 +503,105 @@ class TemplateEngine:
         if header_text and main_text:
             estimated_height += 10  # margin between
 
-        scale_factor = min(1.0, (geom["height"] * 0.95) / estimated_height) if estimated_height > geom["height"] else 1.0
-
-        # Convert alignment to CSS
-        text_align_css = alignment if alignment in ['left', 'right', 'center'] else 'center'
-
-        # Use foreignObject with HTML/CSS
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Outer container for centering
-        align_items_css = {'left': 'flex-start', 'right': 'flex-end', 'center': 'center'}.get(alignment, 'center')
-        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append('width: 100%; height: 100%;')
-        parts.append('display: flex; align-items: center;')
-        parts.append(f'justify-content: {align_items_css};')
-        if bg_color:
-            parts.append(f'background: {bg_color};')
-        parts.append('">')
-
-        # Inner container with scale and column layout
-        parts.append('<div style="')
-        parts.append('display: flex; flex-direction: column;')
-        parts.append(f'align-items: {align_items_css};')
-        parts.append(f'transform: scale({scale_factor});')
-        parts.append('transform-origin: center;')
-        parts.append('">')
-
-        # Header
+        scale_factor = min(1.0, (box.height * 0.95) / estimated_height) if estimated_height > box.height else 1.0
+
+        paragraphs = []
         if header_text:
-            parts.append(f'<div style="')
-            parts.append(f'color: {text_color};')
-            parts.append(f'font-family: \'{header_font_family}\';')
-            parts.append(f'font-size: {header_font_size}px;')
-            parts.append(f'text-align: {text_align_css};')
-            parts.append('word-wrap: break-word;')
-            parts.append(f'max-width: {geom["width"]}px;')
-            parts.append('line-height: 1.2;')
-            parts.append('">' + header_text + '</div>')
-
-        # Main text
+            paragraphs.append(Paragraph(TextRun(header_text, header_font_family, header_font_size, text_color)))
         if main_text:
-            parts.append(f'<div style="')
-            parts.append(f'color: {text_color};')
-            parts.append(f'font-family: \'{main_font_family}\';')
-            parts.append(f'font-size: {main_font_size}px;')
-            parts.append(f'text-align: {text_align_css};')
-            parts.append('word-wrap: break-word;')
-            parts.append(f'max-width: {geom["width"]}px;')
-            parts.append('line-height: 1.2;')
-            if header_text:
-                parts.append('margin-top: 10px;')
-            parts.append('">' + main_text + '</div>')
-
-        parts.append('</div>')  # Close inner
-        parts.append('</div>')  # Close outer
-        parts.append('</foreignObject>')
-
-        return '\n'.join(parts)
-
-    def _render_text_only(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render text with automatic word-wrap in fixed container"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+            margin_top = 10 if header_text else 0
+            paragraphs.append(Paragraph(TextRun(main_text, main_font_family, main_font_size, text_color), margin_top))
+
+        return [TextFlowNode(box, tuple(paragraphs), self._text_align(alignment), scale_factor,
+                             background=style.get("background", None))]
+
+    def _layout_text_only(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Text with automatic word-wrap in fixed container"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
         content_source = comp.get("content_source", "")
 
         text_content = self._get_content(content_source)
         if not text_content:
-            return ""
+            return []
 
-        text_color = style.get("text_color", "#FFFFFF")
-        font_family = style.get("font_family", "Roboto")
-        font_size = style.get("font_size", 24)
-        alignment = style.get("alignment", "center")
+        run = TextRun(text_content, style.get("font_family", "Roboto"), style.get("font_size", 24),
+                      style.get("text_color", "#FFFFFF"))
+        return [TextFlowNode(box, (Paragraph(run),), self._text_align(style.get("alignment", "center")), overflow="clip")]
 
-        # Convert alignment to CSS
-        text_align_css = alignment if alignment in ['left', 'right', 'center'] else 'center'
-
-        # Use foreignObject with fixed dimensions
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Single container with all styling - fixed size, overflow hidden
-        parts.append(f'<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append(f'width: {geom["width"]}px;')
-        parts.append(f'height: {geom["height"]}px;')
-        parts.append('box-sizing: border-box;')
-        parts.append('display: flex;')
-        parts.append('align-items: center;')
-        parts.append(f'justify-content: {text_align_css};')
-        parts.append('overflow: hidden;')
-        parts.append(f'color: {text_color};')
-        parts.append(f'font-family: \'{font_family}\';')
-        parts.append(f'font-size: {font_size}px;')
-        parts.append(f'text-align: {text_align_css};')
-        parts.append('word-wrap: break-word;')
-        parts.append('line-height: 1.2;')
-        parts.append(f'">{text_content}</div>')
-
-        parts.append('</foreignObject>')
-
-        return '\n'.join(parts)
-
-    def _render_image(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render user image"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+    @staticmethod
+    def _text_align(alignment: str) -> str:
+        """CSS text alignment for a template alignment"""
+        return alignment if alignment in ['left', 'right', 'center'] else 'center'
+
+    def _layout_image(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """User image"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
         content_source = comp.get("content_source", "")
 
         image_data = self._get_content(content_source)
         if not image_data:
-            return ""
+            return []
 
         # Check if preserve_aspect is enabled (default to meet for logos)
         if style.get("preserve_aspect", False):
-            preserve_aspect = "xMidYMid meet"
+            fit = "meet"
         else:
-            fit = style.get("fit", "cover")
-            preserve_aspect = "xMidYMid slice" if fit == "cover" else "xMidYMid meet"
+            fit = "slice" if style.get("fit", "cover") == "cover" else "meet"
 
-        return f'<image href="{image_data}" x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" preserveAspectRatio="{preserve_aspect}"/>'
+        return [ImageNode(box, image_data, fit)]
 
-    def _render_smartphone(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render smartphone mockup with image inside"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
+    def _layout_smartphone(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Smartphone mockup with image inside"""
+        box = self._get_box(comp, canvas_width, canvas_height)
         content_source = comp.get("content_source", "")
-        style = comp.get("style", {})
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         image_data = self._get_content(content_source)
 
-        parts = []
+        nodes = []
 
         # Smartphone frame (rounded rect with border)
         phone_color = style.get("frame_color", "#1a1a1a")
         border_radius = style.get("border_radius", 30)
 
-        parts.append(f'<rect x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" rx="{border_radius}" ry="{border_radius}" fill="{phone_color}"/>')
+        nodes.append(RectNode(box, phone_color, border_radius))
 
         # Screen area (slightly inset)
         screen_inset = 8
-        screen_x = geom["x"] + screen_inset
-        screen_y = geom["y"] + screen_inset
-        screen_w = geom["width"] - screen_inset * 2
-        screen_h = geom["height"] - screen_inset * 2
+        screen = Box(box.x + screen_inset, box.y + screen_inset, box.width - screen_inset * 2, box.height - screen_inset * 2)
         screen_radius = border_radius - 5
 
         if image_data:
-            parts.append(f'<clipPath id="screen-clip-{comp.get("id", "default")}"><rect x="{screen_x}" y="{screen_y}" width="{screen_w}" height="{screen_h}" rx="{screen_radius}" ry="{screen_radius}"/></clipPath>')
-            parts.append(f'<image href="{image_data}" x="{screen_x}" y="{screen_y}" width="{screen_w}" height="{screen_h}" preserveAspectRatio="xMidYMid slice" clip-path="url(#screen-clip-{comp.get("id", "default")})"/>')
+            clip = Clip(f'screen-clip-{comp.get("id", "default")}', screen, screen_radius)
+            nodes.append(ImageNode(screen, image_data, "slice", clip))
         else:
-            parts.append(f'<rect x="{screen_x}" y="{screen_y}" width="{screen_w}" height="{screen_h}" rx="{screen_radius}" ry="{screen_radius}" fill="#000000"/>')
+            nodes.append(RectNode(screen, "#000000", screen_radius))
 
         # Optional label badge
         if style.get("show_label"):
             label_text = style.get("label_text", "SPECIALE US OPEN")
-            badge_y = geom["y"] + geom["height"] - 60
-            parts.append(f'<rect x="{geom["x"]}" y="{badge_y}" width="{geom["width"]}" height="25" fill="#E4087C"/>')
-            parts.append(f'<text x="{geom["x"] + geom["width"]/2}" y="{badge_y + 17}" font-family="Roboto Bold" font-size="10" fill="#FFFFFF" text-anchor="middle">{label_text}</text>')
+            badge_y = box.y + box.height - 60
+            nodes.append(RectNode(Box(box.x, badge_y, box.width, 25), "#E4087C"))
+            nodes.append(TextNode(box.x + box.width/2, badge_y + 17, TextRun(label_text, "Roboto Bold", 10, "#FFFFFF"), "middle"))
 
         # G+ logo badge
         if style.get("show_gplus_badge"):
-            badge_y = geom["y"] + geom["height"] - 30
-            parts.append(f'<rect x="{geom["x"]}" y="{badge_y}" width="{geom["width"]}" height="30" fill="#E4087C"/>')
-            parts.append(f'<text x="{geom["x"] + 15}" y="{badge_y + 20}" font-family="Roboto Bold" font-size="18" fill="#FFFFFF">G+</text>')
-            parts.append(f'<text x="{geom["x"] + 35}" y="{badge_y + 13}" font-family="Roboto Bold" font-size="7" fill="#FFFFFF">CONTENUTI</text>')
-            parts.append(f'<text x="{geom["x"] + 35}" y="{badge_y + 22}" font-family="Roboto Bold" font-size="7" fill="#FFFFFF">PREMIUM</text>')
+            badge_y = box.y + box.height - 30
+            nodes.append(RectNode(Box(box.x, badge_y, box.width, 30), "#E4087C"))
+            nodes.append(TextNode(box.x + 15, badge_y + 20, TextRun("G+", "Roboto Bold", 18, "#FFFFFF")))
+            nodes.append(TextNode(box.x + 35, badge_y + 13, TextRun("CONTENUTI", "Roboto Bold", 7, "#FFFFFF")))
+            nodes.append(TextNode(box.x + 35, badge_y + 22, TextRun("PREMIUM", "Roboto Bold", 7, "#FFFFFF")))
 
-        return '\n'.join(parts)
+        return nodes
 
     def _calculate_optimal_font_size(self, text: str, available_width: float, available_height: float,
                                        font_family: str, min_size: int = 10, max_size: int = 60,
                                        padding_ratio: float = 0.85) -> int:
         """Calculate optimal font size to fit text in available space
 
-        Uses approximate character width calculation:
-        - Roboto Bold: ~0.6 * font_size per character
-        - Oswald Bold: ~0.55 * font_size per character (condensed)
+        Text width comes from the glyph metrics of the font (see text_metrics).
 
         Args:
             padding_ratio: How much of available width to use (0.85 = 15% padding, 0.75 = 25% padding)
@@ -402,15 +609,8 @@ class TemplateEngine:
         if not text:
             return max_size
 
-        # Character width ratio based on font
-        if "Oswald" in font_family:
-            char_width_ratio = 0.55
-        else:  # Roboto or other fonts
-            char_width_ratio = 0.6
-
         # Calculate font size based on width constraint
-        # Formula: text_width ≈ len(text) * font_size * char_width_ratio
-        font_size_for_width = int((available_width * padding_ratio) / (len(text) * char_width_ratio))
+        font_size_for_width = int(fit_font_size(text, font_family, available_width * padding_ratio, max_size))
 
         # Also consider height constraint (text should be ~80% of height)
         font_size_for_height = int(available_height * 0.8)
@@ -419,10 +619,10 @@ class TemplateEngine:
         optimal_size = min(font_size_for_width, font_size_for_height)
         return max(min_size, min(optimal_size, max_size))
 
-    def _render_cta_button(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render CTA button with auto-fit using HTML/CSS"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+    def _layout_cta_button(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """CTA button with the label scaled to fit"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height, "#FFD700")
         content_source = comp.get("content_source", "")
 
         text_content = self._get_content(content_source)
@@ -436,104 +636,62 @@ class TemplateEngine:
         font_size = style.get("font_size", 20)
 
         # Calculate scale factor for auto-fit
-        char_width_ratio = 0.6
-        estimated_width = len(text_content) * font_size * char_width_ratio
-        available_width = geom["width"] * 0.8  # 20% padding
+        estimated_width = measure(text_content, font_family, font_size)
+        available_width = box.width * 0.8  # 20% padding
         scale_factor = min(1.0, available_width / estimated_width) if estimated_width > 0 else 1.0
 
-        font_style_css = 'italic' if font_style == 'italic' else 'normal'
-
-        # Use foreignObject with HTML/CSS
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Button div with border-radius and flexbox centering
-        parts.append(f'<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append('width: 100%; height: 100%;')
-        parts.append(f'background: {bg_color};')
-        parts.append(f'border-radius: {border_radius}px;')
-        parts.append('display: flex; align-items: center; justify-content: center;')
-        parts.append('">')
-
-        # Text with scale
-        parts.append(f'<span style="')
-        parts.append(f'color: {text_color};')
-        parts.append(f'font-family: \'{font_family}\';')
-        parts.append(f'font-style: {font_style_css};')
-        parts.append(f'font-size: {font_size}px;')
-        parts.append(f'transform: scale({scale_factor});')
-        parts.append('white-space: nowrap;')
-        parts.append('">' + text_content + '</span>')
-
-        parts.append('</div>')
-        parts.append('</foreignObject>')
-
-        return '\n'.join(parts)
-
-    def _render_logo(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render logo (user uploaded or default G+) with optional color overlay"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
-        content_source = comp.get("content_source", "")
+        label = TextRun(text_content, font_family, font_size, text_color, italic=font_style == 'italic')
+        return [ButtonNode(box, label, bg_color, border_radius, scale_factor)]
 
-        parts = []
+    def _layout_logo(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Logo (user uploaded, logo_variant file or default G+) with optional color overlay"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        content_source = comp.get("content_source", "")
 
         # Check if user provided a logo image
         logo_image = self._get_content(content_source) if content_source else None
-        logo_color = style.get("logo_color", None)
 
         if logo_image:
-            # User uploaded logo - use foreignObject for CSS filter support
+            # User uploaded logo, recolored when logo_color is set
+            style = self._style(comp, box, canvas_width, canvas_height, "#FFFFFF")
             bg_color = style.get("background", "#FFFFFF")
             padding = style.get("padding", 10)
+            return [RectNode(box, bg_color), FittedImageNode(box, logo_image, padding, style.get("logo_color"))]
 
-            parts.append(f'<rect x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" fill="{bg_color}"/>')
-            parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
+        style = self._style(comp, box, canvas_width, canvas_height)
+        variant_source = self._logo_variant_source(style)
+        if variant_source:
+            # White or black brand logo straight on the background (or on background if set)
+            nodes = [RectNode(box, style["background"])] if style.get("background") else []
+            return nodes + [FittedImageNode(box, variant_source, style.get("padding", 10), style.get("logo_color"))]
 
-            parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
-            parts.append('width: 100%; height: 100%;')
-            parts.append('display: flex; justify-content: center; align-items: center;')
-            parts.append(f'padding: {padding}px;')
-            parts.append('box-sizing: border-box;')
-            parts.append('">')
+        # Default G+ logo (fallback)
+        style = self._style(comp, box, canvas_width, canvas_height, "#E4087C")
+        nodes = [RectNode(box, style.get("background", "#E4087C"))]
 
-            # Apply CSS filter for color overlay if logo_color is specified
-            logo_filter = ''
-            if logo_color:
-                logo_filter = 'filter: brightness(0) saturate(100%) invert(48%) sepia(79%) saturate(2476%) hue-rotate(316deg) brightness(98%) contrast(119%);'
-
-            parts.append(f'<img src="{logo_image}" style="max-width: 100%; max-height: 100%; {logo_filter}" />')
-            parts.append('</div>')
-            parts.append('</foreignObject>')
-        else:
-            # Default G+ logo (fallback)
-            bg_color = style.get("background", "#E4087C")
-            parts.append(f'<rect x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}" fill="{bg_color}"/>')
-
-            # G+ text
-            font_size = style.get("font_size", 24)
-            text_x = geom["x"] + geom["width"] / 2
-            text_y = geom["y"] + geom["height"] / 2 + font_size / 3
-
-            parts.append(f'<text x="{text_x}" y="{text_y}" font-family="Roboto Bold" font-size="{font_size}" fill="#FFFFFF" text-anchor="middle">G+</text>')
+        # G+ text
+        font_size = style.get("font_size", 24)
+        text_x = box.x + box.width / 2
+        text_y = box.y + box.height / 2 + font_size / 3
+        nodes.append(TextNode(text_x, text_y, TextRun("G+", "Roboto Bold", font_size, "#FFFFFF"), "middle"))
 
-            # Optional subtitle
-            if style.get("show_subtitle"):
-                subtitle_size = font_size * 0.3
-                parts.append(f'<text x="{text_x}" y="{text_y + subtitle_size + 2}" font-family="Roboto Bold" font-size="{subtitle_size}" fill="#FFFFFF" text-anchor="middle">CONTENUTI</text>')
-                parts.append(f'<text x="{text_x}" y="{text_y + subtitle_size * 2 + 4}" font-family="Roboto Bold" font-size="{subtitle_size}" fill="#FFFFFF" text-anchor="middle">PREMIUM</text>')
+        # Optional subtitle
+        if style.get("show_subtitle"):
+            subtitle_size = font_size * 0.3
+            nodes.append(TextNode(text_x, text_y + subtitle_size + 2, TextRun("CONTENUTI", "Roboto Bold", subtitle_size, "#FFFFFF"), "middle"))
+            nodes.append(TextNode(text_x, text_y + subtitle_size * 2 + 4, TextRun("PREMIUM", "Roboto Bold", subtitle_size, "#FFFFFF"), "middle"))
 
-        return '\n'.join(parts)
+        return nodes
 
-    def _render_price_display(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render price with auto-fit using HTML/CSS flexbox
+    def _layout_price_display(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Price with auto-fit
 
         Layout:
         [14]  [,99€]
               [/ANNO]
         """
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         # Get price and period from content sources
         price_source = comp.get("price_source", "")
@@ -543,15 +701,14 @@ class TemplateEngine:
         period_text = self._get_content(period_source) if period_source else ""
 
         if not price_text:
-            return ""
+            return []
 
         text_color = style.get("text_color", "#FFFFFF")
         font_family = style.get("font_family", "Oswald Bold")
-        font_style = style.get("font_style", "normal")
+        italic = style.get("font_style", "normal") == "italic"
         alignment = style.get("alignment", "center")
 
         # Split price into integer and decimal parts
-        import re
         match = re.match(r'^(\d+)([.,]\d+)?(.*)$', price_text.strip())
 
         if match:
@@ -562,118 +719,69 @@ class TemplateEngine:
             decimal_part = ""
 
         # Font sizes
-        large_size = int(geom["height"] * 0.75)
-        small_size = int(geom["height"] * 0.35)
-        period_size = int(geom["height"] * 0.25)
+        large_size = int(box.height * 0.75)
+        small_size = int(box.height * 0.35)
+        period_size = int(box.height * 0.25)
 
         # Calculate scale factor for auto-fit
-        char_width_ratio = 0.55 if "Oswald" in font_family else 0.6
-        estimated_width = len(integer_part) * large_size * char_width_ratio + len(decimal_part) * small_size * char_width_ratio
-        available_width = geom["width"] * 0.95
+        estimated_width = measure(integer_part, font_family, large_size) + measure(decimal_part, font_family, small_size)
+        available_width = box.width * 0.95
         scale_factor = min(1.0, available_width / estimated_width) if estimated_width > 0 else 1.0
 
-        # Convert alignment to CSS
-        justify_content = {'left': 'flex-start', 'right': 'flex-end', 'center': 'center'}.get(alignment, 'center')
-        font_style_css = 'italic' if font_style == 'italic' else 'normal'
-
-        # Use foreignObject with HTML/CSS
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Outer container for centering
-        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append('width: 100%; height: 100%; display: flex;')
-        parts.append('align-items: center;')
-        parts.append(f'justify-content: {justify_content};')
-        parts.append('">')
-
-        # Inner container with scale
-        # Gap proportional to font size (16% of large size)
+        # Gap proportional to font size (16% of large size); offset aligns
+        # the decimal top with the integer top (approximately 10% of large size)
         gap = int(large_size * 0.16)
-        parts.append('<div style="')
-        parts.append(f'display: flex; gap: {gap}px;')
-        parts.append(f'transform: scale({scale_factor}); transform-origin: center;')
-        parts.append('">')
-
-        # Integer part (left side, large)
-        parts.append(f'<div style="color: {text_color}; font-family: \'{font_family}\'; font-style: {font_style_css}; font-size: {large_size}px; line-height: 1;">{integer_part}</div>')
-
-        # Decimal + period column (right side)
-        if decimal_part or period_text:
-            # Calculate offset to align decimal top with integer top (approximately 10% of large size)
-            offset = int(large_size * 0.10)
-            parts.append(f'<div style="display: flex; flex-direction: column; align-items: flex-start; margin-top: {offset}px;">')
-            if decimal_part:
-                parts.append(f'<div style="color: {text_color}; font-family: \'{font_family}\'; font-style: {font_style_css}; font-size: {small_size}px; line-height: 1;">{decimal_part}</div>')
-            if period_text:
-                parts.append(f'<div style="color: {text_color}; font-family: \'{font_family}\'; font-style: {font_style_css}; font-size: {period_size}px; line-height: 1; margin-top: 2px;">{period_text}</div>')
-            parts.append('</div>')
-
-        parts.append('</div>')  # Close inner container
-        parts.append('</div>')  # Close outer container
-        parts.append('</foreignObject>')
-
-        return '\n'.join(parts)
-
-    def _render_bullet_list(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render bullet point list with HTML/CSS for word-wrap"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+        offset = int(large_size * 0.10)
+
+        return [PriceNode(
+            box,
+            integer=TextRun(integer_part, font_family, large_size, text_color, italic),
+            decimal=TextRun(decimal_part, font_family, small_size, text_color, italic) if decimal_part else None,
+            period=TextRun(period_text, font_family, period_size, text_color, italic) if period_text else None,
+            gap=gap,
+            offset=offset,
+            align=alignment,
+            scale=scale_factor,
+        )]
+
+    def _layout_bullet_list(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Bullet point list, items wrapped"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         items = comp.get("items", [])
 
         if not items:
-            return ""
+            return []
 
         text_color = style.get("text_color", "#FFFFFF")
         font_size = style.get("font_size", 16)
         font_family = style.get("font_family", "Roboto")
 
-        # Use foreignObject with HTML/CSS
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Container div
-        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append('width: 100%; height: 100%;')
-        parts.append('display: flex; flex-direction: column;')
-        parts.append('justify-content: center;')
-        parts.append(f'color: {text_color};')
-        parts.append(f'font-family: \'{font_family}\';')
-        parts.append(f'font-size: {font_size}px;')
-        parts.append('gap: 8px;')
-        parts.append('">')
-
-        # Render each item
+        runs = []
         for item_source in items:
             item_text = self._get_content(item_source)
-            if not item_text:
-                continue
-
-            parts.append('<div style="display: flex; gap: 8px; align-items: flex-start;">')
-            parts.append('<span style="flex-shrink: 0;">✓</span>')
-            parts.append(f'<span style="word-wrap: break-word; overflow-wrap: break-word;">{item_text}</span>')
-            parts.append('</div>')
+            if item_text:
+                runs.append(TextRun(item_text, font_family, font_size, text_color))
 
-        parts.append('</div>')
-        parts.append('</foreignObject>')
+        if not runs:
+            return []
+        return [ListNode(box, tuple(runs))]
 
-        return '\n'.join(parts)
-
-    def _render_logo_text_group(self, comp: Dict, canvas_width: int, canvas_height: int) -> str:
-        """Render logo + text centered horizontally as a group using HTML foreignObject"""
-        geom = self._get_geometry(comp, canvas_width, canvas_height)
-        style = comp.get("style", {})
+    def _layout_logo_text_group(self, comp: Dict, canvas_width: int, canvas_height: int) -> List[Node]:
+        """Logo + text centered horizontally as a group"""
+        box = self._get_box(comp, canvas_width, canvas_height)
+        style = self._style(comp, box, canvas_width, canvas_height)
 
         # Get content sources
         logo_source = comp.get("logo_source", "")
         text_source = comp.get("text_source", "")
 
-        logo_image = self._get_content(logo_source) if logo_source else None
+        logo_image = (self._get_content(logo_source) if logo_source else None) or self._logo_variant_source(style)
         text_content = self._get_content(text_source)
 
         if not text_content:
-            return ""
+            return []
 
         # Logo dimensions
         logo_size = style.get("logo_size", 100)
@@ -687,84 +795,50 @@ class TemplateEngine:
         logo_color = style.get("logo_color", None)
 
         # Calculate approximate width needed for the content
-        char_width_ratio = 0.55 if "Oswald" in font_family else 0.6
-        if font_style == 'italic':
-            char_width_ratio *= 0.95
-        estimated_text_width = len(text_content) * font_size * char_width_ratio
+        estimated_text_width = measure(text_content, font_family, font_size)
         total_estimated_width = (logo_size if logo_image else 0) + gap + estimated_text_width
 
         # Calculate scale factor needed to fit content in available width
-        available_width = geom["width"] * 0.95  # 95% to leave some margin
+        available_width = box.width * 0.95  # 95% to leave some margin
         scale_factor = min(1.0, available_width / total_estimated_width) if total_estimated_width > 0 else 1.0
 
-        # Use foreignObject with transform scale for the entire group
-        parts = []
-        parts.append(f'<foreignObject x="{geom["x"]}" y="{geom["y"]}" width="{geom["width"]}" height="{geom["height"]}">')
-
-        # Outer container for centering
-        parts.append('<div xmlns="http://www.w3.org/1999/xhtml" style="')
-        parts.append('width: 100%;')
-        parts.append('height: 100%;')
-        parts.append('display: flex;')
-        parts.append('justify-content: center;')
-        parts.append('align-items: center;')
-        parts.append('">')
-
-        # Inner content container with transform scale applied
-        parts.append('<div style="')
-        parts.append('display: flex;')
-        parts.append('align-items: center;')
-        parts.append('gap: ' + str(gap) + 'px;')
-        parts.append(f'transform: scale({scale_factor});')
-        parts.append('transform-origin: center center;')
-        parts.append('">')
-
-        # Logo
-        if logo_image:
-            logo_filter = f'filter: hue-rotate(0deg) saturate(0%) brightness(0) invert(1);' if logo_color else ''
-            if logo_color:
-                # Convert hex to RGB for CSS filter
-                r = int(logo_color[1:3], 16)
-                g = int(logo_color[3:5], 16)
-                b = int(logo_color[5:7], 16)
-                logo_filter = f'filter: brightness(0) saturate(100%) invert(48%) sepia(79%) saturate(2476%) hue-rotate(316deg) brightness(98%) contrast(119%);'
-
-            parts.append(f'<img src="{logo_image}" style="height: {logo_size}px; width: auto; {logo_filter}" />')
-
-        # Text
-        font_style_css = 'italic' if font_style == 'italic' else 'normal'
-        parts.append(f'<span style="')
-        parts.append(f'color: {text_color};')
-        parts.append(f'font-family: \'{font_family}\';')
-        parts.append(f'font-style: {font_style_css};')
-        parts.append(f'font-size: {font_size}px;')
-        parts.append('white-space: nowrap;')
-        parts.append('">' + text_content + '</span>')
-
-        parts.append('</div>')  # Close inner content
-        parts.append('</div>')  # Close outer container
-        parts.append('</foreignObject>')
-
-        return '\n'.join(parts)
-    def _render_debug_guides(self, template: Dict) -> str:
-        """Render debug guides for alignment verification"""
-        parts = []
-
-        # Guide for left column boundary (x=471, right edge of left column content area)
-        parts.append(f'<rect x="459" y="0" width="12" height="{template["height"]}" fill="rgba(255,0,0,0.3)"/>')
-        parts.append(f'<text x="465" y="20" font-size="10" fill="red">padding 12px</text>')
-
-        # Guide for right column boundary (x=1460, left edge of right column)
-        parts.append(f'<rect x="1448" y="0" width="12" height="{template["height"]}" fill="rgba(0,255,0,0.3)"/>')
-        parts.append(f'<text x="1450" y="20" font-size="10" fill="green">padding 12px</text>')
-
-        return '\n'.join(parts)
+        image = InlineImage(logo_image, logo_size, logo_color) if logo_image else None
+        label = TextRun(text_content, font_family, font_size, text_color, italic=font_style == 'italic')
+        return [GroupNode(box, label, image, gap, scale_factor)]
 
+    def _layout_debug_guides(self, template: Dict) -> Tuple[Node, ...]:
+        """Debug guides for alignment verification"""
+        height = template["height"]
+        return (
+            # Guide for left column boundary (x=471, right edge of left column content area)
+            RectNode(Box(459, 0, 12, height), "rgba(255,0,0,0.3)"),
+            TextNode(465, 20, TextRun("padding 12px", None, 10, "red")),
+            # Guide for right column boundary (x=1460, left edge of right column)
+            RectNode(Box(1448, 0, 12, height), "rgba(0,255,0,0.3)"),
+            TextNode(1450, 20, TextRun("padding 12px", None, 10, "green")),
+        )
+
+    # Component type -> layout method, bound into compiled template plans
+    LAYOUTS = {
+        "background_layer": _layout_background_layer,
+        "text_block": _layout_text_block,
+        "text_only": _layout_text_only,
+        "image": _layout_image,
+        "smartphone_mockup": _layout_smartphone,
+        "cta_button": _layout_cta_button,
+        "logo": _layout_logo,
+        "bullet_list": _layout_bullet_list,
+        "price_display": _layout_price_display,
+        "logo_text_group": _layout_logo_text_group,
+    }
 
 def load_template(template_path: str) -> Dict[str, Any]:
-    """Load template from JSON file"""
-    with open(template_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Load template from JSON file as a compiled, read-only TemplatePlan
+
+    Plans are cached by path and mtime, so repeated loads are free; the
+    plan is also a read-only mapping over the original JSON.
+    """
+    return load_template_plan(template_path, TemplateEngine.LAYOUTS)
 
 
 def save_svg(svg_content: str, output_path: str):
@@ -0,0 +1,179 @@
+"""
+Compiled template plans
+Turns a templates/*.json dict into an immutable plan once: pixel geometry
+resolved, style frozen, layout method picked per component type. Plans are
+cached by path and mtime, so each render only substitutes content.
+"""
+
+import os
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+from layout_tree import ByteBudget
+
+# Component fields naming a content_data key
+CONTENT_KEY_FIELDS = ("content_source", "header_source", "price_source", "period_source", "logo_source", "text_source")
+
+_plan_cache = {}
+
+
+def freeze(value: Any) -> Any:
+    """Read-only deep copy of parsed JSON (dicts -> mapping proxies, lists -> tuples)"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def parse_dimension(value: Any, reference: float) -> float:
+    """Parse dimension value (%, px, or number)"""
+    if isinstance(value, str):
+        if value.endswith("%"):
+            return float(value.rstrip("%")) / 100 * reference
+        elif value.endswith("px"):
+            return float(value.rstrip("px"))
+    return float(value)
+
+
+def resolve_geometry(geometry: Mapping[str, Any], canvas_width: float, canvas_height: float) -> Dict[str, float]:
+    """Pixel x, y, width, height of a component geometry definition"""
+    return {
+        "x": parse_dimension(geometry.get("x", 0), canvas_width),
+        "y": parse_dimension(geometry.get("y", 0), canvas_height),
+        "width": parse_dimension(geometry.get("width", canvas_width), canvas_width),
+        "height": parse_dimension(geometry.get("height", canvas_height), canvas_height)
+    }
+
+
+@dataclass(frozen=True, eq=False)
+class ComponentPlan(Mapping):
+    """One compiled component
+
+    Also a read-only mapping over the original JSON, so layout methods can
+    keep reading optional fields with comp.get(...).
+
+    Attributes:
+        id, type: From the template
+        geometry: Resolved pixel geometry (x, y, width, height)
+        style: Frozen style dict
+        content_keys: content_data keys the component reads (sources and items)
+        layout: TemplateEngine method laying out this type, None if unknown
+    """
+    __slots__ = ("id", "type", "geometry", "style", "content_keys", "layout", "source")
+
+    id: Optional[str]
+    type: Optional[str]
+    geometry: Mapping[str, float]
+    style: Mapping[str, Any]
+    content_keys: Tuple[str, ...]
+    layout: Optional[Callable]
+    source: Mapping[str, Any]
+
+    # Identity semantics (Mapping would compare contents and be unhashable):
+    # cached plans key memoised layouts in TemplateEngine's fragment cache
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __getitem__(self, key):
+        return self.source[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.source)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+
+@dataclass(frozen=True, eq=False)
+class TemplatePlan(Mapping):
+    """A compiled template: canvas size plus component plans in paint order
+
+    Read-only mapping over the original JSON too, so existing code using
+    template["width"] or template.get(...) works unchanged.
+    """
+    __slots__ = ("name", "width", "height", "components", "debug_guides", "budget", "path", "mtime_ns", "source")
+
+    name: Optional[str]
+    width: int
+    height: int
+    components: Tuple[ComponentPlan, ...]
+    debug_guides: bool
+    budget: Optional[ByteBudget]
+    path: Optional[str]
+    mtime_ns: Optional[int]
+    source: Mapping[str, Any]
+
+    def __getitem__(self, key):
+        return self.source[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.source)
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+
+def content_keys(component: Mapping[str, Any]) -> Tuple[str, ...]:
+    """content_data keys a component reads, in field order"""
+    keys = [component[field] for field in CONTENT_KEY_FIELDS if component.get(field)]
+    keys.extend(item for item in component.get("items", ()) if item)
+    return tuple(dict.fromkeys(keys))
+
+
+def compile_template(template: Mapping[str, Any], layouts: Mapping[str, Callable],
+                     path: Optional[str] = None, mtime_ns: Optional[int] = None) -> TemplatePlan:
+    """Compile a parsed template dict into a TemplatePlan
+
+    Args:
+        template: Parsed templates/*.json content
+        layouts: Component type -> layout callable (TemplateEngine.LAYOUTS)
+        path, mtime_ns: Source file, recorded for cache validation
+    """
+    if isinstance(template, TemplatePlan):
+        return template
+
+    source = freeze(template)
+    width = source["width"]
+    height = source["height"]
+
+    components = []
+    for component in source.get("components", ()):
+        components.append(ComponentPlan(
+            id=component.get("id"),
+            type=component.get("type"),
+            geometry=MappingProxyType(resolve_geometry(component.get("geometry", {}), width, height)),
+            style=component.get("style", MappingProxyType({})),
+            content_keys=content_keys(component),
+            layout=layouts.get(component.get("type")),
+            source=component,
+        ))
+
+    return TemplatePlan(
+        name=source.get("name"),
+        width=width,
+        height=height,
+        components=tuple(components),
+        debug_guides=bool(source.get("debug_guides", False)),
+        budget=ByteBudget(int(source["max_bytes"]), tuple(source.get("image_formats", ByteBudget.formats)))
+        if source.get("max_bytes") else None,
+        path=path,
+        mtime_ns=mtime_ns,
+        source=source,
+    )
+
+
+def load_template_plan(template_path: str, layouts: Mapping[str, Callable]) -> TemplatePlan:
+    """Load and compile a template file, reusing the cached plan while its mtime is unchanged"""
+    st = os.stat(template_path)
+    key = (os.path.realpath(template_path), id(layouts))
+    cached = _plan_cache.get(key)
+    if cached is not None and cached.mtime_ns == st.st_mtime_ns:
+        return cached
+
+    with open(template_path, 'r', encoding='utf-8') as f:
+        plan = compile_template(json.load(f), layouts, template_path, st.st_mtime_ns)
+    _plan_cache[key] = plan
+    return plan
@@ -2,7 +2,9 @@
 """Test script per generare 1200x1200 Square banner"""
 
 from template_engine import TemplateEngine, load_template
-import base64
+from asset_cache import get_asset_cache
+
+cache = get_asset_cache()
 
 # Inizializza engine
 engine = TemplateEngine()
@@ -13,27 +15,21 @@ template = load_template('templates/1200x1200.json')
 
 # Carica immagine smartphone (se esiste)
 try:
-    with open('images/smartphone_content.jpg', 'rb') as f:
-        img_data = base64.b64encode(f.read()).decode('utf-8')
-        user_image = f'data:image/jpeg;base64,{img_data}'
+    user_image = cache.data_uri('images/smartphone_content.jpg')
 except FileNotFoundError:
     user_image = None
     print("ℹ️ Nessuna immagine trovata, verrà usato placeholder")
 
 # Carica logo small (su sfondo scuro - bianco)
 try:
-    with open('images/G_bianco.png', 'rb') as f:
-        logo_data = base64.b64encode(f.read()).decode('utf-8')
-        logo_small = f'data:image/png;base64,{logo_data}'
+    logo_small = cache.data_uri('images/G_bianco.png')
 except FileNotFoundError:
     logo_small = None
     print("⚠️ Logo G_bianco.png non trovato")
 
 # Carica logo large (su sfondo scuro - bianco)
 try:
-    with open('images/logo_gazzetta_bianco.png', 'rb') as f:
-        logo_large_data = base64.b64encode(f.read()).decode('utf-8')
-        logo_large = f'data:image/png;base64,{logo_large_data}'
+    logo_large = cache.data_uri('images/logo_gazzetta_bianco.png')
 except FileNotFoundError:
     logo_large = None
     print("⚠️ Logo logo_gazzetta_bianco.png non trovato")
@@ -51,16 +47,9 @@ engine.set_content_data({
     'logo_large_dark': logo_large
 })
 
-# Carica background
-try:
-    with open('background/bg15.png', 'rb') as f:
-        bg_data = base64.b64encode(f.read()).decode('utf-8')
-except FileNotFoundError:
-    bg_data = None
-    print("⚠️ Background bg15.png non trovato, verrà usato colore solido")
-
+# Background (l'engine incorpora una versione ritagliata per ogni area)
 engine.set_background({
-    'image_data': bg_data,
+    'path': 'background/bg15.png',
     'color': '#8B0000'  # Bordeaux fallback
 })
 
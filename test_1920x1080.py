@@ -2,7 +2,9 @@
 """Test script per generare 1920x1080 Full HD banner"""
 
 from template_engine import TemplateEngine, load_template
-import base64
+from asset_cache import get_asset_cache
+
+cache = get_asset_cache()
 
 # Inizializza engine
 engine = TemplateEngine()
@@ -13,18 +15,14 @@ template = load_template('templates/1920x1080.json')
 
 # Carica immagine smartphone (se esiste)
 try:
-    with open('images/smartphone_content.jpg', 'rb') as f:
-        img_data = base64.b64encode(f.read()).decode('utf-8')
-        user_image = f'data:image/jpeg;base64,{img_data}'
+    user_image = cache.data_uri('images/smartphone_content.jpg')
 except FileNotFoundError:
     user_image = None
     print("ℹ️ Nessuna immagine trovata, verrà usato placeholder")
 
 # Carica logo small (su sfondo scuro - bianco)
 try:
-    with open('images/G_bianco.png', 'rb') as f:
-        logo_data = base64.b64encode(f.read()).decode('utf-8')
-        logo_small = f'data:image/png;base64,{logo_data}'
+    logo_small = cache.data_uri('images/G_bianco.png')
 except FileNotFoundError:
     logo_small = None
     print("⚠️ Logo G_bianco.png non trovato")
@@ -44,16 +42,9 @@ engine.set_content_data({
     'logo_small_dark': logo_small
 })
 
-# Carica background
-try:
-    with open('background/bg15.png', 'rb') as f:
-        bg_data = base64.b64encode(f.read()).decode('utf-8')
-except FileNotFoundError:
-    bg_data = None
-    print("⚠️ Background bg15.png non trovato, verrà usato colore solido")
-
+# Background (l'engine incorpora una versione ritagliata per ogni area)
 engine.set_background({
-    'image_data': bg_data,
+    'path': 'background/bg15.png',
     'color': '#8B0000'  # Bordeaux fallback
 })
 
@@ -2,7 +2,9 @@
 """Test script per generare 728x90 con template attuale"""
 
 from template_engine import TemplateEngine, load_template
-import base64
+from asset_cache import get_asset_cache
+
+cache = get_asset_cache()
 
 # Inizializza engine
 engine = TemplateEngine()
@@ -12,8 +14,7 @@ engine.load_fonts()
 template = load_template('templates/728x90.json')
 
 # Carica logo small (su sfondo scuro - bianco)
-with open('images/G_bianco.png', 'rb') as f:
-    logo_data = base64.b64encode(f.read()).decode('utf-8')
+logo_data = cache.base64('images/G_bianco.png')
 
 # Imposta dati di test (come Bologna)
 engine.set_content_data({
@@ -27,12 +28,9 @@ engine.set_content_data({
     'logo_small_dark': f'data:image/png;base64,{logo_data}'
 })
 
-# Carica background
-with open('background/bg15.png', 'rb') as f:
-    bg_data = base64.b64encode(f.read()).decode('utf-8')
-
+# Background (l'engine incorpora una versione ritagliata per ogni area)
 engine.set_background({
-    'image_data': bg_data,
+    'path': 'background/bg15.png',
     'color': '#8B0000'  # Bordeaux fallback
 })
 
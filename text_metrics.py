@@ -0,0 +1,189 @@
+"""
+Text measurement from real glyph metrics
+Reads advance widths and pair kerning from the bundled font/ files once,
+so auto-fit code can compute the rendered width of a string exactly
+instead of estimating it from the character count
+"""
+
+import os
+from functools import lru_cache
+from typing import Dict, Optional
+
+try:
+    from fontTools.ttLib import TTFont
+    from fontTools.varLib import instancer
+except ImportError:  # fontTools is optional: without it widths are estimated
+    TTFont = None
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font")
+
+# CSS family -> font file stem; names like 'Oswald Bold' map to 'Oswald-Bold'
+FAMILY_ALIASES = {
+    "Oswald": "Oswald-Bold",
+    "Roboto": "Roboto-Regular",
+}
+
+# Fallback estimate (fraction of the font size per character)
+CONDENSED_CHAR_WIDTH = 0.55  # Oswald
+DEFAULT_CHAR_WIDTH = 0.6     # Roboto and others
+
+
+class FontMetrics:
+    """Advance widths and kerning pairs of one font, in font units
+
+    Variable fonts are instantiated at the weight their file name declares
+    (e.g. Oswald-Bold -> wght 700), matching what the browser renders for
+    the @font-face rules emitted by TemplateEngine.
+    """
+
+    def __init__(self, path: str):
+        font = TTFont(path)
+        if "fvar" in font:
+            font = instancer.instantiateVariableFont(font, self._axis_location(font, path))
+
+        self.units_per_em = font["head"].unitsPerEm
+        self.cmap = font.getBestCmap() or {}
+        self.advances = {name: advance for name, (advance, _) in font["hmtx"].metrics.items()}
+        self.default_advance = font["OS/2"].xAvgCharWidth or self.units_per_em // 2
+        self._kern_lookups = self._find_kern_lookups(font)
+
+    @staticmethod
+    def _axis_location(font, path: str) -> Dict[str, float]:
+        axes = {axis.axisTag: axis for axis in font["fvar"].axes}
+        location = {}
+        if "wght" in axes:
+            stem = os.path.basename(path)
+            wght = 700 if "Bold" in stem else axes["wght"].defaultValue
+            location["wght"] = min(max(wght, axes["wght"].minValue), axes["wght"].maxValue)
+        return location
+
+    @staticmethod
+    def _find_kern_lookups(font):
+        if "GPOS" not in font:
+            return []
+
+        table = font["GPOS"].table
+        scripts = {record.ScriptTag: record.Script for record in table.ScriptList.ScriptRecord}
+        script = scripts.get("latn") or scripts.get("DFLT")
+        if script is None or script.DefaultLangSys is None:
+            return []
+
+        indices = []
+        for feature_index in script.DefaultLangSys.FeatureIndex:
+            record = table.FeatureList.FeatureRecord[feature_index]
+            if record.FeatureTag == "kern":
+                indices.extend(record.Feature.LookupListIndex)
+
+        lookups = []
+        for index in sorted(set(indices)):
+            lookup = table.LookupList.Lookup[index]
+            subtables = [st.ExtSubTable if lookup.LookupType == 9 else st for st in lookup.SubTable]
+            subtables = [st for st in subtables if getattr(st, "LookupType", 2) == 2]
+            if subtables:
+                lookups.append(subtables)
+        return lookups
+
+    def glyph(self, char: str) -> Optional[str]:
+        return self.cmap.get(ord(char))
+
+    def advance(self, glyph: Optional[str]) -> int:
+        if glyph is None:
+            return self.default_advance  # Rendered with a fallback font
+        return self.advances.get(glyph, self.default_advance)
+
+    def kerning(self, left: Optional[str], right: Optional[str]) -> int:
+        """X advance adjustment between two glyphs (first matching subtable per lookup)"""
+        if left is None or right is None:
+            return 0
+
+        total = 0
+        for subtables in self._kern_lookups:
+            for subtable in subtables:
+                value = self._pair_value(subtable, left, right)
+                if value is not None:
+                    total += value
+                    break
+        return total
+
+    @staticmethod
+    def _pair_value(subtable, left: str, right: str) -> Optional[int]:
+        coverage = subtable.Coverage.glyphs
+        if left not in coverage:
+            return None
+
+        if subtable.Format == 1:
+            pair_set = subtable.PairSet[coverage.index(left)]
+            for record in pair_set.PairValueRecord:
+                if record.SecondGlyph == right:
+                    return getattr(record.Value1, "XAdvance", 0) if record.Value1 else 0
+            return None
+
+        if subtable.Format == 2:
+            class1 = subtable.ClassDef1.classDefs.get(left, 0)
+            class2 = subtable.ClassDef2.classDefs.get(right, 0)
+            value = subtable.Class1Record[class1].Class2Record[class2].Value1
+            return getattr(value, "XAdvance", 0) if value else 0
+
+        return None
+
+
+def font_path(family: str) -> Optional[str]:
+    """Bundled font file for a CSS font family, None if there is none"""
+    stem = FAMILY_ALIASES.get(family, family.replace(" ", "-"))
+    for ext in (".woff2", ".woff", ".ttf"):
+        path = os.path.join(FONT_DIR, stem + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def get_font_metrics(family: str) -> Optional[FontMetrics]:
+    """Metrics for a CSS font family, or None if fontTools or the font file is missing"""
+    if TTFont is None:
+        return None
+
+    path = font_path(family)
+    if path is None:
+        return None
+    try:
+        return FontMetrics(path)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _measure_em(text: str, family: str) -> float:
+    """Width of text in em (font size 1), memoized per (family, string)"""
+    metrics = get_font_metrics(family)
+    if metrics is None:
+        ratio = CONDENSED_CHAR_WIDTH if "Oswald" in family else DEFAULT_CHAR_WIDTH
+        return len(text) * ratio
+
+    units = 0
+    previous = None
+    for char in text:
+        glyph = metrics.glyph(char)
+        units += metrics.advance(glyph) + metrics.kerning(previous, glyph)
+        previous = glyph
+    return units / metrics.units_per_em
+
+
+def measure(text: str, family: str, size: float) -> float:
+    """Rendered width in pixels of text set in family at size px
+
+    Uses the glyph advances and kerning of the bundled font; families
+    without a font file (or without fontTools) fall back to the
+    characters * 0.55/0.6 estimate.
+    """
+    if not text:
+        return 0.0
+    return _measure_em(text, family) * size
+
+
+def fit_font_size(text: str, family: str, max_width: float, max_size: float) -> float:
+    """Largest font size <= max_size at which text fits in max_width"""
+    width_em = _measure_em(text, family) if text else 0.0
+    if width_em <= 0:
+        return max_size
+    return min(max_size, max_width / width_em)
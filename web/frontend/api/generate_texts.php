@@ -12,13 +12,20 @@ if (!isset($_SESSION['authenticated']) || !$_SESSION['authenticated']) {
 $wizardData = $_SESSION['wizard']['data'] ?? [];
 $evento = $wizardData['evento'] ?? 'Evento sportivo';
 
+// refresh=1 skips the cached copy and asks OpenAI for new variants
+$refresh = !empty($_POST['refresh'] ?? $_GET['refresh'] ?? '');
+
 // Call Python script to generate texts
 try {
     $baseDir = __DIR__ . '/../../..';
     $pythonScript = $baseDir . '/generate_texts.py';
 
     // Execute Python script
-    $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " " . escapeshellarg($evento) . " 2>&1";
+    $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " " . escapeshellarg($evento);
+    if ($refresh) {
+        $command .= " --refresh";
+    }
+    $command .= " 2>&1";
 
     exec($command, $output, $returnCode);
 
@@ -1,6 +1,8 @@
 <?php
 session_start();
 
+require_once __DIR__ . '/../render_client.php';
+
 // Check authentication
 if (!isset($_SESSION['authenticated']) || !$_SESSION['authenticated']) {
     http_response_code(401);
@@ -39,7 +41,6 @@ if (empty($template)) {
 try {
     // Prepare paths
     $baseDir = __DIR__ . '/../../..';
-    $pythonScript = $baseDir . '/generate_single_banner.py';
     $outputDir = $baseDir . '/web/frontend/generated';
 
     // Create output directory if not exists
@@ -62,26 +63,22 @@ try {
         'background' => $background ?: ($wizardData['background'] ?? 'bg01'),
         'logo_small_dark' => 'web/frontend/logos/G_bianco.png',
         'logo_large_dark' => 'web/frontend/logos/logo_gazzetta_bianco.png',
-        'user_image' => null
+        'user_image' => null,
+        'asset_mode' => 'reference',  // Fonts/backgrounds shared in generated/assets/
+        'asset_dir' => $outputDir . '/assets',
+        'asset_url' => 'assets/'
     ];
 
     // Generate banner
     $outputPath = $outputDir . "/{$template}.svg";
     $pngPath = $outputDir . "/{$template}.png";
 
-    $jsonData = json_encode($templateData);
-    $escapedJson = escapeshellarg($jsonData);
-
-    // Execute Python script to generate SVG
-    $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " {$escapedJson} 2>&1 > " . escapeshellarg($outputPath);
-
-    exec($command, $output, $returnCode);
+    // Generate SVG (render server if configured, Python script otherwise)
+    $returnCode = renderBannerSvg($baseDir, $templateData, $outputPath, $output);
 
-    // Convert SVG to PNG using Node.js for better quality
+    // Convert SVG to PNG using Node.js for better quality (PNG server if configured)
     if ($returnCode === 0 && file_exists($outputPath)) {
-        $nodeScript = $baseDir . '/svg_to_png.js';
-        $pngCommand = "node " . escapeshellarg($nodeScript) . " " . escapeshellarg($outputPath) . " " . escapeshellarg($pngPath) . " 2>&1";
-        exec($pngCommand, $pngOutput, $pngReturnCode);
+        $pngReturnCode = convertSvgToPngFile($baseDir, $outputPath, $pngPath, $pngOutput);
     }
 
     if ($returnCode === 0 && file_exists($outputPath)) {
@@ -91,9 +88,9 @@ try {
             $pngData = base64_encode(file_get_contents($pngPath));
             $previewHtml = '<img src="data:image/png;base64,' . $pngData . '" style="max-width: 100%; height: auto;">';
         } else {
-            // Fallback to SVG if PNG generation failed
-            $svgContent = file_get_contents($outputPath);
-            $previewHtml = $svgContent;
+            // Fallback to SVG if PNG generation failed: by URL so relative asset hrefs resolve against generated/,
+            // as <object> because an SVG loaded through <img> may not fetch external fonts and images
+            $previewHtml = '<object type="image/svg+xml" data="generated/' . htmlspecialchars($template) . '.svg?t=' . time() . '" style="max-width: 100%;"></object>';
         }
 
         echo json_encode([
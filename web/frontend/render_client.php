@@ -0,0 +1,150 @@
+<?php
+// Banner rendering helpers shared by wizard.php and api/regenerate_banner.php
+//
+// If RENDER_SERVER_URL is set (e.g. http://127.0.0.1:8765) the SVG is requested
+// from the persistent render_server.py; otherwise, or if the server is down,
+// generate_single_banner.py is spawned as before.
+// Likewise PNGs go to the persistent svg_to_png.js --server if PNG_SERVER_URL
+// is set (e.g. http://127.0.0.1:8766), or to a one-off node process.
+
+function postToRenderServer($endpoint, $payload, &$statusLine, $urlVariable = 'RENDER_SERVER_URL') {
+    $serverUrl = getenv($urlVariable);
+    if (!$serverUrl) {
+        return false;
+    }
+
+    $context = stream_context_create([
+        'http' => [
+            'method' => 'POST',
+            'header' => "Content-Type: application/json\r\n",
+            'content' => json_encode($payload),
+            'timeout' => 120,
+            'ignore_errors' => true
+        ]
+    ]);
+
+    $body = @file_get_contents(rtrim($serverUrl, '/') . $endpoint, false, $context);
+    $statusLine = $http_response_header[0] ?? '';
+    return $body;
+}
+
+function renderBannerViaServer($templateData, $outputPath, &$output) {
+    $svg = postToRenderServer('/render', $templateData, $statusLine);
+    if ($svg === false) {
+        return false;  // Server not configured or not reachable, fall back to CLI
+    }
+
+    if (strpos($statusLine, ' 200 ') === false) {
+        $output = [$svg];
+        return true;  // Server answered with an error, don't retry via CLI
+    }
+
+    file_put_contents($outputPath, $svg);
+    $output = [];
+    return true;
+}
+
+function renderBannerSvg($baseDir, $templateData, $outputPath, &$output) {
+    $output = [];
+
+    if (renderBannerViaServer($templateData, $outputPath, $output)) {
+        return empty($output) ? 0 : 1;
+    }
+
+    $pythonScript = $baseDir . '/generate_single_banner.py';
+    $escapedJson = escapeshellarg(json_encode($templateData));
+    $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " {$escapedJson} 2>&1 > " . escapeshellarg($outputPath);
+
+    exec($command, $output, $returnCode);
+    return $returnCode;
+}
+
+// Render every template of a campaign in one call (one process or one server request).
+// $templateData is the shared payload without 'template'; SVGs are written to
+// $outputDir/{templateId}.svg. Returns the per-template results list, or null on failure.
+function renderBannersBatch($baseDir, $templateData, $templateIds, $outputDir, &$output) {
+    $output = [];
+    $payload = $templateData;
+    $payload['templates'] = array_values($templateIds);
+    $payload['output_dir'] = $outputDir;
+
+    $body = postToRenderServer('/render_batch', $payload, $statusLine);
+    if ($body === false) {
+        $pythonScript = $baseDir . '/generate_single_banner.py';
+        $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " " . escapeshellarg(json_encode($payload)) . " 2>&1";
+        exec($command, $output, $returnCode);
+        $body = end($output);  // JSON summary is the last line
+    }
+
+    $summary = json_decode($body, true);
+    if (!is_array($summary) || !isset($summary['banners'])) {
+        if (empty($output)) {
+            $output = [$body];
+        }
+        return null;
+    }
+
+    return $summary['banners'];
+}
+
+// Convert an SVG to PNG; returns 0 on success like the node process exit code
+function convertSvgToPngFile($baseDir, $svgPath, $pngPath, &$output) {
+    $output = [];
+    // Absolute paths: the server doesn't share PHP's working directory
+    $payload = ['svg' => realpath($svgPath), 'png' => realpath(dirname($pngPath)) . '/' . basename($pngPath)];
+
+    $body = postToRenderServer('/convert', $payload, $statusLine, 'PNG_SERVER_URL');
+    if ($body !== false) {
+        $result = json_decode($body, true);
+        if (is_array($result) && !empty($result['ok'])) {
+            return 0;
+        }
+        $output = [$result['error'] ?? $body];
+        return 1;
+    }
+
+    $nodeScript = $baseDir . '/svg_to_png.js';
+    $command = "node " . escapeshellarg($nodeScript) . " " . escapeshellarg($svgPath) . " " . escapeshellarg($pngPath) . " 2>&1";
+    exec($command, $output, $returnCode);
+    return $returnCode;
+}
+
+// Convert many SVGs at once: $jobs is a list of ['svg' => ..., 'png' => ...].
+// With the PNG server each job is posted to it, otherwise a single node process
+// renders the whole manifest. Returns the number of failed conversions.
+function convertSvgsToPngBatch($baseDir, $jobs, &$output) {
+    $output = [];
+    if (empty($jobs)) {
+        return 0;
+    }
+
+    if (getenv('PNG_SERVER_URL')) {
+        $failed = 0;
+        foreach ($jobs as $job) {
+            if (convertSvgToPngFile($baseDir, $job['svg'], $job['png'], $jobOutput) !== 0) {
+                $failed++;
+                $output = array_merge($output, $jobOutput);
+            }
+        }
+        return $failed;
+    }
+
+    $manifestPath = tempnam(sys_get_temp_dir(), 'png_manifest_');
+    $lines = array_map(function ($job) { return json_encode($job); }, $jobs);
+    file_put_contents($manifestPath, implode("\n", $lines) . "\n");
+
+    $nodeScript = $baseDir . '/svg_to_png.js';
+    $command = "node " . escapeshellarg($nodeScript) . " --manifest " . escapeshellarg($manifestPath) . " 2>&1";
+    exec($command, $output, $returnCode);
+    unlink($manifestPath);
+
+    $failed = 0;
+    foreach ($output as $line) {
+        $result = json_decode($line, true);
+        if (is_array($result) && isset($result['ok']) && !$result['ok']) {
+            $failed++;
+        }
+    }
+    return $returnCode === 0 ? 0 : max(1, $failed);
+}
+?>
@@ -2,6 +2,12 @@
     <h2 class="step-title">✍️ Step 3: Testi</h2>
     <p class="step-subtitle">Scegli i testi generati dall'AI o personalizzali manualmente</p>
 
+    <div style="display: flex; justify-content: flex-end; margin-bottom: 20px;">
+        <button type="button" id="refreshTexts" class="btn btn-secondary">
+            🔄 Rigenera testi
+        </button>
+    </div>
+
     <form method="POST">
         <?php
         $textVariants = $_SESSION['wizard']['text_variants'] ?? $mockTextVariants;
@@ -95,6 +101,31 @@
 <script>
 const fields = ['header', 'main_title', 'subtitle', 'cta'];
 
+// New AI variants, bypassing the cached copy for this event
+document.getElementById('refreshTexts').addEventListener('click', function() {
+    const button = this;
+    const label = button.innerHTML;
+    button.disabled = true;
+    button.innerHTML = '⏳ Generazione in corso...';
+
+    const body = new FormData();
+    body.append('refresh', '1');
+
+    fetch('api/generate_texts.php', { method: 'POST', body: body })
+        .then(response => response.json())
+        .then(result => {
+            if (!result.success) {
+                throw new Error(result.error || 'Errore sconosciuto');
+            }
+            window.location.reload();  // Variants are saved in the session
+        })
+        .catch(error => {
+            button.disabled = false;
+            button.innerHTML = label;
+            alert('❌ Errore nella generazione dei testi: ' + error.message);
+        });
+});
+
 fields.forEach(field => {
     const radios = document.querySelectorAll(`input[name="selected_${field}"]`);
     const customTextInput = document.getElementById(`input_${field}`);
@@ -38,9 +38,8 @@
                         ?>
                             <img src="data:image/png;base64,<?= $pngData ?>" style="max-width: 100%; max-height: 200px; height: auto;">
                         <?php elseif ($banner['generated'] && file_exists($svgPath)): ?>
-                            <div style="max-width: 100%; max-height: 200px; overflow: hidden;">
-                                <?= file_get_contents($svgPath) ?>
-                            </div>
+                            <!-- <object>, not <img>: an SVG loaded as image may not fetch its assets/ fonts and backgrounds -->
+                            <object type="image/svg+xml" data="generated/<?= htmlspecialchars($templateId) ?>.svg?t=<?= filemtime($svgPath) ?>" style="max-width: 100%; max-height: 200px; pointer-events: none;"></object>
                         <?php else: ?>
                             <div style="color: #f44336; padding: 20px;">❌ Errore</div>
                         <?php endif; ?>
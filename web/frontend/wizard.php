@@ -1,6 +1,8 @@
 <?php
 session_start();
 
+require_once __DIR__ . '/render_client.php';
+
 // Check authentication
 if (!isset($_SESSION['authenticated']) || !$_SESSION['authenticated']) {
     header('Location: index.php');
@@ -19,7 +21,6 @@ if (!isset($_SESSION['wizard'])) {
 function generateBanners($wizardData) {
     // Prepare paths
     $baseDir = __DIR__ . '/../..';
-    $pythonScript = $baseDir . '/generate_single_banner.py';
     $outputDir = $baseDir . '/web/frontend/generated';
 
     // Create output directory if not exists
@@ -33,68 +34,68 @@ function generateBanners($wizardData) {
         'errors' => []
     ];
 
-    // Generate each selected template
-    foreach ($wizardData['templates'] ?? [] as $templateId) {
-        try {
-            // Prepare template data as JSON
-            $templateData = [
-                'template' => $templateId,
-                'header_text' => $wizardData['header'] ?? 'PROMO',
-                'main_title' => $wizardData['main_title'] ?? 'TITOLO',
-                'description_text' => $wizardData['subtitle'] ?? '',
-                'cta_text' => $wizardData['cta'] ?? 'ISCRIVITI',
-                'price' => $wizardData['prezzo'] ?? '0,99€',
-                'price_period' => $wizardData['periodicita'] ?? '',
-                'background' => $wizardData['background'] ?? 'bg01',
-                'logo_small_dark' => 'web/frontend/logos/G_bianco.png',
-                'logo_large_dark' => 'web/frontend/logos/logo_gazzetta_bianco.png',
-                'user_image' => null  // TODO: handle uploaded images
-            ];
+    $templateIds = $wizardData['templates'] ?? [];
 
-            // Save template data to temp JSON file
-            $jsonFile = $outputDir . "/data_{$templateId}.json";
-            file_put_contents($jsonFile, json_encode($templateData, JSON_PRETTY_PRINT));
+    // Shared payload for every selected template
+    $templateData = [
+        'header_text' => $wizardData['header'] ?? 'PROMO',
+        'main_title' => $wizardData['main_title'] ?? 'TITOLO',
+        'description_text' => $wizardData['subtitle'] ?? '',
+        'cta_text' => $wizardData['cta'] ?? 'ISCRIVITI',
+        'price' => $wizardData['prezzo'] ?? '0,99€',
+        'price_period' => $wizardData['periodicita'] ?? '',
+        'background' => $wizardData['background'] ?? 'bg01',
+        'logo_small_dark' => 'web/frontend/logos/G_bianco.png',
+        'logo_large_dark' => 'web/frontend/logos/logo_gazzetta_bianco.png',
+        'user_image' => null,  // TODO: handle uploaded images
+        'asset_mode' => 'reference'  // Fonts/backgrounds shared in generated/assets/
+    ];
 
-            // Call Python script to generate banner
-            $outputPath = $outputDir . "/{$templateId}.svg";
-            $pngPath = $outputDir . "/{$templateId}.png";
+    // Save template data to temp JSON files
+    foreach ($templateIds as $templateId) {
+        $jsonFile = $outputDir . "/data_{$templateId}.json";
+        file_put_contents($jsonFile, json_encode(['template' => $templateId] + $templateData, JSON_PRETTY_PRINT));
+    }
 
-            // Execute Python script to generate SVG
-            $jsonData = json_encode($templateData);
-            $escapedJson = escapeshellarg($jsonData);
-            $command = "cd " . escapeshellarg($baseDir) . " && python3 " . escapeshellarg($pythonScript) . " {$escapedJson} 2>&1 > " . escapeshellarg($outputPath);
+    // Generate all SVGs in one call (render server if configured, Python script otherwise)
+    $banners = renderBannersBatch($baseDir, $templateData, $templateIds, $outputDir, $output);
 
-            exec($command, $output, $returnCode);
+    if ($banners === null) {
+        $result['success'] = false;
+        $result['errors'][] = "Batch generation failed: " . implode("\n", $output);
+        return $result;
+    }
 
-            // Convert SVG to PNG using Node.js for better quality
-            if ($returnCode === 0 && file_exists($outputPath)) {
-                $nodeScript = $baseDir . '/svg_to_png.js';
-                $pngCommand = "node " . escapeshellarg($nodeScript) . " " . escapeshellarg($outputPath) . " " . escapeshellarg($pngPath) . " 2>&1";
-                exec($pngCommand, $pngOutput, $pngReturnCode);
-            }
+    $pngJobs = [];
+    foreach ($banners as $banner) {
+        $templateId = $banner['template_id'];
+        $outputPath = $outputDir . "/{$templateId}.svg";
+        $pngPath = $outputDir . "/{$templateId}.png";
 
-            if ($returnCode === 0 && file_exists($outputPath)) {
-                $result['banners'][] = [
-                    'template_id' => $templateId,
-                    'svg_path' => "generated/{$templateId}.svg",
-                    'generated' => true,
-                    'file_size' => filesize($outputPath)
-                ];
-            } else {
-                $result['errors'][] = "Failed to generate {$templateId}: " . implode("\n", $output);
-                $result['banners'][] = [
-                    'template_id' => $templateId,
-                    'svg_path' => null,
-                    'generated' => false,
-                    'error' => implode("\n", $output)
-                ];
-            }
+        if ($banner['generated'] && file_exists($outputPath)) {
+            $pngJobs[] = ['svg' => $outputPath, 'png' => $pngPath];
 
-        } catch (Exception $e) {
-            $result['errors'][] = "Error generating {$templateId}: " . $e->getMessage();
+            $result['banners'][] = [
+                'template_id' => $templateId,
+                'svg_path' => "generated/{$templateId}.svg",
+                'generated' => true,
+                'file_size' => filesize($outputPath)
+            ];
+        } else {
+            $error = $banner['error'] ?? 'unknown error';
+            $result['errors'][] = "Failed to generate {$templateId}: " . $error;
+            $result['banners'][] = [
+                'template_id' => $templateId,
+                'svg_path' => null,
+                'generated' => false,
+                'error' => $error
+            ];
         }
     }
 
+    // Convert all SVGs to PNG in one go using Node.js for better quality (PNG server if configured)
+    convertSvgsToPngBatch($baseDir, $pngJobs, $pngOutput);
+
     return $result;
 }
 